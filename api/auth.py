@@ -1,74 +1,164 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import exc, func
 from sqlalchemy.orm import Session
 from models import User
-from schemas import UserCreate, UserLogin
-from database import get_db  # your SessionLocal dependency
-from jose import jwt
+from schemas import Principal, UserCreate, UserLogin
+from database import get_db, run_db  # your SessionLocal dependency
+from jose import JWTError, jwt
 import os
-from datetime import datetime, timedelta
-from passwords import hash_password, verify_password  # from section 1
+import time
+from passwords import PasswordHasherBusy, password_service
+from principals import get_principal, principal_claims, principal_from_claims
+from cache import InMemoryBackend, shared_backend
+from bloom import registered_emails
+from utils import ALGORITHM, REFRESH_TOKEN_EXPIRE_DAYS, SECRET_KEY, create_access_token, create_refresh_token
 
-SECRET_KEY = os.environ.get("SECRET_KEY", "super-secret")
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Embed the user's principal (active flag, roles) in access tokens so most
+# authenticated requests are authorized without touching the database.
+AUTH_EMBED_CLAIMS = os.getenv("AUTH_EMBED_CLAIMS", "0") == "1"
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-def create_access_token(data: dict, expires_delta: timedelta = None):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-
-def register_user(user_data: UserCreate, db: Session):
-    if db.query(User).filter(User.email == user_data.email).first():
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
-    hashed_pw = hash_password(user_data.password)
-    new_user = User(
-        email=user_data.email,
-        username=user_data.username,
-        password_hash=hashed_pw
-    )
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+# Used refresh-token ids and revoked rotation families. Shared between
+# workers when a shared cache backend is configured. Locally the oldest
+# entries are evicted past REFRESH_STORE_MAX_ENTRIES; an evicted id is one
+# whose reuse goes unnoticed, so size it above the refreshes per token lifetime.
+REFRESH_STORE_MAX_ENTRIES = int(os.getenv("REFRESH_STORE_MAX_ENTRIES", 500_000))
+_refresh_store = shared_backend or InMemoryBackend(max_entries=REFRESH_STORE_MAX_ENTRIES)
+
+def issue_tokens(principal: Principal, family: str | None = None):
+    claims = {"sub": str(principal.id)}
+    if AUTH_EMBED_CLAIMS:
+        claims.update(principal_claims(principal))
+    return {
+        "access_token": create_access_token(claims),
+        "refresh_token": create_refresh_token({"sub": str(principal.id)}, family=family),
+        "token_type": "bearer",
+    }
+
+def _hasher_busy():
+    return HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+
+def find_user_by_email(db: Session, email: str):
+    # email is already normalized; lower() here matches idx_users_email_lower
+    return db.query(User).filter(func.lower(User.email) == email).first()
+
+async def register_user(user_data: UserCreate, db: Session):
+    # a definite "new" from the bloom filter skips the lookup; the unique
+    # index still catches anything the filter has not seen
+    if registered_emails.might_contain(user_data.email):
+        exists = await run_db(db, lambda s: s.query(User.id).filter(func.lower(User.email) == user_data.email).first())
+        if exists:
+            raise HTTPException(status_code=400, detail="Email already registered")
+        registered_emails.false_positive()
+
+    try:
+        hashed_pw = await password_service.hash(user_data.password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
+
+    def create(s: Session):
+        new_user = User(
+            email=user_data.email,
+            username=user_data.username,
+            password_hash=hashed_pw
+        )
+        s.add(new_user)
+        try:
+            s.commit()
+        except exc.IntegrityError as e:
+            s.rollback()
+            if "email" in str(e.orig):
+                raise HTTPException(status_code=400, detail="Email already registered")
+            raise HTTPException(status_code=400, detail="Username already taken")
+        s.refresh(new_user)
+        return new_user
+
+    new_user = await run_db(db, create)
+    registered_emails.add(new_user.email)
     return new_user
 
-def login_user(email: str, password: str, db: Session):
-    user = db.query(User).filter(User.email == email).first()
-    if not user or not user.password_hash or not verify_password(password, user.password_hash):
+async def login_user(email: str, password: str, db: Session):
+    user = await run_db(db, find_user_by_email, email)
+    if not user or not user.password_hash:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+
+    try:
+        valid, new_hash = await password_service.verify(password, user.password_hash)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     if not user.is_active:
         raise HTTPException(status_code=403, detail="User inactive")
-    
-    token = create_access_token({"sub": str(user.id)})
-    return {"access_token": token, "token_type": "bearer"}
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    if new_hash:
+        # cost parameters changed since this hash was made: upgrade it now
+        def rehash(s: Session):
+            user.password_hash = new_hash
+            s.commit()
+        await run_db(db, rehash)
+
+    principal = await run_db(db, get_principal, user.id)
+    return issue_tokens(principal)
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Principal:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = int(payload.get("sub"))
-        user = db.query(User).get(user_id)
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
-        return user
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    if payload.get("type") == "refresh":
+        raise HTTPException(status_code=401, detail="Invalid token type")
+
+    principal = principal_from_claims(payload) or get_principal(db, int(payload.get("sub")))
+    if not principal:
+        raise HTTPException(status_code=401, detail="User not found")
+    if not principal.is_active:
+        raise HTTPException(status_code=403, detail="User inactive")
+    return principal
+
+def require_creator(principal: Principal, course_id: int | None) -> None:
+    """403 unless the principal is an admin or a creator of course_id.
+
+    A course_id of None (content whose course cannot be determined) is left
+    to admins.
+    """
+    if principal.is_admin or (course_id is not None and course_id in principal.creator_course_ids):
+        return
+    raise HTTPException(status_code=403, detail="Not a creator of this course")
+
+def require_any_creator(principal: Principal) -> None:
+    """403 unless the principal is an admin or a creator of some course, e.g. to start a new one."""
+    if not (principal.is_admin or principal.creator_course_ids):
+        raise HTTPException(status_code=403, detail="Only course creators can do this")
 
 def refresh_access_token(refresh_token: str, db: Session):
+    """Exchange a refresh token for a new access/refresh pair.
+
+    Each refresh token is single use. Presenting one that was already
+    rotated means it leaked, so its whole family is revoked and the user
+    has to log in again.
+    """
     try:
         payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
-        if payload.get("type") != "refresh":
-            raise HTTPException(status_code=401, detail="Invalid token type")
-        
-        user_id = payload.get("sub")
-        user = db.query(User).get(user_id)
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
-        
-        new_access_token = create_access_token({"sub": str(user.id)})
-        return {"access_token": new_access_token, "token_type": "bearer"}
     except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid refresh token")
\ No newline at end of file
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    if payload.get("type") != "refresh" or "jti" not in payload:
+        raise HTTPException(status_code=401, detail="Invalid token type")
+
+    family = payload["fam"]
+    if _refresh_store.get(f"refresh:family:{family}:revoked"):
+        raise HTTPException(status_code=401, detail="Refresh token revoked")
+
+    remaining = max(1, int(payload["exp"] - time.time()))
+    if not _refresh_store.add(f"refresh:used:{payload['jti']}", b"1", ttl=remaining):
+        _refresh_store.set(f"refresh:family:{family}:revoked", b"1", ttl=REFRESH_TOKEN_EXPIRE_DAYS * 86400)
+        raise HTTPException(status_code=401, detail="Refresh token reused")
+
+    principal = get_principal(db, int(payload["sub"]))
+    if not principal:
+        raise HTTPException(status_code=401, detail="User not found")
+    if not principal.is_active:
+        raise HTTPException(status_code=403, detail="User inactive")
+    return issue_tokens(principal, family=family)
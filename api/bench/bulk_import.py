@@ -0,0 +1,68 @@
+"""Bulk course import throughput.
+
+Generates a synthetic course document and imports it through CourseImporter
+on the configured database, reporting rows/sec.
+
+    cd api && python -m bench.bulk_import [--items 2000] [--batch-rows 5000]
+
+Every run creates a new course; use a throwaway database.
+"""
+import argparse
+import json
+import time
+from database import SessionLocal
+from bulk import import_course
+
+
+def synthetic_document(items: int, lessons_per_chapter: int = 10, items_per_lesson: int = 20):
+    yield json.dumps({"course": {"title": "Bench course", "description": "synthetic", "tags": ["bench"]}})
+    made = 0
+    chapter = 0
+    while made < items:
+        chapter += 1
+        lessons = []
+        for l in range(lessons_per_chapter):
+            contents = []
+            for i in range(items_per_lesson):
+                if made >= items:
+                    break
+                made += 1
+                if i % 3 == 0:
+                    contents.append({"type": "markdown", "text": f"Let $x = {i}$. " * 20, "format": "latex"})
+                elif i % 3 == 1:
+                    contents.append({
+                        "type": "question", "format": "multiple_choice",
+                        "question": f"What is ${i} + {l}$?", "explanation": "Add them.",
+                        "options": [{"text": str(i + l + d), "is_correct": d == 0} for d in range(4)],
+                    })
+                else:
+                    contents.append({
+                        "type": "question", "format": "short_answer",
+                        "question": f"Solve $x - {i} = {l}$", "correct_answer": str(i + l),
+                    })
+            lessons.append({"title": f"Lesson {chapter}.{l + 1}", "contents": contents})
+        yield json.dumps({"chapter": {"title": f"Chapter {chapter}", "lessons": lessons}})
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--batch-rows", type=int, default=5000)
+    args = parser.parse_args()
+
+    lines = list(synthetic_document(args.items))
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        result = import_course(db, lines, args.batch_rows)
+        elapsed = time.perf_counter() - start
+    finally:
+        db.close()
+    print(
+        f"course {result['course_id']}: {result['contents']} items, {result['rows']} rows "
+        f"in {elapsed:.2f}s = {result['rows'] / elapsed:.0f} rows/sec"
+    )
+
+
+if __name__ == "__main__":
+    main()
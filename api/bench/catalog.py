@@ -0,0 +1,61 @@
+"""Catalog listing latency as the courses table grows.
+
+Seeds courses in steps up to 100k on the configured database and, at each
+size, times the first page and the average page over a walk through the
+first 50 pages. With keyset pagination both should stay flat.
+
+    cd api && python -m bench.catalog [--sizes 10,1000,10000,100000]
+
+Run it against a throwaway database: the seeded rows are not removed.
+"""
+import argparse
+import statistics
+import time
+from sqlalchemy import insert, func, select
+from database import SessionLocal
+from models import Course
+from catalog import list_courses
+
+
+def seed(db, count: int):
+    have = db.execute(select(func.count()).select_from(Course)).scalar()
+    rows = [
+        {"title": f"Course {i}", "description": "x" * 2000}
+        for i in range(have, count)
+    ]
+    for start in range(0, len(rows), 5000):
+        db.execute(insert(Course), rows[start:start + 5000])
+    db.commit()
+
+
+def time_pages(db, pages: int, repeats: int = 20):
+    samples = []
+    for _ in range(repeats):
+        cursor = None
+        start = time.perf_counter()
+        for _ in range(pages):
+            page = list_courses(db, limit=20, cursor=cursor, fields="title,image_url")
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        samples.append((time.perf_counter() - start) * 1000 / pages)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10,1000,10000,100000")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    print(f"{'courses':>10} {'first page ms':>14} {'50 pages, ms/page':>18}")
+    for size in map(int, args.sizes.split(",")):
+        seed(db, size)
+        first = time_pages(db, 1)
+        deep = time_pages(db, 50)
+        print(f"{size:>10} {first:>14.2f} {deep:>18.2f}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Benchmark harness for the key flows, with baseline regression checks.
+
+Runs each flow for --duration seconds at --concurrency and records
+throughput and p50/p95/p99 latency to JSON. Flows: login, catalog, outline
+and lesson content, using the ids and credentials in the manifest written
+by bench.seed.
+
+    cd api && python -m bench.seed
+    cd api && python -m bench.harness                     # in-process (ASGI, no sockets)
+    cd api && python -m bench.harness --url http://localhost:8000
+    cd api && python -m bench.harness --save-baseline     # accept current numbers
+
+In-process mode drives main.app through httpx's ASGI transport, so it needs
+only the database. With a baseline (default bench/baseline.json) the run
+exits non-zero if any flow's p95 rose, or its throughput fell, by more than
+--tolerance.
+
+Against a --url server, start it with RATE_LIMIT_ENABLED=0 or the login
+flow is throttled to the per-IP budget.
+
+Requires httpx (pip install -r bench/requirements.txt).
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+import httpx
+from bench.load import percentile
+from bench.seed import DEFAULT_MANIFEST
+
+FLOWS = ("login", "catalog", "outline", "lesson_content")
+DEFAULT_BASELINE = "bench/baseline.json"
+DEFAULT_RESULTS = "bench/results/latest.json"
+
+
+def flow_requests(name: str, manifest: dict):
+    """Endless (method, path, json body) requests for a flow, cycling through the seeded data."""
+    if name == "login":
+        users = itertools.cycle(range(manifest["users"]))
+        return (
+            ("POST", "/login", {"email": manifest["email"].format(n), "password": manifest["password"]})
+            for n in users
+        )
+    if name == "catalog":
+        return itertools.cycle([("GET", "/courses/?limit=20&fields=title,image_url,tags", None)])
+    if name == "outline":
+        return (("GET", f"/courses/{c}/outline", None) for c in itertools.cycle(manifest["course_ids"]))
+    if name == "lesson_content":
+        return (("GET", f"/lessons/{l}/content/", None) for l in itertools.cycle(manifest["lesson_ids"]))
+    raise ValueError(name)
+
+
+async def run_flow(client, requests, concurrency: int, duration: float) -> dict:
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            method, path, body = next(requests)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    if not latencies:
+        return {"requests": 0, "errors": errors, "rps": 0.0}
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def make_client(url: str | None, concurrency: int) -> httpx.AsyncClient:
+    if url:
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        return httpx.AsyncClient(base_url=url, limits=limits, timeout=30)
+    # every bench request comes from one address; login limits would turn it into 429s
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+    os.environ.setdefault("APP_ENV", "dev")  # no SECRET_KEY needed against a throwaway database
+    from main import app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=30)
+
+
+async def run(args, manifest) -> dict:
+    results = {}
+    async with make_client(args.url, args.concurrency) as client:
+        for name in args.flows:
+            # one warm-up pass fills caches and pools before measuring
+            await run_flow(client, flow_requests(name, manifest), args.concurrency, min(2.0, args.duration))
+            results[name] = await run_flow(client, flow_requests(name, manifest), args.concurrency, args.duration)
+            print(f"{name:<16} {json.dumps(results[name])}")
+    return results
+
+
+def regressions(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    found = []
+    for name, current in results.items():
+        before = baseline.get("flows", {}).get(name)
+        if not before or not current.get("requests"):
+            continue
+        if current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            found.append(f"{name}: p95 {before['p95_ms']} -> {current['p95_ms']} ms")
+        if current["rps"] < before["rps"] * (1 - tolerance):
+            found.append(f"{name}: throughput {before['rps']} -> {current['rps']} req/s")
+        if current["errors"] and not before.get("errors"):
+            found.append(f"{name}: {current['errors']} errors")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--flows", default=",".join(FLOWS))
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--results", default=DEFAULT_RESULTS)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+    args.flows = args.flows.split(",")
+
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+
+    report = {
+        "mode": "http" if args.url else "in-process",
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "db_mode": os.getenv("DB_MODE", "async"),
+        "flows": asyncio.run(run(args, manifest)),
+    }
+    os.makedirs(os.path.dirname(args.results) or ".", exist_ok=True)
+    with open(args.results, "w") as f:
+        json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline saved to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("mode") != report["mode"]:
+        print(f"baseline was recorded {baseline.get('mode')}, this run is {report['mode']}; not comparing")
+        return
+    found = regressions(report["flows"], baseline, args.tolerance)
+    for line in found:
+        print(f"REGRESSION {line}")
+    sys.exit(1 if found else 0)
+
+
+if __name__ == "__main__":
+    main()
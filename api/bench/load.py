@@ -0,0 +1,77 @@
+"""Concurrent-reader load test for the read endpoints.
+
+Drives a running API with many concurrent clients for a fixed duration and
+reports requests/sec and latency percentiles. To compare the database modes,
+start the server once with DB_MODE=sync and once with DB_MODE=async and run
+this against each:
+
+    DB_MODE=sync  uvicorn main:app --port 8000
+    python -m bench.load --label sync  --concurrency 200
+
+    DB_MODE=async uvicorn main:app --port 8000
+    python -m bench.load --label async --concurrency 200
+
+Requires httpx (pip install -r bench/requirements.txt).
+"""
+import argparse
+import asyncio
+import time
+import httpx
+
+DEFAULT_PATHS = "/courses/,/courses/1,/courses/1/chapters/,/chapters/1/lessons/,/lessons/1/content/"
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def reader(client, paths, deadline, latencies, errors):
+    i = 0
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            response = await client.get(path)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+                continue
+        except httpx.HTTPError as exc:
+            errors.append(type(exc).__name__)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+async def run(base_url, paths, concurrency, duration):
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(reader(client, paths, deadline, latencies, errors) for _ in range(concurrency)))
+    return latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--paths", default=DEFAULT_PATHS)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--label", default="")
+    args = parser.parse_args()
+
+    latencies, errors = asyncio.run(run(args.url, args.paths.split(","), args.concurrency, args.duration))
+    if not latencies:
+        print(f"{args.label}: no successful requests ({len(errors)} errors)")
+        return
+    print(
+        f"{args.label or args.url}: {len(latencies) / args.duration:.0f} req/s, "
+        f"p50 {percentile(latencies, 50) * 1000:.1f} ms, "
+        f"p99 {percentile(latencies, 99) * 1000:.1f} ms, "
+        f"{len(errors)} errors, concurrency {args.concurrency}"
+    )
+
+
+if __name__ == "__main__":
+    main()
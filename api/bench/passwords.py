@@ -0,0 +1,71 @@
+"""Argon2 throughput and cost calibration.
+
+    cd api && python -m bench.passwords                  # hashes/sec, current parameters
+    cd api && python -m bench.passwords --calibrate 250  # pick costs for ~250 ms per hash
+
+Throughput is measured with one hashing thread per core, the same shape as
+PasswordHashingService, and reported in total and per core. Calibration keeps
+ARGON2_MEMORY_COST and ARGON2_PARALLELISM and raises the time cost until one
+hash takes at least the target time on this machine.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from argon2 import PasswordHasher
+from passwords import ARGON2_MEMORY_COST, ARGON2_PARALLELISM, ARGON2_TIME_COST
+
+
+def hash_for(hasher, deadline):
+    done = 0
+    while time.perf_counter() < deadline:
+        hasher.hash("correct horse battery staple")
+        done += 1
+    return done
+
+
+def throughput(hasher, threads, duration):
+    deadline = time.perf_counter() + duration
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        total = sum(pool.map(lambda _: hash_for(hasher, deadline), range(threads)))
+    return total / duration
+
+
+def single_hash_ms(hasher, rounds=5):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        hasher.hash("correct horse battery staple")
+    return (time.perf_counter() - start) * 1000 / rounds
+
+
+def calibrate(target_ms):
+    time_cost = 1
+    while True:
+        hasher = PasswordHasher(time_cost=time_cost, memory_cost=ARGON2_MEMORY_COST, parallelism=ARGON2_PARALLELISM)
+        ms = single_hash_ms(hasher)
+        print(f"time_cost={time_cost}: {ms:.1f} ms/hash")
+        if ms >= target_ms or time_cost >= 20:
+            return time_cost
+        time_cost += 1
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--calibrate", type=float, metavar="TARGET_MS")
+    args = parser.parse_args()
+
+    if args.calibrate:
+        time_cost = calibrate(args.calibrate)
+        print(f"ARGON2_TIME_COST={time_cost} ARGON2_MEMORY_COST={ARGON2_MEMORY_COST} ARGON2_PARALLELISM={ARGON2_PARALLELISM}")
+        return
+
+    hasher = PasswordHasher(time_cost=ARGON2_TIME_COST, memory_cost=ARGON2_MEMORY_COST, parallelism=ARGON2_PARALLELISM)
+    print(f"t={ARGON2_TIME_COST} m={ARGON2_MEMORY_COST}KiB p={ARGON2_PARALLELISM}: {single_hash_ms(hasher):.1f} ms/hash")
+    rate = throughput(hasher, args.threads, args.duration)
+    print(f"{rate:.1f} hashes/sec on {args.threads} threads, {rate / args.threads:.1f} hashes/sec per core")
+
+
+if __name__ == "__main__":
+    main()
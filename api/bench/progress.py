@@ -0,0 +1,81 @@
+"""Progress tracking under a simulated classroom.
+
+    cd api && python -m bench.progress --course-id 1 [--students 5000] [--events 20]
+
+Each student views --events random lessons of the course from one of
+--threads worker threads, going through the same buffer the API uses. The
+buffer is then flushed once and events/sec (buffering) and the flush time
+(batched upserts) are reported separately.
+
+Bench students are created as users bench-progress-N@example.com if they do
+not exist yet; use a throwaway database.
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import select, text
+from database import SessionLocal
+from models import Lesson
+from progress import flush_progress, progress_buffer
+
+
+def ensure_students(db, count: int) -> list[int]:
+    emails = [f"bench-progress-{n}@example.com" for n in range(count)]
+    db.execute(
+        text("""
+            INSERT INTO users (email, password_hash, is_active)
+            SELECT email, 'x', TRUE FROM unnest(CAST(:emails AS text[])) AS email
+            ON CONFLICT (email) DO NOTHING
+        """),
+        {"emails": emails},
+    )
+    db.commit()
+    return db.execute(text("SELECT id FROM users WHERE email = ANY(:emails)"), {"emails": emails}).scalars().all()
+
+
+def simulate(students: list[int], lessons: list[tuple[int, int]], events: int, threads: int) -> int:
+    def student(user_id):
+        rng = random.Random(user_id)
+        for _ in range(events):
+            lesson_id, course_id = rng.choice(lessons)
+            if rng.random() < 0.7:
+                progress_buffer.record_view(user_id, lesson_id, course_id)
+            else:
+                progress_buffer.record_answer(user_id, course_id)
+        return events
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return sum(pool.map(student, students))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--course-id", type=int, required=True)
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--events", type=int, default=20, help="events per student")
+    parser.add_argument("--threads", type=int, default=64)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        lessons = db.execute(select(Lesson.id, Lesson.course_id).where(Lesson.course_id == args.course_id)).all()
+        if not lessons:
+            parser.error(f"course {args.course_id} has no lessons")
+        students = ensure_students(db, args.students)
+    finally:
+        db.close()
+
+    start = time.perf_counter()
+    total = simulate(students, [tuple(row) for row in lessons], args.events, args.threads)
+    elapsed = time.perf_counter() - start
+    pending = len(progress_buffer)
+    print(f"{len(students)} students, {total} events in {elapsed:.2f}s: {total / elapsed:.0f} events/sec")
+
+    start = time.perf_counter()
+    written = flush_progress()
+    print(f"flush: {pending} buffered entries, {written} rows in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Search latency over a synthetic corpus.
+
+Seeds one course whose lessons hold --rows markdown items (default 1M) of
+random words and LaTeX fragments, generated inside Postgres, then times
+search() for a mix of rare, common, multi-word and math queries. Target:
+p99 under 50 ms for the first page and for the page after it.
+
+    cd api && python -m bench.search [--rows 1000000]
+    cd api && python -m bench.search --course-id 7   # reuse a seeded corpus
+
+Run it against a throwaway database: the seeded rows are not removed.
+"""
+import argparse
+import statistics
+import time
+from sqlalchemy import text
+from database import SessionLocal
+from search import search
+
+VOCABULARY = [
+    "variable", "expression", "equation", "linear", "quadratic", "factor", "polynomial", "slope",
+    "intercept", "graph", "function", "domain", "range", "inequality", "system", "substitution",
+    "elimination", "coefficient", "constant", "term", "simplify", "solve", "evaluate", "ratio",
+    "proportion", "exponent", "radical", "fraction", "numerator", "denominator", "integer", "prime",
+    "$3x + 2x$", "$x^2 - 4$", "$\\frac{1}{2}$", "$\\sqrt{x}$", "$y = mx + b$", "$2(x + 3)$",
+]
+RARE = ["hyperbola", "asymptote", "logarithm"]
+QUERIES = ["quadratic", "linear equation", "slope intercept", "3x + 2x", "\\frac{1}{2}", "sqrt", "hyperbola",
+           '"solve the equation"', "factor -prime"]
+CONTENTS_PER_LESSON = 20
+LESSONS_PER_CHAPTER = 10
+
+
+def seed(db, rows: int) -> int:
+    course_id = db.execute(
+        text("INSERT INTO courses (title, description) VALUES ('Search bench', 'synthetic corpus') RETURNING id")
+    ).scalar()
+    lessons = -(-rows // CONTENTS_PER_LESSON)
+    chapters = -(-lessons // LESSONS_PER_CHAPTER)
+    params = {"course_id": course_id, "vocab": VOCABULARY, "rare": RARE}
+    db.execute(text("""
+        INSERT INTO chapters (course_id, title, sort_order)
+        SELECT :course_id, 'Chapter ' || g, g FROM generate_series(1, :chapters) g
+    """), {**params, "chapters": chapters})
+    db.execute(text("""
+        INSERT INTO lessons (chapter_id, course_id, title, description, sort_order)
+        SELECT c.id, :course_id, 'Lesson ' || g || ' ' || (CAST(:vocab AS text[]))[1 + (c.id + g) % 32],
+               'Practice with ' || (CAST(:vocab AS text[]))[1 + (c.id * g) % 32], g
+        FROM chapters c, generate_series(1, :per_chapter) g
+        WHERE c.course_id = :course_id
+    """), {**params, "per_chapter": LESSONS_PER_CHAPTER})
+    # the correlated subquery (it mentions lc.id) makes random() run per row
+    db.execute(text("""
+        WITH lc AS (
+            INSERT INTO lesson_contents (lesson_id, content_type, sort_order)
+            SELECT l.id, 'markdown', g FROM lessons l, generate_series(1, :per_lesson) g
+            WHERE l.course_id = :course_id
+            RETURNING id
+        )
+        INSERT INTO markdown_contents (content_id, text, format)
+        SELECT lc.id, (
+            SELECT string_agg(CASE
+                WHEN random() < 0.001 THEN r[1 + floor(random() * cardinality(r))::int]
+                ELSE v[1 + floor(random() * cardinality(v))::int] END, ' ')
+            FROM generate_series(1, 40) WHERE lc.id > 0
+        ), 'latex'
+        FROM lc, (SELECT CAST(:vocab AS text[]) AS v, CAST(:rare AS text[]) AS r) words
+    """), {**params, "per_lesson": CONTENTS_PER_LESSON})
+    db.commit()
+    db.execute(text("ANALYZE lessons, lesson_contents, markdown_contents"))
+    db.commit()
+    return course_id
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def time_query(db, q: str, repeats: int):
+    first, second = [], []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        page = search(db, q, limit=20)
+        first.append((time.perf_counter() - start) * 1000)
+        if page["next_cursor"]:
+            start = time.perf_counter()
+            search(db, q, limit=20, cursor=page["next_cursor"])
+            second.append((time.perf_counter() - start) * 1000)
+    return first, second
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--course-id", type=int, help="skip seeding and reuse this corpus")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.course_id is None:
+            start = time.perf_counter()
+            course_id = seed(db, args.rows)
+            print(f"seeded course {course_id} with {args.rows} rows in {time.perf_counter() - start:.0f}s")
+
+        print(f"{'query':<24} {'p50 ms':>8} {'p99 ms':>8} {'page 2 p99':>11}")
+        everything = []
+        for q in QUERIES:
+            first, second = time_query(db, q, args.repeats)
+            everything += first + second
+            page2 = f"{percentile(second, 0.99):>11.1f}" if second else f"{'-':>11}"
+            print(f"{q:<24} {statistics.median(first):>8.1f} {percentile(first, 0.99):>8.1f} {page2}")
+        print(f"overall p50 {statistics.median(everything):.1f} ms, p99 {percentile(everything, 0.99):.1f} ms")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
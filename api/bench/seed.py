@@ -0,0 +1,180 @@
+"""Reproducible synthetic dataset for benchmarks.
+
+Seeds courses (with tags, chapters, lessons and a mix of markdown, multiple
+choice and short answer items), users and enrollments. Courses go through
+bulk.CourseImporter, so they follow the same schema rules as a real import.
+The same --seed always produces the same data. A manifest with the ids the
+harness needs is written to --manifest.
+
+    cd api && python -m bench.seed --courses 50 --users 5000
+
+Run it against a throwaway database. Every run adds a new dataset; run
+`python -m bench.seed --reset` first to remove earlier bench data.
+"""
+import argparse
+import json
+import os
+import random
+import time
+from sqlalchemy import delete, insert, select
+from database import SessionLocal
+from bulk import CourseImporter, _returning_ids
+from models import Course, CourseStudent, Lesson, User
+from passwords import hash_password
+from schemas import ImportChapter, ImportCourse
+
+BENCH_PASSWORD = "bench-password"
+BENCH_EMAIL = "bench-user-{}@example.com"
+BENCH_COURSE_PREFIX = "Bench: "
+DEFAULT_MANIFEST = "bench/results/seed.json"
+
+TOPICS = ["Algebra", "Geometry", "Trigonometry", "Calculus", "Statistics", "Probability", "Number Theory",
+          "Linear Algebra", "Functions", "Sequences"]
+TAGS = ["algebra", "geometry", "calculus", "statistics", "beginner", "intermediate", "advanced", "exam-prep"]
+WORDS = ["variable", "expression", "equation", "slope", "factor", "root", "angle", "area", "limit",
+         "derivative", "integral", "mean", "median", "ratio", "function", "graph", "term", "series"]
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _content(rng: random.Random) -> dict:
+    a, b, x = rng.randint(1, 9), rng.randint(1, 9), rng.randint(1, 9)
+    kind = rng.random()
+    if kind < 0.5:
+        paragraphs = [_sentence(rng, rng.randint(15, 40)) + f" Consider ${a}x + {b}x$." for _ in range(rng.randint(1, 5))]
+        return {"type": "markdown", "text": "\n\n".join(paragraphs), "format": "latex"}
+    if kind < 0.8:
+        correct = (a + b) * x
+        deltas = [0] + rng.sample([-3, -2, -1, 1, 2, 3], 3)
+        rng.shuffle(deltas)
+        return {
+            "type": "question", "format": "multiple_choice",
+            "question": f"What does ${a}x + {b}x$ simplify to when $x={x}$?",
+            "options": [{"text": str(correct + d), "is_correct": d == 0} for d in deltas],
+            "explanation": f"Combine like terms: ${a}x + {b}x = {a + b}x$, then substitute $x={x}$.",
+        }
+    return {
+        "type": "question", "format": "short_answer",
+        "question": f"Solve ${a}x = {a * x}$.",
+        "correct_answer": str(x),
+        "explanation": f"Divide both sides by ${a}$.",
+    }
+
+
+def course_document(rng: random.Random, n: int, chapters: int, lessons: int, items: int):
+    topic = rng.choice(TOPICS)
+    course = ImportCourse(
+        title=f"{BENCH_COURSE_PREFIX}{topic} {n}",
+        description=_sentence(rng, 20),
+        image_url=f"/assets/bench-{n % 10}.jpeg",
+        tags=rng.sample(TAGS, rng.randint(1, 3)),
+    )
+    chapter_docs = [
+        ImportChapter.model_validate({
+            "title": f"{topic} {c + 1}: {rng.choice(WORDS)}s",
+            "description": _sentence(rng, 10),
+            "lessons": [
+                {
+                    "title": f"Lesson {c + 1}.{l + 1}",
+                    "description": _sentence(rng, 8),
+                    "contents": [_content(rng) for _ in range(rng.randint(max(1, items // 2), items))],
+                }
+                for l in range(lessons)
+            ],
+        })
+        for c in range(chapters)
+    ]
+    return course, chapter_docs
+
+
+def seed_courses(db, rng, courses, chapters, lessons, items) -> list[int]:
+    course_ids = []
+    for n in range(courses):
+        course, chapter_docs = course_document(rng, n, chapters, lessons, items)
+        importer = CourseImporter()
+        importer.start(db, course)
+        for chapter in chapter_docs:
+            importer.add_chapter(db, chapter)
+        course_ids.append(importer.finish(db)["course_id"])
+    return course_ids
+
+
+def seed_users(db, users: int) -> list[int]:
+    # one Argon2 hash shared by every bench user; hashing thousands would
+    # take minutes and measure nothing
+    password_hash = hash_password(BENCH_PASSWORD)
+    ids = []
+    for start in range(0, users, 5000):
+        ids += _returning_ids(db, User, [
+            {"email": BENCH_EMAIL.format(n), "password_hash": password_hash, "is_active": True, "email_verified": True}
+            for n in range(start, min(users, start + 5000))
+        ])
+    db.commit()
+    return ids
+
+
+def seed_enrollments(db, rng, user_ids, course_ids, per_user: int) -> int:
+    rows = []
+    for user_id in user_ids:
+        for course_id in rng.sample(course_ids, min(per_user, len(course_ids))):
+            rows.append({"course_id": course_id, "user_id": user_id, "progress": rng.randint(0, 100)})
+    for start in range(0, len(rows), 5000):
+        db.execute(insert(CourseStudent), rows[start:start + 5000])
+    db.commit()
+    return len(rows)
+
+
+def reset(db):
+    db.execute(delete(Course).where(Course.title.startswith(BENCH_COURSE_PREFIX)))
+    db.execute(delete(User).where(User.email.like(BENCH_EMAIL.format("%"))))
+    db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--courses", type=int, default=20)
+    parser.add_argument("--chapters", type=int, default=8, help="per course")
+    parser.add_argument("--lessons", type=int, default=6, help="per chapter")
+    parser.add_argument("--items", type=int, default=12, help="max content items per lesson")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--enrollments", type=int, default=3, help="courses per user")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--reset", action="store_true", help="delete earlier bench data and exit")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.reset:
+            reset(db)
+            return
+        rng = random.Random(args.seed)
+        start = time.perf_counter()
+        course_ids = seed_courses(db, rng, args.courses, args.chapters, args.lessons, args.items)
+        user_ids = seed_users(db, args.users)
+        enrollments = seed_enrollments(db, rng, user_ids, course_ids, args.enrollments)
+        lesson_ids = db.execute(select(Lesson.id).where(Lesson.course_id.in_(course_ids)).order_by(Lesson.id)).scalars().all()
+    finally:
+        db.close()
+
+    manifest = {
+        "seed": args.seed,
+        "course_ids": course_ids,
+        "lesson_ids": lesson_ids,
+        "users": args.users,
+        "email": BENCH_EMAIL,
+        "password": BENCH_PASSWORD,
+    }
+    os.makedirs(os.path.dirname(args.manifest) or ".", exist_ok=True)
+    with open(args.manifest, "w") as f:
+        json.dump(manifest, f)
+    print(
+        f"seeded {len(course_ids)} courses, {len(lesson_ids)} lessons, {len(user_ids)} users, "
+        f"{enrollments} enrollments in {time.perf_counter() - start:.0f}s; manifest in {args.manifest}"
+    )
+
+
+if __name__ == "__main__":
+    main()
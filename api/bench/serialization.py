@@ -0,0 +1,97 @@
+"""Lesson payload serialization and compression, old path vs new.
+
+Builds a synthetic lesson (long LaTeX markdown, multiple choice and short
+answer questions) and reports, per payload size:
+
+  * encode time for FastAPI's default response_model path (validate the
+    Union per request, jsonable_encoder, json.dumps), json.dumps of plain
+    dicts, orjson.dumps, and the precompiled TypeAdapter used now;
+  * bytes on the wire uncompressed, with the dynamic gzip/brotli levels
+    the middleware uses, and with the levels used for cached payloads.
+
+    cd api && python -m bench.serialization [--items 10,50,200]
+
+No database is needed.
+"""
+import argparse
+import json
+import time
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from compression import CACHED_LEVELS, DYNAMIC_LEVELS, available_encodings, compress
+from content import dump_lesson_content
+from schemas import LessonContentOut
+
+PARAGRAPH = (
+    "To solve $ax^2 + bx + c = 0$ we complete the square: "
+    "$$x = \\frac{-b \\pm \\sqrt{b^2 - 4ac}}{2a}.$$ "
+    "The discriminant $\\Delta = b^2 - 4ac$ tells us how many real roots there are. "
+)
+
+
+def synthetic_lesson(items: int) -> list[dict]:
+    lesson = []
+    for i in range(items):
+        if i % 3 == 0:
+            lesson.append({"id": i, "type": "markdown", "data": {"text": PARAGRAPH * 12, "format": "latex"}})
+        elif i % 3 == 1:
+            lesson.append({"id": i, "type": "question", "data": {
+                "format": "multiple_choice",
+                "question": f"What does $3x + {i}x$ simplify to when $x=4$?",
+                "options": [f"${n}$" for n in range(i, i + 4)],
+                "explanation": PARAGRAPH * 3,
+                "visualization": False,
+            }})
+        else:
+            lesson.append({"id": i, "type": "question", "data": {
+                "format": "short_answer",
+                "question": f"Solve $x^2 - {i * i} = 0$ for $x > 0$.",
+                "explanation": PARAGRAPH * 2,
+                "visualization": False,
+            }})
+    return lesson
+
+
+def per_call_us(fn, repeats: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) * 1e6 / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", default="10,50,200")
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+
+    union = TypeAdapter(list[LessonContentOut])  # stands in for FastAPI's response field
+    encoders = {
+        "response_model": lambda items: json.dumps(jsonable_encoder(union.validate_python(items))).encode(),
+        "json.dumps": lambda items: json.dumps(items).encode(),
+        "orjson": orjson.dumps,
+        "TypeAdapter": dump_lesson_content,
+    }
+
+    for size in map(int, args.items.split(",")):
+        items = synthetic_lesson(size)
+        body = dump_lesson_content(items)
+        print(f"\n{size} items")
+        for name, encode in encoders.items():
+            print(f"  {name:<16} {per_call_us(lambda: encode(items), args.repeats):>9.0f} us")
+
+        print(f"  {'identity':<16} {len(body):>9} bytes")
+        for encoding in available_encodings():
+            for label, levels in (("dynamic", DYNAMIC_LEVELS), ("cached", CACHED_LEVELS)):
+                level = levels[encoding]
+                compressed = compress(body, encoding, level)
+                us = per_call_us(lambda: compress(body, encoding, level), max(1, args.repeats // 10))
+                ratio = len(body) / len(compressed)
+                name = f"{encoding}-{level} {label}"
+                print(f"  {name:<16} {len(compressed):>9} bytes  x{ratio:.1f}  {us:.0f} us")
+
+
+if __name__ == "__main__":
+    main()
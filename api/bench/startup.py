@@ -0,0 +1,72 @@
+"""Worker cold start: import time and time to ready.
+
+Reports, over --runs fresh interpreters:
+
+  * import: seconds to `import main` in a new process, which is what every
+    uvicorn worker (and every --reload restart) pays before serving;
+  * ready: seconds from spawning uvicorn to the first 200 from /ready, i.e.
+    import, bind, the first pooled connection and the schema version check.
+
+    cd api && alembic upgrade head
+    cd api && python -m bench.startup --runs 5
+
+Requires httpx (pip install -r bench/requirements.txt).
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import httpx
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def import_seconds() -> float:
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], check=True, capture_output=True, text=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def ready_seconds(port: int, timeout: float) -> float:
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1) as client:
+            while time.perf_counter() - start < timeout:
+                try:
+                    if client.get("/ready").status_code == 200:
+                        return time.perf_counter() - start
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.01)
+        raise RuntimeError(f"/ready did not return 200 within {timeout}s; is the schema migrated?")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def report(name: str, samples: list[float]):
+    print(
+        f"{name:<8} median {statistics.median(samples) * 1000:7.0f} ms  "
+        f"min {min(samples) * 1000:7.0f} ms  max {max(samples) * 1000:7.0f} ms"
+    )
+
+
+def main():
+    os.environ.setdefault("APP_ENV", "dev")  # child processes inherit it; no SECRET_KEY needed locally
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+
+    report("import", [import_seconds() for _ in range(args.runs)])
+    report("ready", [ready_seconds(args.port, args.timeout) for _ in range(args.runs)])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Parameterized question throughput: variants generated and graded per second.
+
+    cd api && python -m bench.variants
+    cd api && python -m bench.variants --sizes 1,30,1000,10000 --duration 2
+
+No database. For each class size, times one template's variants three ways:
+
+    batch      one CompiledTemplate.evaluate() over the whole class
+    loop       evaluate() once per student, as a cache miss for each would
+    graded     per-student grading the way grade_submission does it: the
+               student's variant from the batch, then an AnswerKeyEntry
+               built from it grading one answer
+
+It reports students per second for each, for a multiple choice template
+(options and shuffle included) and a short answer one. batch should stay
+almost flat per call as the class grows, so its rate scales with the
+class size while loop's does not.
+"""
+import argparse
+import time
+import numpy as np
+from grading import AnswerKeyEntry
+from variants import CompiledTemplate
+
+TEMPLATES = {
+    "multiple_choice": CompiledTemplate(
+        1, "multiple_choice", {"a": {"min": 2, "max": 9}, "x": {"min": 1, "max": 12, "exclude": [0]}},
+        "a * x + 2 * x", distractors=("a * x", "(a + 2) + x", "a + 2 * x"),
+        question="What does ${{a}}x + 2x$ simplify to when $x={{x}}$?",
+        explanation="$({{a}} + 2) \\cdot {{x}}$",
+    ),
+    "short_answer": CompiledTemplate(
+        2, "short_answer", {"r": {"min": 0.5, "max": 20, "step": 0.5}}, "pi * r ** 2", decimals=2,
+        question="What is the area of a circle of radius ${{r}}$?",
+    ),
+}
+
+
+def rate(fn, students, duration):
+    """Students per second for fn(), which handles `students` per call."""
+    calls, deadline = 0, time.perf_counter() + duration
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        fn()
+        calls += 1
+    return calls * students / (time.perf_counter() - start)
+
+
+def bench(template, size, duration):
+    user_ids = np.arange(1, size + 1, dtype=np.int64)
+    batch = template.evaluate(user_ids)
+    # half right, half wrong
+    answers = {}
+    for i, user_id in enumerate(user_ids.tolist()):
+        variant = batch.variant(user_id)
+        right = variant["correct_index"] if template.format == "multiple_choice" else variant["answer"]
+        answers[user_id] = right if i % 2 == 0 else "wrong"
+
+    def loop():
+        for user_id in user_ids.tolist():
+            template.evaluate([user_id])
+
+    def graded():
+        for user_id, answer in answers.items():
+            AnswerKeyEntry.for_variant(template.format, batch.variant(user_id)).grade(answer)
+
+    return {
+        "batch": rate(lambda: template.evaluate(user_ids), size, duration),
+        "loop": rate(loop, size, duration),
+        "graded": rate(graded, size, duration),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1,30,1000,10000")
+    parser.add_argument("--duration", type=float, default=2)
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    print(f"{'template':<16} {'students':>8} {'batch/s':>12} {'loop/s':>12} {'speedup':>8} {'graded/s':>12}")
+    for name, template in TEMPLATES.items():
+        template.validate()
+        for size in sizes:
+            r = bench(template, size, args.duration)
+            print(f"{name:<16} {size:>8} {r['batch']:>12,.0f} {r['loop']:>12,.0f} "
+                  f"{r['batch'] / r['loop']:>7.1f}x {r['graded']:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Throughput scaling from 1 to N gunicorn workers on the content endpoints.
+
+For each worker count, starts the production profile (gunicorn.conf.py)
+on a local port, waits for /ready, then drives the outline and lesson
+content flows from bench.harness over HTTP and records req/s and p95.
+
+    cd api && python -m bench.seed
+    cd api && python -m bench.workers --workers 1,2,4,8 --duration 15
+
+Prints one row per worker count, with its speedup over the first row, and
+writes the table to --results. The load generator shares the machine
+with the server, so leave it cores to run on: scaling flattens early
+once the client becomes the bottleneck, not the server. Near-linear
+scaling up to the core count is expected while Postgres keeps up. After
+that, look at db_pool_checkout_wait_seconds and the Postgres CPU.
+
+More than one worker needs CACHE_REDIS_URL (see gunicorn.conf.py), which
+the servers inherit from this environment.
+
+Requires httpx (pip install -r bench/requirements.txt).
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import httpx
+from bench.harness import make_client, run_flow, flow_requests
+from bench.seed import DEFAULT_MANIFEST
+
+FLOWS = ("outline", "lesson_content")
+
+
+def start_server(workers: int, port: int) -> subprocess.Popen:
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), PORT=str(port), HOST="127.0.0.1")
+    env.setdefault("APP_ENV", "dev")
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "main:app", "-c", "gunicorn.conf.py"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_ready(url: str, timeout: float):
+    deadline = time.perf_counter() + timeout
+    with httpx.Client(base_url=url, timeout=1) as client:
+        while time.perf_counter() < deadline:
+            try:
+                if client.get("/ready").status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            time.sleep(0.1)
+    raise RuntimeError(f"{url}/ready did not return 200 within {timeout}s")
+
+
+async def measure(url: str, manifest: dict, concurrency: int, duration: float) -> dict:
+    results = {}
+    async with make_client(url, concurrency) as client:
+        for name in FLOWS:
+            await run_flow(client, flow_requests(name, manifest), concurrency, min(2.0, duration))
+            results[name] = await run_flow(client, flow_requests(name, manifest), concurrency, duration)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default=f"1,2,4,{os.cpu_count() or 1}")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--results", default="bench/results/workers.json")
+    args = parser.parse_args()
+    counts = sorted({int(n) for n in args.workers.split(",")})
+    if counts[-1] > 1 and not os.getenv("CACHE_REDIS_URL"):
+        parser.error("--workers above 1 needs CACHE_REDIS_URL, as in production")
+
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+    url = f"http://127.0.0.1:{args.port}"
+
+    rows = []
+    for workers in counts:
+        server = start_server(workers, args.port)
+        try:
+            wait_ready(url, timeout=60)
+            flows = asyncio.run(measure(url, manifest, args.concurrency, args.duration))
+        finally:
+            server.terminate()
+            server.wait()
+        rows.append({"workers": workers, "flows": flows})
+
+        base = rows[0]["flows"]
+        cells = []
+        for name in FLOWS:
+            rps, first = flows[name]["rps"], base[name]["rps"]
+            speedup = rps / first if first else 0.0
+            cells.append(f"{name} {rps:>8.1f} req/s x{speedup:.2f} p95 {flows[name].get('p95_ms', 0):>7.1f} ms")
+        print(f"{workers:>3} workers  " + "  ".join(cells))
+
+    os.makedirs(os.path.dirname(args.results) or ".", exist_ok=True)
+    with open(args.results, "w") as f:
+        json.dump({"cpus": os.cpu_count(), "concurrency": args.concurrency, "runs": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
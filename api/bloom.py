@@ -0,0 +1,137 @@
+"""Bloom filter of registered emails.
+
+Lets registration skip the "already registered?" query for addresses that
+are certainly new, which is nearly all of them during a sign-up spike. A
+"maybe" still goes to the database, and the unique index on lower(email)
+remains the real guard: this worker's filter does not see addresses
+registered by other workers until its next rebuild, so a miss is only ever
+a missed shortcut, never a duplicate account.
+
+The filter is rebuilt in the background when the worker starts and then
+every EMAIL_BLOOM_REBUILD_SECONDS, sized from the current user count. Until
+the first build finishes every check answers "maybe".
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import threading
+from sqlalchemy import func, select
+from starlette.concurrency import run_in_threadpool
+from database import SessionLocal
+from metrics import Counter, Gauge
+from models import User
+from schemas import normalize_email
+
+logger = logging.getLogger(__name__)
+
+EMAIL_BLOOM = os.getenv("EMAIL_BLOOM", "1") == "1"
+EMAIL_BLOOM_FP_RATE = float(os.getenv("EMAIL_BLOOM_FP_RATE", 0.01))
+EMAIL_BLOOM_REBUILD_SECONDS = float(os.getenv("EMAIL_BLOOM_REBUILD_SECONDS", 3600))
+# Room for sign-ups between rebuilds: capacity is max(min, users * headroom)
+EMAIL_BLOOM_HEADROOM = 2
+EMAIL_BLOOM_MIN_CAPACITY = 100_000
+
+bloom_checks = Counter("email_bloom_checks_total", "Registration email checks", labels=("result",))
+bloom_false_positives = Counter(
+    "email_bloom_false_positives_total", "Filter said maybe, database said new"
+)
+bloom_items = Gauge(
+    "email_bloom_items", "Emails added to the current filter",
+    collect=lambda: [({}, registered_emails.count())],
+)
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, fp_rate: float):
+        self.size = max(8, int(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def _positions(self, item: str):
+        # double hashing (Kirsch-Mitzenmacher) from one 128-bit digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item: str) -> None:
+        positions = self._positions(item)
+        # |= on a shared byte is not atomic; a lost bit would be a false negative
+        with self._lock:
+            for p in positions:
+                self.bits[p >> 3] |= 1 << (p & 7)
+            self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(item))
+
+
+class RegisteredEmails:
+    def __init__(self):
+        self._filter = None
+        self._building = None
+        self._lock = threading.Lock()
+
+    def might_contain(self, email: str) -> bool:
+        current = self._filter
+        if current is None:
+            return True
+        maybe = email in current
+        bloom_checks.inc(result="maybe" if maybe else "new")
+        return maybe
+
+    def false_positive(self) -> None:
+        # a "maybe" the database answered with "new"; only counts once built
+        if self._filter is not None:
+            bloom_false_positives.inc()
+
+    def add(self, email: str) -> None:
+        with self._lock:
+            targets = [f for f in (self._filter, self._building) if f is not None]
+        for f in targets:
+            f.add(email)
+
+    def count(self) -> int:
+        current = self._filter
+        return current.count if current is not None else 0
+
+    def rebuild(self) -> None:
+        db = SessionLocal()
+        try:
+            users = db.execute(select(func.count()).select_from(User).where(User.email.isnot(None))).scalar()
+            fresh = BloomFilter(max(EMAIL_BLOOM_MIN_CAPACITY, users * EMAIL_BLOOM_HEADROOM), EMAIL_BLOOM_FP_RATE)
+            # sign-ups during the scan go into both filters
+            with self._lock:
+                self._building = fresh
+            try:
+                emails = db.execute(
+                    select(User.email).where(User.email.isnot(None)).execution_options(yield_per=10_000)
+                ).scalars()
+                # the same normalization as registration checks, not SQL lower(),
+                # whose case mapping depends on the database collation
+                for email in emails:
+                    fresh.add(normalize_email(email))
+            except Exception:
+                with self._lock:
+                    self._building = None
+                raise
+            with self._lock:
+                self._filter, self._building = fresh, None
+        finally:
+            db.close()
+
+
+registered_emails = RegisteredEmails()
+
+
+async def run_rebuilder(interval: float = EMAIL_BLOOM_REBUILD_SECONDS):
+    while True:
+        try:
+            await run_in_threadpool(registered_emails.rebuild)
+        except Exception:
+            logger.exception("email bloom filter rebuild failed; will retry")
+        await asyncio.sleep(interval)
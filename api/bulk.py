@@ -0,0 +1,366 @@
+"""Bulk import/export of whole courses as NDJSON documents.
+
+    python -m bulk import course.ndjson
+    python -m bulk export 1 > course.ndjson
+
+See the ImportCourse/ImportChapter schemas for the document layout.
+"""
+import argparse
+import json
+import sys
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, selectinload
+from database import SessionLocal
+from models import (
+    Chapter, Course, CourseCreator, CourseTag, Lesson, LessonContent, MarkdownContent, Question,
+    QuestionOption, QuestionTemplate, ShortAnswerQuestion, Tag,
+)
+from content import load_contents_by_lesson
+from principals import invalidate_principal
+from ranking import RANK_STEP
+from schemas import ImportChapter, ImportCourse
+from variants import DEFAULT_DISTRACTORS, CompiledTemplate, TemplateError
+
+IMPORT_BATCH_ROWS = 5000
+EXPORT_LESSON_BATCH = 50
+
+
+class CourseImportError(ValueError):
+    def __init__(self, line: int, message: str):
+        super().__init__(f"line {line}: {message}")
+        self.line = line
+
+
+def _returning_ids(db: Session, table, rows: list[dict]) -> list[int]:
+    # executemany with RETURNING: rows are sent in multi-VALUES pages and the
+    # generated ids come back in parameter order
+    if not rows:
+        return []
+    stmt = insert(table).returning(table.id, sort_by_parameter_order=True)
+    return db.execute(stmt, rows).scalars().all()
+
+
+def _insert_many(db: Session, table, rows: list[dict]):
+    if rows:
+        db.execute(insert(table), rows)
+
+
+class CourseImporter:
+    """Writes a course document chapter by chapter in batched statements.
+
+    Chapters are buffered until they hold about `batch_rows` content items,
+    then each table gets a single executemany for the whole batch. Everything
+    runs in one transaction that finish() commits, so a failed import leaves
+    nothing behind. With creator_id, that user becomes the new course's
+    creator.
+    """
+
+    def __init__(self, batch_rows: int = IMPORT_BATCH_ROWS, creator_id: int | None = None):
+        self.batch_rows = batch_rows
+        self.creator_id = creator_id
+        self.course_id = None
+        self.chapters = 0
+        self.lessons = 0
+        self.contents = 0
+        self.rows = 0
+        self._pending = []
+        self._pending_items = 0
+
+    def start(self, db: Session, course: ImportCourse):
+        self.course_id = _returning_ids(db, Course, [{
+            "title": course.title,
+            "description": course.description,
+            "image_url": course.image_url,
+        }])[0]
+        self.rows += 1
+        if self.creator_id is not None:
+            _insert_many(db, CourseCreator, [
+                {"course_id": self.course_id, "user_id": self.creator_id, "assigned_by": self.creator_id},
+            ])
+            self.rows += 1
+
+        if course.tags:
+            db.execute(pg_insert(Tag).on_conflict_do_nothing(index_elements=[Tag.name]), [{"name": t} for t in course.tags])
+            tag_ids = db.execute(select(Tag.id).where(Tag.name.in_(course.tags))).scalars().all()
+            _insert_many(db, CourseTag, [{"course_id": self.course_id, "tag_id": t} for t in tag_ids])
+            self.rows += len(tag_ids)
+
+    def add_chapter(self, db: Session, chapter: ImportChapter):
+        self._pending.append(chapter)
+        self._pending_items += 1 + sum(1 + len(lesson.contents) for lesson in chapter.lessons)
+        if self._pending_items >= self.batch_rows:
+            self.flush(db)
+
+    def flush(self, db: Session):
+        chapters, self._pending, self._pending_items = self._pending, [], 0
+        if not chapters:
+            return
+
+        chapter_ids = _returning_ids(db, Chapter, [
+            {
+                "course_id": self.course_id,
+                "title": chapter.title,
+                "description": chapter.description,
+                "image_url": chapter.image_url,
+                "sort_order": (self.chapters + i + 1) * RANK_STEP,
+            }
+            for i, chapter in enumerate(chapters)
+        ])
+
+        lessons = [
+            (chapter_id, order, lesson)
+            for chapter_id, chapter in zip(chapter_ids, chapters)
+            for order, lesson in enumerate(chapter.lessons, start=1)
+        ]
+        lesson_ids = _returning_ids(db, Lesson, [
+            {
+                "chapter_id": chapter_id,
+                "course_id": self.course_id,
+                "title": lesson.title,
+                "description": lesson.description,
+                "sort_order": order * RANK_STEP,
+            }
+            for chapter_id, order, lesson in lessons
+        ])
+
+        contents = [
+            (lesson_id, order, item)
+            for lesson_id, (_, _, lesson) in zip(lesson_ids, lessons)
+            for order, item in enumerate(lesson.contents, start=1)
+        ]
+        content_ids = _returning_ids(db, LessonContent, [
+            {"lesson_id": lesson_id, "content_type": item.type, "sort_order": order * RANK_STEP}
+            for lesson_id, order, item in contents
+        ])
+
+        markdown, questions, options, short_answers, templates = [], [], [], [], []
+        for content_id, (_, _, item) in zip(content_ids, contents):
+            if item.type == "markdown":
+                markdown.append({"content_id": content_id, "text": item.text, "format": item.format})
+                continue
+            questions.append({
+                "content_id": content_id,
+                "question_format": item.format,
+                "question_text": item.question,
+                "explanation": item.explanation,
+                "visualization": item.visualization,
+            })
+            if item.format == "multiple_choice":
+                options.extend(
+                    {"question_id": content_id, "option_text": o.text, "is_correct": o.is_correct, "sort_order": n * RANK_STEP}
+                    for n, o in enumerate(item.options, start=1)
+                )
+            else:
+                short_answers.append({"question_id": content_id, "correct_answer": item.correct_answer})
+            if item.template is not None:
+                t = item.template
+                templates.append({
+                    "question_id": content_id,
+                    "variables": t.variables,
+                    "answer_expression": t.answer,
+                    "distractor_expressions": t.distractors,
+                    "distractor_count": t.distractor_count if t.distractor_count is not None else DEFAULT_DISTRACTORS,
+                    "decimals": t.decimals,
+                })
+
+        _insert_many(db, MarkdownContent, markdown)
+        _insert_many(db, Question, questions)
+        _insert_many(db, QuestionOption, options)
+        _insert_many(db, ShortAnswerQuestion, short_answers)
+        _insert_many(db, QuestionTemplate, templates)
+
+        self.chapters += len(chapter_ids)
+        self.lessons += len(lesson_ids)
+        self.contents += len(content_ids)
+        self.rows += (len(chapter_ids) + len(lesson_ids) + len(content_ids) + len(markdown)
+                      + len(questions) + len(options) + len(short_answers) + len(templates))
+
+    def finish(self, db: Session):
+        self.flush(db)
+        db.commit()
+        if self.creator_id is not None:
+            # a core insert, so the ORM hook that retires cached principals never saw it
+            invalidate_principal(self.creator_id)
+        return {
+            "course_id": self.course_id,
+            "chapters": self.chapters,
+            "lessons": self.lessons,
+            "contents": self.contents,
+            "rows": self.rows,
+        }
+
+
+def _validate_templates(line_no: int, chapter: ImportChapter):
+    # the same check PUT /questions/{id}/template makes, before anything is written
+    for lesson in chapter.lessons:
+        for item in lesson.contents:
+            t = getattr(item, "template", None)
+            if t is None:
+                continue
+            try:
+                CompiledTemplate(
+                    0, item.format, t.variables, t.answer, t.distractors, t.distractor_count, t.decimals,
+                ).validate()
+            except TemplateError as exc:
+                raise CourseImportError(line_no, f"question {item.question!r}: {exc}")
+
+
+def parse_line(importer: CourseImporter, line_no: int, line):
+    """Validate one NDJSON line; returns ("course" | "chapter", model) or None for blank lines."""
+    if not line.strip():
+        return None
+    try:
+        record = json.loads(line)
+        if importer.course_id is None:
+            if "course" not in record:
+                raise CourseImportError(line_no, "the first record must be a course")
+            return "course", ImportCourse.model_validate(record["course"])
+        if "chapter" not in record:
+            raise CourseImportError(line_no, "expected a chapter record")
+        chapter = ImportChapter.model_validate(record["chapter"])
+        _validate_templates(line_no, chapter)
+        return "chapter", chapter
+    except json.JSONDecodeError as exc:
+        raise CourseImportError(line_no, f"invalid JSON: {exc.msg}")
+    except ValidationError as exc:
+        raise CourseImportError(line_no, str(exc))
+
+
+async def iter_lines(chunks):
+    """Split an async stream of byte chunks (e.g. request.stream()) into lines."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+def import_course(db: Session, lines, batch_rows: int = IMPORT_BATCH_ROWS):
+    importer = CourseImporter(batch_rows)
+    for line_no, line in enumerate(lines, start=1):
+        parsed = parse_line(importer, line_no, line)
+        if parsed is None:
+            continue
+        kind, record = parsed
+        if kind == "course":
+            importer.start(db, record)
+        else:
+            importer.add_chapter(db, record)
+    if importer.course_id is None:
+        raise CourseImportError(0, "empty document")
+    return importer.finish(db)
+
+
+# --- Export ---
+
+def _export_content(content: LessonContent):
+    if content.content_type == "markdown" and content.markdown:
+        return {"type": "markdown", "text": content.markdown.text, "format": content.markdown.format}
+    question = content.question
+    if content.content_type != "question" or not question:
+        return None
+    item = {
+        "type": "question",
+        "format": question.question_format.value,
+        "question": question.question_text,
+        "explanation": question.explanation,
+        "visualization": bool(question.visualization),
+    }
+    if question.question_format == "multiple_choice":
+        item["options"] = [{"text": o.option_text, "is_correct": bool(o.is_correct)} for o in question.options]
+    else:
+        item["correct_answer"] = question.short_answer.correct_answer if question.short_answer else ""
+    template = question.template
+    if template is not None:
+        item["template"] = {
+            "variables": template.variables,
+            "answer": template.answer_expression,
+            "distractors": template.distractor_expressions or [],
+            "distractor_count": template.distractor_count,
+            "decimals": template.decimals,
+        }
+    return item
+
+
+def export_course(db: Session, course_id: int):
+    """Yield the course as NDJSON lines, one chapter at a time.
+
+    Content is fetched for EXPORT_LESSON_BATCH lessons at a time and the
+    session is cleared between chapters, so memory stays bounded by the
+    largest chapter rather than the whole course.
+    """
+    course = db.query(Course).options(selectinload(Course.tags).selectinload(CourseTag.tag)).filter(Course.id == course_id).first()
+    if not course:
+        return
+    yield json.dumps({"course": {
+        "title": course.title,
+        "description": course.description,
+        "image_url": course.image_url,
+        "tags": [course_tag.tag.name for course_tag in course.tags],
+    }}) + "\n"
+
+    chapter_ids = db.execute(
+        select(Chapter.id).where(Chapter.course_id == course_id).order_by(Chapter.sort_order, Chapter.id)
+    ).scalars().all()
+    for chapter_id in chapter_ids:
+        chapter = db.query(Chapter).options(selectinload(Chapter.lessons)).filter(Chapter.id == chapter_id).one()
+        lessons = []
+        for start in range(0, len(chapter.lessons), EXPORT_LESSON_BATCH):
+            batch = chapter.lessons[start:start + EXPORT_LESSON_BATCH]
+            contents = load_contents_by_lesson(db, [lesson.id for lesson in batch])
+            for lesson in batch:
+                items = (_export_content(c) for c in contents[lesson.id])
+                lessons.append({
+                    "title": lesson.title,
+                    "description": lesson.description,
+                    "contents": [item for item in items if item is not None],
+                })
+        yield json.dumps({"chapter": {
+            "title": chapter.title,
+            "description": chapter.description,
+            "image_url": chapter.image_url,
+            "lessons": lessons,
+        }}) + "\n"
+        db.expunge_all()
+
+
+def stream_export(course_id: int):
+    # StreamingResponse outlives request dependencies, so the export opens
+    # and closes its own session
+    db = SessionLocal()
+    try:
+        yield from export_course(db, course_id)
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk course import/export")
+    sub = parser.add_subparsers(dest="command", required=True)
+    import_cmd = sub.add_parser("import")
+    import_cmd.add_argument("path", help="NDJSON course document, or - for stdin")
+    import_cmd.add_argument("--batch-rows", type=int, default=IMPORT_BATCH_ROWS)
+    export_cmd = sub.add_parser("export")
+    export_cmd.add_argument("course_id", type=int)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.command == "import":
+            stream = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8")
+            with stream:
+                print(json.dumps(import_course(db, stream, args.batch_rows)))
+        else:
+            for line in export_course(db, args.course_id):
+                sys.stdout.write(line)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Chapter bundles: every lesson of a chapter with its content, as NDJSON.
+
+One round trip lets a client prefetch a whole chapter for offline study.
+The stream is, one JSON document per line:
+
+    {"chapter": {"id", "course_id", "title", "description", "image_url", "lessons"}}
+    {"lesson": {"id", "title", "description", "sort_order"}, "contents": [...]}   (per lesson)
+    {"end": {"lessons": n}}
+
+Content items have the same shape as /lessons/{id}/content/. Lessons are
+loaded and sent BUNDLE_LESSON_BATCH at a time, so memory is bounded by one
+batch however large the chapter is, and no database connection is held
+while the client reads a batch. A stream without the "end" line was cut
+off. The client resumes with ?after=<last lesson id> and If-Match: <etag>,
+and gets 412 if the chapter changed in between.
+
+The ETag hashes the chapter's and its lessons' metadata together with a
+digest of each lesson's content that Postgres computes in one query, so it
+changes exactly when what the bundle shows does and every worker agrees on
+it. Only the digests, not the content, leave the database.
+"""
+import hashlib
+import os
+import orjson
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+from content import dump_lesson_content, load_contents_by_lesson, serialize_contents
+from database import ReadSessionLocal
+from models import Chapter, Lesson
+
+BUNDLE_LESSON_BATCH = int(os.getenv("BUNDLE_LESSON_BATCH", 20))
+
+
+def _chapter_row(db: Session, chapter_id: int):
+    return db.execute(
+        select(Chapter.id, Chapter.course_id, Chapter.title, Chapter.description, Chapter.image_url)
+        .where(Chapter.id == chapter_id)
+    ).first()
+
+
+def _lesson_rows(db: Session, chapter_id: int, after: int | None = None):
+    rows = db.execute(
+        select(Lesson.id, Lesson.title, Lesson.description, Lesson.sort_order)
+        .where(Lesson.chapter_id == chapter_id)
+        .order_by(Lesson.sort_order, Lesson.id)
+    ).all()
+    if after is not None:
+        ids = [row.id for row in rows]
+        rows = rows[ids.index(after) + 1:] if after in ids else []
+    return rows
+
+
+# What each content item contributes to the bundle, in lesson order: the
+# fields serialize_content shows, not answers or search vectors.
+_CONTENT_DIGESTS = text("""
+    SELECT lc.lesson_id, md5(string_agg(json_build_array(
+        lc.id, lc.sort_order, lc.content_type, m.text, m.format,
+        q.question_format, q.question_text, q.explanation, q.visualization,
+        t.question_id IS NOT NULL, o.options
+    )::text, ',' ORDER BY lc.sort_order, lc.id)) AS digest
+    FROM lesson_contents lc
+    JOIN lessons l ON l.id = lc.lesson_id
+    LEFT JOIN markdown_contents m ON m.content_id = lc.id
+    LEFT JOIN questions q ON q.content_id = lc.id
+    LEFT JOIN question_templates t ON t.question_id = lc.id
+    LEFT JOIN LATERAL (
+        SELECT json_agg(option_text ORDER BY sort_order, id) AS options
+        FROM question_options WHERE question_id = q.content_id
+    ) o ON true
+    WHERE l.chapter_id = :chapter_id
+    GROUP BY lc.lesson_id
+""")
+
+
+def chapter_etag(db: Session, chapter_id: int, render: str | None = None) -> str | None:
+    """Strong ETag for the bundle, or None if the chapter does not exist."""
+    chapter = _chapter_row(db, chapter_id)
+    if chapter is None:
+        return None
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(orjson.dumps([list(chapter), render]))
+    contents = dict(db.execute(_CONTENT_DIGESTS, {"chapter_id": chapter_id}).all())
+    for lesson in _lesson_rows(db, chapter_id):
+        digest.update(orjson.dumps([list(lesson), contents.get(lesson.id)]))
+    return f'"{digest.hexdigest()}"'
+
+
+def has_lesson(db: Session, chapter_id: int, lesson_id: int) -> bool:
+    return db.execute(
+        select(Lesson.id).where(Lesson.id == lesson_id, Lesson.chapter_id == chapter_id)
+    ).first() is not None
+
+
+def etag_matches(header: str | None, etag: str) -> bool:
+    """Whether an If-None-Match/If-Match header names etag, in any content coding."""
+    if not header:
+        return False
+    for tag in header.split(","):
+        tag = tag.strip().removeprefix("W/")
+        if tag == "*" or tag == etag or tag.rpartition("+")[0] + '"' == etag:
+            return True
+    return False
+
+
+def _lesson_line(lesson, items: list[dict]) -> bytes:
+    meta = {"id": lesson.id, "title": lesson.title, "description": lesson.description, "sort_order": lesson.sort_order}
+    return b'{"lesson":' + orjson.dumps(meta) + b',"contents":' + dump_lesson_content(items) + b"}\n"
+
+
+def build_bundle(db: Session, chapter_id: int, render: str | None = None, after: int | None = None):
+    """Yield the bundle's NDJSON lines as bytes."""
+    chapter = _chapter_row(db, chapter_id)
+    if chapter is None:
+        return
+    lessons = _lesson_rows(db, chapter_id, after)
+    # no transaction (and so no pooled connection) stays open while a slow
+    # client reads; each batch is read in its own
+    db.commit()
+    yield orjson.dumps({"chapter": {**chapter._asdict(), "lessons": len(lessons)}}) + b"\n"
+    for start in range(0, len(lessons), BUNDLE_LESSON_BATCH):
+        batch = lessons[start:start + BUNDLE_LESSON_BATCH]
+        contents = load_contents_by_lesson(db, [lesson.id for lesson in batch])
+        lines = [_lesson_line(lesson, serialize_contents(db, contents[lesson.id], render)) for lesson in batch]
+        db.commit()
+        yield from lines
+    yield orjson.dumps({"end": {"lessons": len(lessons)}}) + b"\n"
+
+
+def stream_bundle(chapter_id: int, render: str | None = None, after: int | None = None):
+    # StreamingResponse outlives request dependencies, so the bundle opens
+    # and closes its own session, on the same database as the ETag
+    db = ReadSessionLocal()
+    try:
+        yield from build_bundle(db, chapter_id, render, after)
+    finally:
+        db.close()
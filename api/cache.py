@@ -0,0 +1,380 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+
+
+# --- Shared backends ---
+
+class CacheBackend:
+    """Interface for a cache shared between workers (e.g. Redis)."""
+
+    def get(self, key: str) -> bytes | None:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: int | None = None) -> None:
+        raise NotImplementedError
+
+    def add(self, key: str, value: bytes, ttl: int | None = None) -> bool:
+        """Store value only if key is absent. Returns True if it was stored."""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+
+class InMemoryBackend(CacheBackend):
+    """Process-local stand-in for a shared backend, used in tests and dev.
+
+    Expired keys are swept every SWEEP_EVERY writes, so keys that are written
+    once and never read again (used refresh-token ids) do not pile up. With
+    max_entries, the oldest keys are evicted beyond that many.
+    """
+
+    SWEEP_EVERY = 1024
+
+    def __init__(self, max_entries: int | None = None):
+        self._data = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.max_entries = max_entries
+
+    def _live(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires is not None and expires < time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def get(self, key):
+        with self._lock:
+            return self._live(key)
+
+    def _store(self, key, value, ttl):
+        # caller holds the lock
+        self._data.pop(key, None)  # re-insert so dict order stays write order
+        self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+        self._writes += 1
+        if self._writes % self.SWEEP_EVERY == 0:
+            now = time.monotonic()
+            for stale in [k for k, (_, expires) in self._data.items() if expires is not None and expires < now]:
+                del self._data[stale]
+        if self.max_entries is not None:
+            while len(self._data) > self.max_entries:
+                del self._data[next(iter(self._data))]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def add(self, key, value, ttl=None):
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self._store(key, value, ttl)
+            return True
+
+    def __len__(self):
+        return len(self._data)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class RedisBackend(CacheBackend):
+    def __init__(self, url: str):
+        import redis
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self._client.get(key)
+
+    def set(self, key, value, ttl=None):
+        self._client.set(key, value, ex=ttl)
+
+    def add(self, key, value, ttl=None):
+        return bool(self._client.set(key, value, ex=ttl, nx=True))
+
+    def delete(self, key):
+        self._client.delete(key)
+
+
+# --- In-process LRU ---
+
+class LRUCache:
+    """Thread-safe LRU bounded by the total size of the stored values."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            self._data.move_to_end(key)
+            return item[0]
+
+    def set(self, key, value, size: int):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._data[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted) = self._data.popitem(last=False)
+                self.current_bytes -= evicted
+
+    def resize(self, key, size: int):
+        """Re-charge an entry whose value grew after it was stored."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return
+            self._data[key] = (item[0], size)
+            self._data.move_to_end(key)
+            self.current_bytes += size - item[1]
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted) = self._data.popitem(last=False)
+                self.current_bytes -= evicted
+
+    def delete(self, key):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.current_bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TTLCache:
+    """Thread-safe LRU bounded by entry count whose entries expire after ttl seconds."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# --- Versioned payload cache ---
+
+class CachedPayload:
+    def __init__(self, body: bytes, version: int, variant: str = ""):
+        self.body = body
+        self.version = version
+        self.etag = f'"{version:x}-{variant}"' if variant else f'"{version:x}"'
+        self.last_modified = formatdate(version / 1e9, usegmt=True)
+        self.encoded = {}  # content coding -> compressed body, filled lazily
+        self._resized = None  # set by the cache holding this payload
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.body) + sum(len(body) for body in self.encoded.values())
+
+    def add_encoded(self, encoding: str, body: bytes) -> None:
+        self.encoded[encoding] = body
+        if self._resized is not None:
+            self._resized(self.nbytes)
+
+    def etag_for(self, encoding: str | None = None) -> str:
+        # each content coding is its own representation, so its own strong tag
+        return f'{self.etag[:-1]}+{encoding}"' if encoding else self.etag
+
+    @property
+    def headers(self):
+        return self.headers_for(None)
+
+    def headers_for(self, encoding: str | None) -> dict:
+        headers = {
+            "ETag": self.etag_for(encoding),
+            "Last-Modified": self.last_modified,
+            "Cache-Control": "no-cache",
+            "Vary": "Accept-Encoding",
+        }
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return headers
+
+    def _same_version(self, tag: str) -> bool:
+        # a client holding the gzip form may revalidate while asking for br
+        return tag == self.etag or tag.rpartition("+")[0] + '"' == self.etag
+
+    def not_modified(self, request_headers) -> bool:
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or any(self._same_version(tag) for tag in tags)
+        if_modified_since = request_headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(self.version / 1e9) <= since
+        return False
+
+
+class VersionedCache:
+    """Caches serialized payloads keyed by an entity id plus a content version.
+
+    The version is a nanosecond timestamp bumped on every invalidation, so it
+    doubles as the Last-Modified time. Payloads stored under an old version are
+    never served again and simply age out of the LRU. When a shared backend is
+    configured, versions and payloads live there too so that an invalidation
+    in one worker is seen by all of them.
+
+    Without a backend, at most max_versions keys keep a version. A key whose
+    version was evicted gets a new one on its next use, which costs a rebuild
+    and never serves anything stale.
+    """
+
+    def __init__(self, namespace: str, max_bytes: int, backend: CacheBackend | None = None, ttl: int = 86400,
+                 max_versions: int = 100000):
+        self.namespace = namespace
+        self.local = LRUCache(max_bytes)
+        self.backend = backend
+        self.ttl = ttl
+        self.max_versions = max_versions
+        self._versions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _version_key(self, key):
+        return f"{self.namespace}:{key}:version"
+
+    def _payload_key(self, key, version, variant=""):
+        suffix = f":{variant}" if variant else ""
+        return f"{self.namespace}:{key}:{version}{suffix}"
+
+    def version(self, key) -> int:
+        if self.backend is None:
+            with self._lock:
+                version = self._versions.get(key)
+                if version is None:
+                    version = self._set_version(key, time.time_ns())
+                else:
+                    self._versions.move_to_end(key)
+                return version
+        stored = self.backend.get(self._version_key(key))
+        if stored is None:
+            self.backend.add(self._version_key(key), str(time.time_ns()).encode())
+            stored = self.backend.get(self._version_key(key))
+        return int(stored)
+
+    def invalidate(self, key) -> None:
+        version = time.time_ns()
+        if self.backend is None:
+            with self._lock:
+                self._set_version(key, version)
+        else:
+            self.backend.set(self._version_key(key), str(version).encode())
+
+    def _set_version(self, key, version: int) -> int:
+        # caller holds the lock
+        self._versions.pop(key, None)
+        self._versions[key] = version
+        while len(self._versions) > self.max_versions:
+            self._versions.popitem(last=False)
+        return version
+
+    def peek(self, key, variant: str = "") -> CachedPayload | None:
+        """The locally cached payload, if finding it needs no I/O.
+
+        Always None with a shared backend, where even the version is a
+        network round trip; callers then go through get_or_build.
+        """
+        if self.backend is not None:
+            return None
+        return self.local.get((key, self.version(key), variant))
+
+    def get_or_build(self, key, build, settle: float = 0, variant: str = "") -> CachedPayload:
+        """Return the cached payload for key, calling build() -> bytes on a miss.
+
+        With settle > 0 a payload for a version younger than that many seconds
+        is served but not stored, for builds that may read a lagging replica.
+        Variants (e.g. a rendered form) share the key's version, so one
+        invalidation retires all of them, but are stored and tagged separately.
+        """
+        version = self.version(key)
+        cached = self.local.get((key, version, variant))
+        if cached is not None:
+            return cached
+        if settle and time.time_ns() - version < settle * 1e9:
+            return CachedPayload(build(), version, variant)
+
+        body = None
+        if self.backend is not None:
+            body = self.backend.get(self._payload_key(key, version, variant))
+        if body is None:
+            body = build()
+            if self.backend is not None:
+                self.backend.set(self._payload_key(key, version, variant), body, ttl=self.ttl)
+
+        cached = CachedPayload(body, version, variant)
+        local_key = (key, version, variant)
+        self.local.set(local_key, cached, len(body))
+        # compressed forms added later are charged to the same entry
+        cached._resized = lambda size: self.local.resize(local_key, size)
+        return cached
+
+
+def backend_from_env() -> CacheBackend | None:
+    url = os.getenv("CACHE_REDIS_URL")
+    return RedisBackend(url) if url else None
+
+
+shared_backend = backend_from_env()
+
+lesson_cache = VersionedCache(
+    "lesson",
+    max_bytes=int(os.getenv("LESSON_CACHE_MAX_BYTES", 32 * 1024 * 1024)),
+    max_versions=int(os.getenv("LESSON_CACHE_MAX_VERSIONS", 100000)),
+    backend=shared_backend,
+)
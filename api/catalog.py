@@ -0,0 +1,87 @@
+import base64
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session
+from models import Course, CourseTag, Tag
+
+# Columns a client may ask for with ?fields=. "tags" is resolved with one extra
+# query for the whole page rather than a join that would multiply rows.
+CATALOG_FIELDS = ("title", "description", "image_url", "created_at", "updated_at", "created_by", "tags")
+DEFAULT_FIELDS = ("title", "image_url", "created_at")
+
+
+def encode_cursor(created_at: datetime, course_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{course_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, course_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), int(course_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def parse_fields(fields: str | None) -> list[str]:
+    if not fields:
+        return list(DEFAULT_FIELDS)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in CATALOG_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return requested
+
+
+def list_courses(db: Session, limit: int, cursor: str | None = None, fields: str | None = None, tags: list[str] | None = None):
+    """Keyset-paginated catalog, newest first, ordered by (created_at, id).
+
+    Each page is an index range scan on idx_courses_created_id, so the cost
+    does not depend on how deep into the catalog the client has paged.
+    """
+    wanted = parse_fields(fields)
+    columns = [getattr(Course, f) for f in wanted if f not in ("tags", "created_at")]
+    stmt = select(Course.id, Course.created_at, *columns)
+
+    for tag in tags or ():
+        stmt = stmt.where(
+            select(CourseTag.course_id)
+            .join(Tag, Tag.id == CourseTag.tag_id)
+            .where(CourseTag.course_id == Course.id, Tag.name == tag)
+            .exists()
+        )
+
+    if cursor:
+        stmt = stmt.where(tuple_(Course.created_at, Course.id) < decode_cursor(cursor))
+
+    stmt = stmt.order_by(Course.created_at.desc(), Course.id.desc()).limit(limit + 1)
+    rows = db.execute(stmt).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items = []
+    for row in rows:
+        item = {"id": row.id}
+        for f in wanted:
+            if f != "tags":
+                item[f] = getattr(row, f)
+        items.append(item)
+
+    if "tags" in wanted and items:
+        by_course = {item["id"]: item for item in items}
+        for item in items:
+            item["tags"] = []
+        tag_rows = db.execute(
+            select(CourseTag.course_id, Tag.name)
+            .join(Tag, Tag.id == CourseTag.tag_id)
+            .where(CourseTag.course_id.in_(by_course))
+            .order_by(Tag.name)
+        )
+        for course_id, name in tag_rows:
+            by_course[course_id]["tags"].append(name)
+
+    next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None
+    return {"items": items, "next_cursor": next_cursor}
@@ -0,0 +1,139 @@
+import gzip
+import os
+import zlib
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # optional; without it only gzip is offered
+    brotli = None
+
+# Bodies smaller than this are sent as-is: below ~1 KB the framing overhead
+# and CPU cost outweigh the bytes saved.
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1024))
+
+# Dynamic responses are compressed on every request, so they get cheap levels;
+# cached payloads are compressed once per version and can afford more.
+DYNAMIC_LEVELS = {"br": 4, "gzip": 6}
+CACHED_LEVELS = {"br": 9, "gzip": 9}
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+def available_encodings() -> tuple[str, ...]:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encoding: str | None) -> str | None:
+    """Pick the best supported coding from an Accept-Encoding header."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip().lower()] = q
+    best = None
+    for coding in available_encodings():
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > 0 and (best is None or q > best[1]):
+            best = (coding, q)
+    return best[0] if best else None
+
+
+def compress(body: bytes, encoding: str, level: int | None = None) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=DYNAMIC_LEVELS["br"] if level is None else level)
+    return gzip.compress(body, compresslevel=DYNAMIC_LEVELS["gzip"] if level is None else level, mtime=0)
+
+
+def compress_stream(chunks, encoding: str):
+    """Compress an iterator of byte chunks, flushing after each one.
+
+    Every chunk is decodable as soon as it arrives, so a streamed body stays
+    incremental for the client while still being compressed as a whole.
+    """
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=DYNAMIC_LEVELS["br"])
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+        return
+    compressor = zlib.compressobj(DYNAMIC_LEVELS["gzip"], zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def precompressed(payload, encoding: str) -> bytes:
+    """Compressed body of a CachedPayload, computed once and kept with it."""
+    body = payload.encoded.get(encoding)
+    if body is None:
+        body = compress(payload.body, encoding, CACHED_LEVELS[encoding])
+        payload.add_encoded(encoding, body)
+    return body
+
+
+def _compressible(content_type: str | None) -> bool:
+    return bool(content_type) and content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """gzip/brotli for complete (non-streaming) responses above a size threshold.
+
+    Responses that already carry a Content-Encoding, such as pre-compressed
+    cached payloads, and streamed bodies pass through untouched.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if start is None:
+                await send(message)
+                return
+
+            response_start, start = start, None
+            headers = MutableHeaders(raw=response_start["headers"])
+            body = message.get("body", b"")
+            if (
+                message.get("more_body", False)
+                or "content-encoding" in headers
+                or not _compressible(headers.get("content-type"))
+            ):
+                await send(response_start)
+                await send(message)
+                return
+
+            headers.add_vary_header("Accept-Encoding")
+            if len(body) >= self.minimum_size:
+                body = compress(body, encoding)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                message = {"type": "http.response.body", "body": body}
+            await send(response_start)
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,196 @@
+from pydantic import TypeAdapter
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, selectinload
+from models import Lesson, LessonContent, MarkdownContent, Question, QuestionOption, QuestionTemplate, ShortAnswerQuestion
+from cache import lesson_cache
+from database import DB_REPLICA_MAX_LAG, ReadSessionLocal, is_read_only
+from render import render_items
+from schemas import LessonContentOut
+
+lesson_content_adapter = TypeAdapter(list[LessonContentOut])
+
+
+def lesson_content_query(db: Session):
+    # Eager-load every child table with one SELECT ... IN per relationship so a
+    # lesson costs a fixed number of queries no matter how many items it has.
+    question = selectinload(LessonContent.question)
+    return db.query(LessonContent).options(
+        selectinload(LessonContent.markdown),
+        question.selectinload(Question.options),
+        question.selectinload(Question.short_answer),
+        question.selectinload(Question.template),
+    )
+
+
+def serialize_content(content: LessonContent):
+    if content.content_type == 'markdown':
+        markdown = content.markdown
+        if not markdown:
+            return None
+        return {
+            "id": content.id,
+            "type": "markdown",
+            "data": {
+                "text": markdown.text,
+                "format": markdown.format
+            }
+        }
+
+    if content.content_type == 'question':
+        question = content.question
+        if not question:
+            return None
+
+        item = None
+        if question.question_format == 'multiple_choice':
+            item = {
+                "id": content.id,
+                "type": "question",
+                "data": {
+                    "format": "multiple_choice",
+                    "question": question.question_text,
+                    # a template's options differ per student
+                    "options": [] if question.template else [opt.option_text for opt in question.options],
+                    "explanation": question.explanation,
+                    "visualization": bool(question.visualization)
+                }
+            }
+        if question.question_format == 'short_answer':
+            item = {
+                "id": content.id,
+                "type": "question",
+                "data": {
+                    "format": "short_answer",
+                    "question": question.question_text,
+                    "explanation": question.explanation,
+                    "visualization": bool(question.visualization)
+                }
+            }
+        if item is not None and question.template:
+            # the shared payload keeps the {{placeholders}}; each student's
+            # numbers come from /lessons/{id}/variants
+            item["data"]["variant"] = True
+        return item
+
+    return None
+
+
+def load_contents_by_lesson(db: Session, lesson_ids: list[int]) -> dict[int, list[LessonContent]]:
+    by_lesson = {lesson_id: [] for lesson_id in lesson_ids}
+    rows = (
+        lesson_content_query(db)
+        .filter(LessonContent.lesson_id.in_(lesson_ids))
+        .order_by(LessonContent.lesson_id, LessonContent.sort_order)
+        .all()
+    )
+    for content in rows:
+        by_lesson[content.lesson_id].append(content)
+    return by_lesson
+
+
+def load_lesson_content(db: Session, lesson_id: int, render: str | None = None) -> list[dict]:
+    contents = (
+        lesson_content_query(db)
+        .filter(LessonContent.lesson_id == lesson_id)
+        .order_by(LessonContent.sort_order)
+        .all()
+    )
+
+    return serialize_contents(db, contents, render)
+
+
+def serialize_contents(db: Session, contents: list[LessonContent], render: str | None = None) -> list[dict]:
+    output = []
+    for content in contents:
+        item = serialize_content(content)
+        if item is not None:
+            output.append(item)
+    if render == "html":
+        output = render_items(db, output)
+    return output
+
+
+def dump_lesson_content(items: list[dict]) -> bytes:
+    # Validated against the response schema once per cache build instead of
+    # on every request; fields the serializer did not set stay out.
+    return lesson_content_adapter.dump_json(lesson_content_adapter.validate_python(items), exclude_unset=True)
+
+
+def lesson_payload(db: Session, lesson_id: int, render: str | None = None):
+    settle = DB_REPLICA_MAX_LAG if is_read_only(db) else 0
+    return lesson_cache.get_or_build(
+        lesson_id,
+        lambda: dump_lesson_content(load_lesson_content(db, lesson_id, render)),
+        settle=settle,
+        variant=render or "",
+    )
+
+
+def read_lesson_payload(lesson_id: int, render: str | None = None):
+    """lesson_payload on its own read session, for run_in_threadpool.
+
+    A miss renders markdown and LaTeX and may wait on the shared cache,
+    none of which may run on the event loop (where run_db puts an
+    AsyncSession's work).
+    """
+    db = ReadSessionLocal()
+    try:
+        return lesson_payload(db, lesson_id, render)
+    finally:
+        db.close()
+
+
+# --- Cache invalidation ---
+# Any flushed write to a lesson's content tables marks that lesson dirty; the
+# cached payload is invalidated once the transaction actually commits.
+
+def _touched_lessons(session: Session) -> set[int]:
+    lesson_ids = set()
+    content_ids = set()
+
+    for obj in list(session.deleted):
+        if isinstance(obj, Lesson):
+            lesson_ids.add(obj.id)
+
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, LessonContent):
+            lesson_ids.add(obj.lesson_id)
+            # a content row moved to another lesson dirties the old one too
+            lesson_ids.update(inspect(obj).attrs.lesson_id.history.deleted or ())
+        elif isinstance(obj, (MarkdownContent, Question)):
+            content_ids.add(obj.content_id)
+        elif isinstance(obj, (QuestionOption, ShortAnswerQuestion, QuestionTemplate)):
+            content_ids.add(obj.question_id)
+
+    content_ids.discard(None)
+    if content_ids:
+        rows = session.execute(
+            select(LessonContent.lesson_id).where(LessonContent.id.in_(content_ids))
+        )
+        lesson_ids.update(row.lesson_id for row in rows)
+
+    lesson_ids.discard(None)
+    return lesson_ids
+
+
+def mark_lessons_dirty(session: Session, lesson_ids) -> None:
+    """Invalidate these lessons' payloads when the session commits, for writes that bypass the ORM."""
+    session.info.setdefault("dirty_lessons", set()).update(lesson_ids)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_dirty_lessons(session, flush_context):
+    # new/dirty/deleted still describe the flushed objects here, and foreign
+    # keys of freshly inserted rows have been populated.
+    mark_lessons_dirty(session, _touched_lessons(session))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_dirty_lessons(session):
+    for lesson_id in session.info.pop("dirty_lessons", ()):
+        lesson_cache.invalidate(lesson_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_dirty_lessons(session):
+    session.info.pop("dirty_lessons", None)
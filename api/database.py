@@ -1,17 +1,224 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+import functools
+import os
+import time
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.concurrency import run_in_threadpool
+from instrumentation import instrument_engine
+from metrics import Counter, Gauge, Histogram
 
-DATABASE_URL = "postgresql://learn:example@db:5432/learn"
 
-engine = create_engine(DATABASE_URL)
+def _env_url(name: str, default: str | None = None) -> str | None:
+    url = os.getenv(name, default)
+    # docker-compose passes the libpq-style scheme, which SQLAlchemy rejects
+    if url and url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def _async_url(url: str | None) -> str | None:
+    return url.replace("postgresql://", "postgresql+asyncpg://", 1) if url else None
+
+
+DATABASE_URL = _env_url("DATABASE_URL", "postgresql://learn:example@db:5432/learn")
+ASYNC_DATABASE_URL = _async_url(DATABASE_URL)
+
+# When set, read routes (get_read_db) are served from this replica.
+DATABASE_REPLICA_URL = _env_url("DATABASE_REPLICA_URL")
+# Seconds of replication lag to tolerate: payloads built from the replica for
+# content changed more recently than this are served but not cached.
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", 5))
+
+# "async" serves read routes from an asyncpg-backed AsyncSession on the event
+# loop; "sync" keeps them on the psycopg2 engine, run in the threadpool.
+DB_MODE = os.getenv("DB_MODE", "async")
+
+# DB_POOL_SIZE and DB_MAX_OVERFLOW are a worker's connection budget per
+# database. With DB_MODE=async the psycopg2 engine (writes, threadpool work)
+# and the asyncpg engine (read routes) split it, about half each unless
+# DB_ASYNC_POOL_SIZE / DB_ASYNC_MAX_OVERFLOW say otherwise, so that adding the
+# async engine does not double what each worker may open.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_ASYNC_POOL_SIZE = int(os.getenv("DB_ASYNC_POOL_SIZE", (DB_POOL_SIZE + 1) // 2)) if DB_MODE == "async" else 0
+DB_ASYNC_MAX_OVERFLOW = int(os.getenv("DB_ASYNC_MAX_OVERFLOW", (DB_MAX_OVERFLOW + 1) // 2)) if DB_MODE == "async" else 0
+
+_POOL_COMMON = {
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", 30)),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+    "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") == "1",
+}
+POOL_OPTIONS = {
+    **_POOL_COMMON,
+    "pool_size": max(1, DB_POOL_SIZE - DB_ASYNC_POOL_SIZE),
+    "max_overflow": max(0, DB_MAX_OVERFLOW - DB_ASYNC_MAX_OVERFLOW),
+}
+ASYNC_POOL_OPTIONS = {
+    **_POOL_COMMON,
+    "pool_size": max(1, DB_ASYNC_POOL_SIZE),
+    "max_overflow": DB_ASYNC_MAX_OVERFLOW,
+}
+
+
+# --- Pool instrumentation ---
+
+_pools = {}
+
+pool_checkout_wait = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", labels=("pool",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+pool_overflow_events = Counter("db_pool_overflow_total", "Connections opened beyond pool_size", labels=("pool",))
+pool_timeouts = Counter("db_pool_timeouts_total", "Checkouts that gave up after pool_timeout", labels=("pool",))
+pool_checked_out = Gauge(
+    "db_pool_checked_out", "Connections currently checked out", labels=("pool",),
+    collect=lambda: (({"pool": name}, pool.checkedout()) for name, pool in _pools.items()),
+)
+pool_overflow = Gauge(
+    "db_pool_overflow", "Current overflow connections (negative while the pool is still filling)", labels=("pool",),
+    collect=lambda: (({"pool": name}, pool.overflow()) for name, pool in _pools.items()),
+)
+
+
+class _InstrumentedPoolMixin:
+    # logging_name survives Pool.recreate(), so it doubles as the metric label
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        _pools[self.logging_name] = self
+
+    def _do_get(self):
+        overflow_before = self._overflow
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_timeouts.inc(pool=self.logging_name)
+            raise
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - start, pool=self.logging_name)
+            if self._overflow > overflow_before and self._overflow > 0:
+                pool_overflow_events.inc(pool=self.logging_name)
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncPool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+# --- Engines and sessions ---
+
+# Every engine this process owns, for warm-up and disposal
+engines = []
+async_engines = []
+
+engine = create_engine(DATABASE_URL, poolclass=InstrumentedQueuePool, pool_logging_name="primary", **POOL_OPTIONS)
+instrument_engine(engine)
+engines.append(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+ReadSessionLocal = SessionLocal
+if DATABASE_REPLICA_URL:
+    replica_engine = create_engine(
+        DATABASE_REPLICA_URL, poolclass=InstrumentedQueuePool, pool_logging_name="replica", **POOL_OPTIONS
+    )
+    instrument_engine(replica_engine)
+    engines.append(replica_engine)
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine, info={"read_only": True})
+
+async_engine = None
+AsyncSessionLocal = None
+AsyncReadSessionLocal = None
+if DB_MODE == "async":
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL, poolclass=InstrumentedAsyncPool, pool_logging_name="primary_async", **ASYNC_POOL_OPTIONS
+    )
+    instrument_engine(async_engine)
+    async_engines.append(async_engine)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autocommit=False, autoflush=False, expire_on_commit=False)
+    AsyncReadSessionLocal = AsyncSessionLocal
+    if DATABASE_REPLICA_URL:
+        async_replica_engine = create_async_engine(
+            _async_url(DATABASE_REPLICA_URL), poolclass=InstrumentedAsyncPool,
+            pool_logging_name="replica_async", **ASYNC_POOL_OPTIONS
+        )
+        instrument_engine(async_replica_engine)
+        async_engines.append(async_replica_engine)
+        AsyncReadSessionLocal = async_sessionmaker(
+            async_replica_engine, autocommit=False, autoflush=False, expire_on_commit=False,
+            info={"read_only": True},
+        )
+
 Base = declarative_base()
 
+
+def reset_pools_after_fork() -> None:
+    """Drop pooled connections inherited from a parent process without closing them."""
+    for e in engines:
+        e.dispose(close=False)
+    for e in async_engines:
+        e.sync_engine.dispose(close=False)
+
+async def dispose_engines() -> None:
+    for e in async_engines:
+        await e.dispose()
+    for e in engines:
+        await run_in_threadpool(e.dispose)
+
+
+# --- Schema version ---
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+@functools.cache
+def migration_head() -> str:
+    """Head revision of the migration scripts shipped with this build."""
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+    config = Config()
+    config.set_main_option("script_location", MIGRATIONS_DIR)
+    return ScriptDirectory.from_config(config).get_current_head()
+
+def schema_revision(db) -> str | None:
+    # raises while the database is down or before the first migration
+    return db.execute(text("SELECT version_num FROM alembic_version")).scalar()
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_read_db():
+    if DB_MODE == "async":
+        async with AsyncReadSessionLocal() as db:
+            yield db
+    else:
+        db = ReadSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+def is_read_only(db) -> bool:
+    return bool(db.info.get("read_only"))
+
+async def run_db(db, fn, *args):
+    """Run fn(session, *args) without blocking the event loop.
+
+    Query code is written once against the sync Session API: with an
+    AsyncSession it runs through run_sync on the asyncpg connection, with a
+    plain Session it is pushed to the threadpool.
+    """
+    if hasattr(db, "run_sync"):
+        return await db.run_sync(fn, *args)
+    return await run_in_threadpool(fn, db, *args)
@@ -0,0 +1,291 @@
+import logging
+import os
+import re
+import sys
+from fractions import Fraction
+import numpy as np
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session, joinedload
+from cache import LRUCache, lesson_cache
+from database import ReadSessionLocal
+from models import CourseStudent, Lesson, LessonContent, Question, QuestionOption, QuestionTemplate, ShortAnswerQuestion, Submission
+from variants import CompiledTemplate, TemplateError
+
+logger = logging.getLogger(__name__)
+
+ANSWER_KEY_CACHE_BYTES = int(os.getenv("ANSWER_KEY_CACHE_BYTES", 8 * 1024 * 1024))
+CLASS_VARIANT_CACHE_BYTES = int(os.getenv("CLASS_VARIANT_CACHE_BYTES", 32 * 1024 * 1024))
+# Attempts at a question after which its answer and explanation are shown
+# even if none was correct
+REVEAL_AFTER_ATTEMPTS = int(os.getenv("REVEAL_AFTER_ATTEMPTS", 3))
+
+# Compiled keys are cached per (lesson id, lesson content version), so any
+# write that invalidates the lesson payload also retires its answer key.
+answer_keys = LRUCache(ANSWER_KEY_CACHE_BYTES)
+# Templated questions' variants for every student enrolled in the lesson's
+# course, one vectorized batch per question, under the same key.
+class_variants = LRUCache(CLASS_VARIANT_CACHE_BYTES)
+
+
+# --- Answer normalization ---
+
+_LATEX_FRAC = re.compile(r"\\[dt]?frac\{([^{}]*)\}\{([^{}]*)\}")
+_LATEX_NOISE = re.compile(r"\\left|\\right|\\[,;!: ]|\\displaystyle|\\mathrm|\\text")
+_NUMBER = re.compile(r"^[+-]?(\d+(\.\d*)?|\.\d+)$")
+
+
+def normalize_answer(answer) -> tuple:
+    """Reduce an answer to a comparable key.
+
+    Numbers compare by value ("20", "20.0", "$20$", "40/2" and "\\frac{40}{2}"
+    are all equal); anything else compares as lowercased LaTeX-ish text with
+    delimiters, spacing commands and whitespace removed.
+    """
+    text = str(answer).strip()
+    if text.startswith("\\(") and text.endswith("\\)"):
+        text = text[2:-2]
+    text = text.strip("$").strip()
+    text = text.replace("\u2212", "-").replace("\\cdot", "*").replace("\\times", "*")
+    text = _LATEX_NOISE.sub("", text)
+    text = _LATEX_FRAC.sub(r"(\1)/(\2)", text)
+    text = re.sub(r"\s+", "", text).replace("{", "").replace("}", "")
+
+    numeric = _unwrap(text)
+    try:
+        if _NUMBER.match(numeric):
+            return ("num", Fraction(numeric))
+        if numeric.count("/") == 1:
+            num, den = (_unwrap(part) for part in numeric.split("/"))
+            if _NUMBER.match(num) and _NUMBER.match(den) and Fraction(den) != 0:
+                return ("num", Fraction(num) / Fraction(den))
+    except ValueError:
+        pass  # too many digits for int(); compare as text
+    return ("text", text.lower())
+
+
+def _unwrap(text: str) -> str:
+    """Drop one pair of parentheses around the whole of text: "(20)" but not "2(3)" or "(1)(2)"."""
+    if not (text.startswith("(") and text.endswith(")")):
+        return text
+    depth = 0
+    for char in text[1:-1]:
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        if depth < 0:
+            return text
+    return text[1:-1] if depth == 0 else text
+
+
+# --- Answer keys ---
+
+class AnswerKeyEntry:
+    __slots__ = ("format", "correct", "correct_answer", "explanation", "template")
+
+    def __init__(self, format: str, correct, correct_answer, explanation, template: CompiledTemplate | None = None):
+        self.format = format
+        self.correct = correct
+        self.correct_answer = correct_answer
+        self.explanation = explanation
+        # set for parameterized questions: the real key is per student
+        self.template = template
+
+    @classmethod
+    def for_variant(cls, format: str, variant: dict) -> "AnswerKeyEntry":
+        if format == "multiple_choice":
+            index = variant["correct_index"]
+            return cls(format, frozenset((index,)), index, variant["explanation"])
+        return cls(format, normalize_answer(variant["answer"]), variant["answer"], variant["explanation"])
+
+    def grade(self, answer) -> bool:
+        if self.format == "multiple_choice":
+            try:
+                return int(answer) in self.correct
+            except (TypeError, ValueError):
+                return False
+        return normalize_answer(answer) == self.correct
+
+
+def compile_answer_key(db: Session, lesson_id: int) -> dict[int, AnswerKeyEntry]:
+    questions = db.execute(
+        select(Question.content_id, Question.question_format, Question.explanation, ShortAnswerQuestion.correct_answer)
+        .join(LessonContent, LessonContent.id == Question.content_id)
+        .outerjoin(ShortAnswerQuestion, ShortAnswerQuestion.question_id == Question.content_id)
+        .where(LessonContent.lesson_id == lesson_id)
+        .order_by(LessonContent.sort_order)
+    ).all()
+    options = db.execute(
+        select(QuestionOption.question_id, QuestionOption.is_correct)
+        .join(LessonContent, LessonContent.id == QuestionOption.question_id)
+        .where(LessonContent.lesson_id == lesson_id)
+        .order_by(QuestionOption.question_id, QuestionOption.sort_order)
+    ).all()
+
+    correct_options = {}
+    for question_id, is_correct in options:
+        correct_options.setdefault(question_id, []).append(bool(is_correct))
+
+    key = {}
+    for content_id, question_format, explanation, correct_answer in questions:
+        if question_format == "multiple_choice":
+            flags = correct_options.get(content_id, [])
+            correct = frozenset(i for i, flag in enumerate(flags) if flag)
+            key[content_id] = AnswerKeyEntry("multiple_choice", correct, min(correct, default=None), explanation)
+        else:
+            answer = correct_answer or ""
+            key[content_id] = AnswerKeyEntry("short_answer", normalize_answer(answer), answer, explanation)
+
+    templates = db.execute(
+        select(QuestionTemplate)
+        .join(LessonContent, LessonContent.id == QuestionTemplate.question_id)
+        .where(LessonContent.lesson_id == lesson_id)
+        .options(joinedload(QuestionTemplate.question))
+    ).scalars()
+    for template in templates:
+        try:
+            key[template.question_id].template = CompiledTemplate.from_row(template.question, template)
+        except TemplateError:
+            # validated when saved; keep the static key rather than fail the lesson
+            logger.exception("question %s has an invalid template", template.question_id)
+    return key
+
+
+def get_answer_key(db: Session, lesson_id: int) -> dict[int, AnswerKeyEntry]:
+    version = lesson_cache.version(lesson_id)
+    key = answer_keys.get((lesson_id, version))
+    if key is None:
+        key = compile_answer_key(db, lesson_id)
+        size = sys.getsizeof(key) + sum(
+            256 + len(str(entry.correct_answer)) + len(entry.explanation or "") for entry in key.values()
+        )
+        answer_keys.set((lesson_id, version), key, size)
+    return key
+
+
+# --- Variants ---
+#
+# Evaluating a class batch is NumPy work that can take a while for a large
+# course, so async callers run these through run_in_threadpool rather than
+# run_db, which with DB_MODE=async runs on the event loop. They take the
+# answer key from get_answer_key and open their own session if they need one.
+
+def has_templates(key: dict[int, AnswerKeyEntry]) -> bool:
+    return any(entry.template is not None for entry in key.values())
+
+
+def _class_batches(lesson_id: int, key: dict[int, AnswerKeyEntry]) -> dict:
+    version = lesson_cache.version(lesson_id)
+    batches = class_variants.get((lesson_id, version))
+    if batches is None:
+        with ReadSessionLocal() as db:
+            user_ids = db.execute(
+                select(CourseStudent.user_id)
+                .join(Lesson, Lesson.course_id == CourseStudent.course_id)
+                .where(Lesson.id == lesson_id)
+            ).scalars().all()
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        batches = {
+            content_id: entry.template.evaluate(user_ids)
+            for content_id, entry in key.items() if entry.template is not None
+        }
+        class_variants.set((lesson_id, version), batches, 256 + sum(b.nbytes() for b in batches.values()))
+    return batches
+
+
+def user_variants(lesson_id: int, user_id: int, key: dict[int, AnswerKeyEntry]) -> dict[int, dict]:
+    """Each templated question's variant for one student, by content id.
+
+    Read from the class batch; students who enrolled after it was built (or
+    are not enrolled) are evaluated on their own, which gives the same
+    numbers since variants depend only on the seed.
+    """
+    if not has_templates(key):
+        return {}
+    batches = _class_batches(lesson_id, key)
+    variants = {}
+    for content_id, entry in key.items():
+        if entry.template is None:
+            continue
+        batch = batches.get(content_id)
+        if batch is None or user_id not in batch:
+            batch = entry.template.evaluate([user_id])
+        variants[content_id] = batch.variant(user_id)
+    return variants
+
+
+def question_variants(lesson_id: int, user_id: int, key: dict[int, AnswerKeyEntry]) -> list[dict]:
+    """What GET /lessons/{id}/variants shows a student: numbers filled in, no answers."""
+    variants = user_variants(lesson_id, user_id, key)
+    return [
+        {"content_id": content_id, "question": variant["question"], "options": variant.get("options")}
+        for content_id, variant in variants.items()
+    ]
+
+
+# --- Grading ---
+
+def grade_submission(db: Session, lesson_id: int, user_id: int, answers, variants: dict | None = None) -> dict:
+    """Grade a batch of answers against the lesson's key and record them.
+
+    The correct answer and explanation come back only once the student has
+    answered the question correctly or made REVEAL_AFTER_ATTEMPTS attempts
+    at it, so throwaway answers cannot be used to read the key. Templated
+    questions are graded against `variants` from user_variants, which is
+    computed here if not given. All results are persisted with one
+    multi-row INSERT. Raises KeyError with the offending id if an answer
+    targets a question outside the lesson.
+    """
+    key = get_answer_key(db, lesson_id)
+    history = {
+        row.content_id: row for row in db.execute(
+            select(
+                Submission.content_id,
+                func.count().label("attempts"),
+                func.bool_or(Submission.is_correct).label("solved"),
+            )
+            .where(
+                Submission.user_id == user_id, Submission.lesson_id == lesson_id,
+                Submission.content_id.in_({item.content_id for item in answers}),
+            )
+            .group_by(Submission.content_id)
+        )
+    }
+    attempts = {content_id: row.attempts for content_id, row in history.items()}
+    solved = {content_id for content_id, row in history.items() if row.solved}
+
+    results, rows = [], []
+    for item in answers:
+        entry = key.get(item.content_id)
+        if entry is None:
+            raise KeyError(item.content_id)
+        if entry.template is not None:
+            if variants is None:
+                variants = user_variants(lesson_id, user_id, key)
+            entry = AnswerKeyEntry.for_variant(entry.format, variants[item.content_id])
+        correct = entry.grade(item.answer)
+        attempts[item.content_id] = attempts.get(item.content_id, 0) + 1
+        if correct:
+            solved.add(item.content_id)
+        reveal = item.content_id in solved or attempts[item.content_id] >= REVEAL_AFTER_ATTEMPTS
+        results.append({
+            "content_id": item.content_id,
+            "correct": correct,
+            "correct_answer": entry.correct_answer if reveal else None,
+            "explanation": entry.explanation if reveal else None,
+        })
+        rows.append({
+            "user_id": user_id,
+            "lesson_id": lesson_id,
+            "content_id": item.content_id,
+            "answer": str(item.answer),
+            "is_correct": correct,
+        })
+
+    if rows:
+        db.execute(insert(Submission).values(rows))
+        db.commit()
+
+    return {
+        "lesson_id": lesson_id,
+        "score": sum(r["correct"] for r in results),
+        "total": len(results),
+        "results": results,
+    }
@@ -0,0 +1,75 @@
+"""Production server profile: gunicorn managing uvicorn workers.
+
+    gunicorn main:app -c gunicorn.conf.py
+
+Every setting can be overridden from the environment (or on the command
+line). Metrics are per process: /metrics reports the worker that answered.
+
+More than one worker needs CACHE_REDIS_URL. Without it the lesson cache
+versions and payloads, principal epochs and the refresh-token store all
+live in each process, so a write or logout handled by one worker is never
+seen by the others: they keep serving stale lessons and answer keys,
+accept revoked refresh tokens and disagree on bundle ETags. Without a
+shared backend workers default to 1, and asking for more fails at startup.
+"""
+import os
+
+
+def _cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# Async workers each keep a core busy, so one per core; more only adds
+# context switching and a pool's worth of connections each.
+SHARED_STATE = bool(os.getenv("CACHE_REDIS_URL"))
+workers = int(os.getenv("WEB_CONCURRENCY", _cpus() if SHARED_STATE else 1))
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', 8000)}"
+
+# Import the app once in the master and fork workers from it: faster boots,
+# and the imported code is shared copy-on-write. Pools hold no connections
+# at import time, and post_fork drops any a preload hook may have opened.
+preload_app = os.getenv("PRELOAD", "1") == "1"
+
+# Longer than the load balancer's idle timeout (60s on most), so the proxy,
+# not us, closes idle keep-alive connections and never races a reuse.
+keepalive = int(os.getenv("KEEPALIVE", 75))
+# Accept queue handed to listen(); the kernel caps it at net.core.somaxconn.
+backlog = int(os.getenv("BACKLOG", 2048))
+
+# On SIGTERM workers stop accepting, finish in-flight requests, then run the
+# app's lifespan shutdown (progress flush, then pool disposal) within this window.
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", 30))
+timeout = int(os.getenv("WORKER_TIMEOUT", 60))
+
+# Recycle workers after this many requests (0 = never); jitter staggers them.
+max_requests = int(os.getenv("MAX_REQUESTS", 0))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", max_requests // 10))
+
+accesslog = os.getenv("ACCESS_LOG")  # "-" for stdout; off by default
+# Proxies whose X-Forwarded-Proto/-For uvicorn applies (exact addresses or
+# "*"). Login rate limiting reads X-Forwarded-For itself and trusts
+# TRUSTED_PROXIES, which also takes CIDR ranges, e.g. a compose network.
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+# Argon2 threads default to one per core per process; split the cores
+# between workers instead so a login burst cannot oversubscribe the box.
+os.environ.setdefault("PASSWORD_HASH_WORKERS", str(max(1, _cpus() // workers)))
+os.environ.setdefault("WARMUP", "1")
+
+
+def on_starting(server):
+    # checked here rather than above so that -w on the command line counts too
+    if server.cfg.workers > 1 and not SHARED_STATE:
+        raise RuntimeError(
+            f"{server.cfg.workers} workers need CACHE_REDIS_URL: caches, token "
+            "revocations and principal epochs are otherwise per process"
+        )
+
+
+def post_fork(server, worker):
+    from database import reset_pools_after_fork
+    reset_pools_after_fork()
@@ -0,0 +1,150 @@
+"""Per-request performance accounting.
+
+InstrumentationMiddleware opens a RequestStats for every HTTP request in a
+context variable. The engine listeners installed by instrument_engine() add
+each query's count, time and SQL to it, and the password hashing service adds
+Argon2 time, so both land on the request that caused them. That holds even
+when the work runs in the threadpool or through AsyncSession.run_sync, since
+both carry the context along.
+"""
+import contextvars
+import logging
+import os
+import time
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+from metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", 500))
+# Adds X-Query-Count and X-DB-Time to every response; meant for development.
+PERF_DEBUG_HEADERS = os.getenv("PERF_DEBUG_HEADERS", "0") == "1"
+# Statements kept per request for the slow-request log
+SLOW_LOG_STATEMENTS = 50
+SLOW_LOG_STATEMENT_CHARS = 1000
+
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+request_seconds = Histogram(
+    "http_request_duration_seconds", "Request latency", labels=("method", "route", "status")
+)
+request_queries = Histogram(
+    "http_request_db_queries", "SQL statements executed per request", labels=("route",), buckets=QUERY_BUCKETS
+)
+request_db_seconds = Histogram("http_request_db_seconds", "Time spent in SQL per request", labels=("route",))
+request_hash_seconds = Histogram(
+    "http_request_password_hash_seconds", "Argon2 time per request, for requests that hash", labels=("route",)
+)
+slow_requests = Counter("http_slow_requests_total", "Requests slower than SLOW_REQUEST_MS", labels=("route",))
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds", "hash_seconds", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.hash_seconds = 0.0
+        self.statements = []  # (seconds, sql), first SLOW_LOG_STATEMENTS only
+
+
+_current = contextvars.ContextVar("request_stats", default=None)
+
+
+def current_stats() -> RequestStats | None:
+    return _current.get()
+
+
+def record_password_hash(seconds: float) -> None:
+    stats = _current.get()
+    if stats is not None:
+        stats.hash_seconds += seconds
+
+
+# --- SQL accounting ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = _current.get()
+    if stats is None:
+        return
+    stats.queries += 1
+    stats.db_seconds += elapsed
+    if len(stats.statements) < SLOW_LOG_STATEMENTS:
+        stats.statements.append((elapsed, statement))
+
+
+def _handle_error(exception_context):
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def instrument_engine(engine) -> None:
+    """Count queries on an Engine, or on the sync side of an AsyncEngine."""
+    engine = getattr(engine, "sync_engine", engine)
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+# --- Middleware ---
+
+def _log_slow_request(method: str, path: str, route: str, elapsed: float, stats: RequestStats):
+    lines = [
+        f"slow request {method} {path} ({route}): {elapsed * 1000:.0f} ms, "
+        f"{stats.queries} queries in {stats.db_seconds * 1000:.0f} ms, argon2 {stats.hash_seconds * 1000:.0f} ms"
+    ]
+    for seconds, statement in stats.statements:
+        lines.append(f"  {seconds * 1000:8.1f} ms  {' '.join(statement.split())[:SLOW_LOG_STATEMENT_CHARS]}")
+    if stats.queries > len(stats.statements):
+        lines.append(f"  ... {stats.queries - len(stats.statements)} more")
+    logger.warning("\n".join(lines))
+
+
+class InstrumentationMiddleware:
+    def __init__(self, app, slow_request_ms: float = SLOW_REQUEST_MS, debug_headers: bool = PERF_DEBUG_HEADERS):
+        self.app = app
+        self.slow_request_seconds = slow_request_ms / 1000
+        self.debug_headers = debug_headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_stats(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.debug_headers:
+                    headers = MutableHeaders(scope=message)
+                    headers["X-Query-Count"] = str(stats.queries)
+                    headers["X-DB-Time"] = f"{stats.db_seconds * 1000:.1f}ms"
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            _current.reset(token)
+            elapsed = time.perf_counter() - start
+            # the router stores the matched route in the (shared) scope
+            route = getattr(scope.get("route"), "path", "unmatched")
+            request_seconds.observe(elapsed, method=scope["method"], route=route, status=status)
+            request_queries.observe(stats.queries, route=route)
+            request_db_seconds.observe(stats.db_seconds, route=route)
+            if stats.hash_seconds:
+                request_hash_seconds.observe(stats.hash_seconds, route=route)
+            if elapsed >= self.slow_request_seconds:
+                slow_requests.inc(route=route)
+                _log_slow_request(scope["method"], scope["path"], route, elapsed, stats)
@@ -1,18 +1,76 @@
-from fastapi import FastAPI, Depends, HTTPException, Request
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Literal
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session, joinedload
-from database import engine, get_db
-from models import Base, Course, Chapter, Lesson, LessonContent, MarkdownContent, Question, QuestionOption, ShortAnswerQuestion
-from schemas import LessonContentOut, UserCreate, UserLogin
-from auth import register_user, login_user
-from fastapi.middleware.httpsredirect import HTTPSRedirectMiddleware
-from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import exc
+from sqlalchemy.orm import Session
+from database import dispose_engines, get_db, get_read_db, is_read_only, migration_head, run_db, schema_revision
+from models import Course, Chapter, Lesson, LessonContent, MarkdownContent, Question, QuestionTemplate
+from cache import lesson_cache
+from content import read_lesson_payload
+from outline import get_outline, rebuild_on_primary, stored_outline
+from catalog import list_courses
+from search import search
+from render import render_course
+from grading import get_answer_key, grade_submission, has_templates, question_variants, user_variants
+from variants import DEFAULT_DISTRACTORS, CompiledTemplate, TemplateError
+from progress import enrollment_progress, flush_progress, run_flusher, track_answer, track_view
+from instrumentation import InstrumentationMiddleware
+from passwords import password_service
+from warmup import WARMUP, warm_up
+from bloom import EMAIL_BLOOM, run_rebuilder
+from ratelimit import check_login, client_ip
+from singleflight import SingleFlight
+from compression import COMPRESS_MIN_BYTES, CompressionMiddleware, compress_stream, negotiate, precompressed
+from bundle import chapter_etag, etag_matches, has_lesson, stream_bundle
+from ranking import apply_moves, move_course_ids, next_rank, rank_after, run_rebalancer, RANK_REBALANCE_INTERVAL
+from bulk import CourseImporter, CourseImportError, iter_lines, parse_line, stream_export
+import metrics
+from schemas import (
+    CourseOutline, CoursePage, EnrollmentProgress, ImportResult, LessonContentOut, Principal, QuestionTemplateIn, QuestionVariant,
+    RefreshRequest, SearchResults, ReorderRequest, ReorderResult, SubmissionIn, SubmissionResult, UserCreate, UserLogin,
+    normalize_email,
+)
+from auth import (
+    find_user_by_email, get_current_user, register_user, login_user, refresh_access_token,
+    require_any_creator, require_creator,
+)
+from utils import verify_email_token
 
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+# --- Worker lifecycle ---
+# Startup completes before the server accepts connections; shutdown runs
+# after in-flight requests have drained (SIGTERM under gunicorn).
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tasks = [asyncio.create_task(run_flusher())]
+    if EMAIL_BLOOM:
+        # loads in the background; registration checks the database until it is built
+        tasks.append(asyncio.create_task(run_rebuilder()))
+    if RANK_REBALANCE_INTERVAL > 0:
+        tasks.append(asyncio.create_task(run_rebalancer()))
+    if WARMUP:
+        await warm_up()
+    try:
+        yield
+    finally:
+        # background loops first, then the last progress flush, which still
+        # needs the pools, and only then the pools themselves
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            await run_in_threadpool(flush_progress)
+        finally:
+            await run_in_threadpool(password_service.shutdown)
+            await dispose_engines()
 
-app = FastAPI()
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+app.add_middleware(CompressionMiddleware)
 
 # --- CORS ---
 app.add_middleware(
@@ -23,15 +81,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so its timings cover every other middleware
+app.add_middleware(InstrumentationMiddleware)
+
+# Concurrent requests for the same lesson or outline share one build
+lesson_flight = SingleFlight("lesson_content")
+outline_flight = SingleFlight("outline")
+
 # --- Auth Endpoints ---
 
 @app.post("/register")
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
-    return register_user(user_data, db)
+async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+    return await register_user(user_data, db)
 
 @app.post("/login")
-def login(user: UserLogin, db: Session = Depends(get_db)):
-    return login_user(user.email, user.password, db)
+async def login(user: UserLogin, request: Request, db: Session = Depends(get_db)):
+    # before the user lookup and Argon2, which are what an attacker wants us to spend
+    ip = client_ip(request.client.host if request.client else None, request.headers.get("x-forwarded-for"))
+    await run_in_threadpool(check_login, ip, user.email)
+    return await login_user(user.email, user.password, db)
+
+@app.post("/token/refresh")
+def refresh_token(body: RefreshRequest, db: Session = Depends(get_db)):
+    return refresh_access_token(body.refresh_token, db)
 
 @app.post("/verify-email/{token}")
 def verify_email(token: str, db: Session = Depends(get_db)):
@@ -39,7 +111,7 @@ def verify_email(token: str, db: Session = Depends(get_db)):
     if not email:
         raise HTTPException(status_code=400, detail="Invalid or expired token")
     
-    user = db.query(User).filter(User.email == email).first()
+    user = find_user_by_email(db, normalize_email(email))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -56,103 +128,281 @@ def create_course(title: str, description: str, db: Session = Depends(get_db)):
     db.refresh(course)
     return course
 
-@app.get("/courses/")
-def get_courses(db: Session = Depends(get_db)):
-    return db.query(Course).all()
+@app.get("/courses/", response_model=CoursePage, response_model_exclude_unset=True)
+async def get_courses(
+    cursor: str | None = None,
+    limit: int = Query(20, ge=1, le=100),
+    fields: str | None = None,
+    tag: list[str] | None = Query(None),
+    db=Depends(get_read_db),
+):
+    return await run_db(db, lambda s: list_courses(s, limit=limit, cursor=cursor, fields=fields, tags=tag))
+
+@app.get("/search", response_model=SearchResults, response_model_exclude_unset=True)
+async def search_content(
+    q: str = Query(..., min_length=1, max_length=200),
+    cursor: str | None = None,
+    limit: int = Query(20, ge=1, le=100),
+    kind: list[str] | None = Query(None),
+    tag: list[str] | None = Query(None),
+    db=Depends(get_read_db),
+):
+    return await run_db(db, lambda s: search(s, q, limit=limit, cursor=cursor, kinds=kind, tags=tag))
+
+async def load_outline(db, course_id: int):
+    if not is_read_only(db):
+        return await run_db(db, get_outline, course_id)
+    outline = await run_db(db, stored_outline, course_id)
+    if outline is None:
+        outline = await run_in_threadpool(rebuild_on_primary, course_id)
+    return outline
+
+@app.get("/courses/{course_id}/outline", response_model=CourseOutline)
+async def get_course_outline(course_id: int, db=Depends(get_read_db)):
+    outline = await outline_flight.do(course_id, lambda: load_outline(db, course_id))
+    if outline is None:
+        raise HTTPException(status_code=404, detail="Course not found")
+    return outline
 
 @app.get("/courses/{course_id}")
-def get_course(course_id: int, db: Session = Depends(get_db)):
-    course = db.query(Course).filter(Course.id == course_id).first()
+async def get_course(course_id: int, db=Depends(get_read_db)):
+    course = await run_db(db, lambda s: s.query(Course).filter(Course.id == course_id).first())
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
     return course
 
+# --- Bulk Import/Export ---
+@app.post("/courses/import", response_model=ImportResult)
+async def import_course_document(
+    request: Request, principal: Principal = Depends(get_current_user), db: Session = Depends(get_db),
+):
+    require_any_creator(principal)
+    importer = CourseImporter(creator_id=principal.id)
+    line_no = 0
+    try:
+        async for line in iter_lines(request.stream()):
+            line_no += 1
+            parsed = parse_line(importer, line_no, line)
+            if parsed is None:
+                continue
+            kind, record = parsed
+            if kind == "course":
+                await run_db(db, importer.start, record)
+            else:
+                await run_db(db, importer.add_chapter, record)
+        if importer.course_id is None:
+            raise CourseImportError(line_no, "empty document")
+    except CourseImportError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return await run_db(db, importer.finish)
+
+@app.get("/courses/{course_id}/export")
+async def export_course_document(course_id: int, db=Depends(get_read_db)):
+    exists = await run_db(db, lambda s: s.query(Course.id).filter(Course.id == course_id).first())
+    if not exists:
+        raise HTTPException(status_code=404, detail="Course not found")
+    return StreamingResponse(stream_export(course_id), media_type="application/x-ndjson")
+
+@app.post("/courses/{course_id}/render")
+async def render_course_content(
+    course_id: int, principal: Principal = Depends(get_current_user), db: Session = Depends(get_db),
+):
+    require_creator(principal, course_id)
+    exists = await run_db(db, lambda s: s.query(Course.id).filter(Course.id == course_id).first())
+    if not exists:
+        raise HTTPException(status_code=404, detail="Course not found")
+    return await run_db(db, render_course, course_id)
+
 # --- Chapters Endpoints ---
 @app.post("/courses/{course_id}/chapters/")
-def create_chapter(course_id: int, title: str, db: Session = Depends(get_db)):
-    chapter = Chapter(title=title, course_id=course_id)
+def create_chapter(course_id: int, title: str, after: int | None = None, db: Session = Depends(get_db)):
+    sort_order = rank_after(db, "chapter", course_id, after) if after is not None else next_rank(db, "chapter", course_id)
+    chapter = Chapter(title=title, course_id=course_id, sort_order=sort_order)
     db.add(chapter)
     db.commit()
     db.refresh(chapter)
     return chapter
 
 @app.get("/courses/{course_id}/chapters/")
-def get_chapters(course_id: int, db: Session = Depends(get_db)):
-    return db.query(Chapter).filter(Chapter.course_id == course_id).all()
+async def get_chapters(course_id: int, db=Depends(get_read_db)):
+    return await run_db(db, lambda s: s.query(Chapter).filter(Chapter.course_id == course_id).order_by(Chapter.sort_order).all())
+
+@app.get("/chapters/{chapter_id}/bundle")
+async def get_chapter_bundle(
+    chapter_id: int,
+    request: Request,
+    render: Literal["html"] | None = None,
+    after: int | None = Query(None, description="resume after this lesson id; send If-Match with the ETag"),
+    db=Depends(get_read_db),
+):
+    etag = await run_db(db, chapter_etag, chapter_id, render)
+    if etag is None:
+        raise HTTPException(status_code=404, detail="Chapter not found")
+    encoding = negotiate(request.headers.get("accept-encoding"))
+    headers = {"ETag": f'{etag[:-1]}+{encoding}"' if encoding else etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if after is None and etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if after is not None and "if-match" in request.headers and not etag_matches(request.headers["if-match"], etag):
+        # the chapter changed since the interrupted download; start over
+        raise HTTPException(status_code=412, detail="Chapter changed, fetch the bundle again")
+    if after is not None and not await run_db(db, has_lesson, chapter_id, after):
+        # an empty stream would look like a complete download
+        raise HTTPException(status_code=400, detail="after is not a lesson of this chapter")
+    body = stream_bundle(chapter_id, render, after)
+    if encoding:
+        body = compress_stream(body, encoding)
+        headers["Content-Encoding"] = encoding
+    return StreamingResponse(body, media_type="application/x-ndjson", headers=headers)
+
+# --- Reordering ---
+@app.post("/reorder", response_model=ReorderResult)
+async def reorder(body: ReorderRequest, principal: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    for course_id in await run_db(db, move_course_ids, body.moves):
+        require_creator(principal, course_id)
+    # one transaction for the whole drag-and-drop session
+    return {"moved": await run_db(db, apply_moves, body.moves)}
 
 # --- Lessons Endpoints ---
 @app.post("/chapters/{chapter_id}/lessons/")
-def create_lesson(chapter_id: int, title: str, db: Session = Depends(get_db)):
-    lesson = Lesson(title=title, chapter_id=chapter_id)
+def create_lesson(chapter_id: int, title: str, after: int | None = None, db: Session = Depends(get_db)):
+    chapter = db.query(Chapter).filter(Chapter.id == chapter_id).first()
+    if not chapter:
+        raise HTTPException(status_code=404, detail="Chapter not found")
+    sort_order = rank_after(db, "lesson", chapter_id, after) if after is not None else next_rank(db, "lesson", chapter_id)
+    lesson = Lesson(title=title, chapter_id=chapter_id, course_id=chapter.course_id, sort_order=sort_order)
     db.add(lesson)
     db.commit()
     db.refresh(lesson)
     return lesson
 
 @app.get("/chapters/{chapter_id}/lessons/")
-def get_lessons(chapter_id: int, db: Session = Depends(get_db)):
-    return db.query(Lesson).filter(Lesson.chapter_id == chapter_id).all()
+async def get_lessons(chapter_id: int, db=Depends(get_read_db)):
+    return await run_db(db, lambda s: s.query(Lesson).filter(Lesson.chapter_id == chapter_id).order_by(Lesson.sort_order).all())
 
 # --- Content Endpoints ---
 @app.post("/lessons/{lesson_id}/content/")
-def add_content(lesson_id: int, text: str, db: Session = Depends(get_db)):
-    content = Content(text=text, lesson_id=lesson_id)
+def add_content(lesson_id: int, text: str, format: str = "markdown", after: int | None = None, db: Session = Depends(get_db)):
+    sort_order = rank_after(db, "content", lesson_id, after) if after is not None else next_rank(db, "content", lesson_id)
+    content = LessonContent(lesson_id=lesson_id, content_type="markdown", sort_order=sort_order)
+    content.markdown = MarkdownContent(text=text, format=format)
     db.add(content)
     db.commit()
     db.refresh(content)
     return content
 
 @app.get("/lessons/{lesson_id}/content/", response_model=list[LessonContentOut])
-def get_lesson_content(lesson_id: int, db: Session = Depends(get_db)):
-    contents = db.query(LessonContent).filter(LessonContent.lesson_id == lesson_id).order_by(LessonContent.sort_order).all()
+async def get_lesson_content(
+    lesson_id: int,
+    request: Request,
+    render: Literal["html"] | None = None,
+):
+    cached = lesson_cache.peek(lesson_id, render or "")
+    if cached is None:
+        # a miss queries, renders and may call Redis: all off the event loop
+        cached = await lesson_flight.do(
+            (lesson_id, render), lambda: run_in_threadpool(read_lesson_payload, lesson_id, render),
+        )
+    encoding = None
+    if len(cached.body) >= COMPRESS_MIN_BYTES:
+        encoding = negotiate(request.headers.get("accept-encoding"))
+    headers = cached.headers_for(encoding)
+    if cached.not_modified(request.headers):
+        headers.pop("Content-Encoding", None)
+        return Response(status_code=304, headers=headers)
+    # compressed once per payload version and kept next to it in the cache
+    body = cached.body
+    if encoding:
+        body = cached.encoded.get(encoding) or await run_in_threadpool(precompressed, cached, encoding)
+    return Response(body, media_type="application/json", headers=headers)
 
-    output = []
+# --- Parameterized questions ---
+@app.put("/questions/{content_id}/template")
+def set_question_template(
+    content_id: int, body: QuestionTemplateIn,
+    principal: Principal = Depends(get_current_user), db: Session = Depends(get_db),
+):
+    question = db.get(Question, content_id)
+    if question is None:
+        raise HTTPException(status_code=404, detail="Question not found")
+    # lessons.course_id is nullable on legacy rows; the chapter's is authoritative
+    lesson = question.content.lesson
+    require_creator(principal, lesson.chapter.course_id if lesson is not None and lesson.chapter is not None else None)
+    try:
+        CompiledTemplate(
+            content_id, question.question_format, body.variables, body.answer,
+            body.distractors, body.distractor_count, body.decimals,
+        ).validate()
+    except TemplateError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    # through the ORM so the lesson's payload and answer key are invalidated
+    template = question.template or QuestionTemplate()
+    template.variables = body.variables
+    template.answer_expression = body.answer
+    template.distractor_expressions = body.distractors
+    template.distractor_count = body.distractor_count if body.distractor_count is not None else DEFAULT_DISTRACTORS
+    template.decimals = body.decimals
+    question.template = template
+    db.commit()
+    return {"question_id": content_id}
 
-    for content in contents:
-        if content.content_type == 'markdown':
-            markdown = db.query(MarkdownContent).filter(MarkdownContent.content_id == content.id).first()
-            if not markdown:
-                continue
-            output.append({
-                "type": "markdown",
-                "data": {
-                    "text": markdown.text,
-                    "format": markdown.format
-                }
-            })
-
-        elif content.content_type == 'question':
-            question = db.query(Question).filter(Question.content_id == content.id).first()
-            if not question:
-                continue
-            options = db.query(QuestionOption).filter(QuestionOption.question_id == question.content_id).order_by(QuestionOption.sort_order).all()
-            short_answer = db.query(ShortAnswerQuestion).filter(ShortAnswerQuestion.question_id == question.content_id).first()
-
-            if question.question_format == 'multiple_choice':
-                output.append({
-                    "type": "question",
-                    "data": {
-                        "format": "multiple_choice",
-                        "question": question.question_text,
-                        "options": [opt.option_text for opt in options],
-                        "correct_answer": next((i for i, opt in enumerate(options) if opt.is_correct), None),
-                        "explanation": question.explanation,
-                        "visualization": question.visualization
-                    }
-                })
-            elif question.question_format == 'short_answer':
-                output.append({
-                    "type": "question",
-                    "data": {
-                        "format": "short_answer",
-                        "question": question.question_text,
-                        "correct_answer": short_answer.correct_answer if short_answer else "",
-                        "explanation": question.explanation,
-                        "visualization": question.visualization
-                    }
-                })
-
-    return output
+@app.get("/lessons/{lesson_id}/variants", response_model=list[QuestionVariant], response_model_exclude_none=True)
+async def get_question_variants(lesson_id: int, principal: Principal = Depends(get_current_user), db=Depends(get_read_db)):
+    key = await run_db(db, get_answer_key, lesson_id)
+    # NumPy batches: off the event loop, which run_db may be running on
+    return await run_in_threadpool(question_variants, lesson_id, principal.id, key)
+
+# --- Submissions ---
+@app.post("/lessons/{lesson_id}/submissions", response_model=SubmissionResult)
+async def submit_answers(
+    lesson_id: int,
+    submission: SubmissionIn,
+    principal: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    key = await run_db(db, get_answer_key, lesson_id)
+    variants = await run_in_threadpool(user_variants, lesson_id, principal.id, key) if has_templates(key) else None
+    try:
+        result = await run_db(db, grade_submission, lesson_id, principal.id, submission.answers, variants)
+    except KeyError as e:
+        raise HTTPException(status_code=422, detail=f"Question {e.args[0]} is not part of lesson {lesson_id}")
+    await run_db(db, track_answer, principal.id, lesson_id)
+    return result
+
+# --- Progress ---
+@app.post("/lessons/{lesson_id}/view", status_code=204)
+async def record_lesson_view(lesson_id: int, principal: Principal = Depends(get_current_user), db=Depends(get_read_db)):
+    if not await run_db(db, track_view, principal.id, lesson_id):
+        raise HTTPException(status_code=404, detail="Lesson not found")
+
+@app.get("/me/progress", response_model=list[EnrollmentProgress])
+async def get_my_progress(principal: Principal = Depends(get_current_user), db=Depends(get_read_db)):
+    return await run_db(db, enrollment_progress, principal.id)
+
+@app.get("/courses/{course_id}/progress", response_model=EnrollmentProgress)
+async def get_course_progress(course_id: int, principal: Principal = Depends(get_current_user), db=Depends(get_read_db)):
+    progress = await run_db(db, enrollment_progress, principal.id, course_id)
+    if not progress:
+        raise HTTPException(status_code=404, detail="Not enrolled")
+    return progress[0]
+
+# --- Readiness ---
+# The schema is created by `alembic upgrade head` (the migrate service), not at
+# import, and importing the app opens no database connection.
+@app.get("/ready")
+async def ready(db: Session = Depends(get_db)):
+    try:
+        revision = await run_db(db, schema_revision)
+    except exc.SQLAlchemyError:
+        return ORJSONResponse({"status": "unavailable"}, status_code=503)
+    head = migration_head()
+    if revision != head:
+        return ORJSONResponse({"status": "migrating", "revision": revision, "head": head}, status_code=503)
+    return {"status": "ready", "revision": revision}
+
+# --- Metrics ---
+@app.get("/metrics")
+def get_metrics():
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
 
 # Root endpoint
 @app.get("/")
@@ -1,15 +1,30 @@
--- Initialize the entire math e-learning database structure
-CREATE SCHEMA IF NOT EXISTS learn;
-SET search_path TO learn;
+"""Initial schema
 
+Baseline: exactly the schema the hand-written db/init.sql created, before
+any of the later revisions. A database created from init.sql (which put the
+tables in the `learn` schema) can join the chain without being recreated:
+
+    psql -c "ALTER ROLE learn SET search_path = learn, public"   # or move the tables to public
+    alembic stamp 0001
+    alembic upgrade head
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+UPGRADE_SQL = '''
 -- Create ENUM types
 CREATE TYPE content_type AS ENUM ('markdown', 'question', 'video');
 CREATE TYPE question_format AS ENUM ('multiple_choice', 'short_answer');
 CREATE TYPE auth_provider AS ENUM ('email', 'google', 'github', 'apple', 'microsoft');
 
-CREATE TYPE content_type AS ENUM ('markdown', 'question', 'video');
-CREATE TYPE question_format AS ENUM ('multiple_choice', 'short_answer');
-
 -- Users table with authentication support
 CREATE TABLE users (
     id SERIAL PRIMARY KEY,
@@ -162,54 +177,28 @@ CREATE TABLE short_answer_questions (
     correct_answer TEXT NOT NULL
 );
 
--- Insert sample data
-INSERT INTO courses (title, description, image_url) VALUES
-('Foundational Algebra', 'Master core algebraic concepts', '/assets/algebra.jpeg');
-
-INSERT INTO tags (name) VALUES 
-('algebra'), ('math'), ('beginner');
-
-INSERT INTO course_tags (course_id, tag_id) VALUES
-(1, 1), (1, 2), (1, 3);
-
-INSERT INTO chapters (course_id, title, description, image_url, sort_order) VALUES
-(1, 'Variables & Expressions', 'Introduction to algebraic variables', '/images/algebra-variables.jpg', 1);
-
-INSERT INTO lessons (chapter_id, course_id, title, description, sort_order) VALUES
-(1, 1, 'Algebraic Variables', 'Understanding variables in algebra', 1);
-
--- Insert lesson content
-WITH content AS (
-  INSERT INTO lesson_contents (lesson_id, content_type, sort_order)
-  VALUES (1, 'markdown', 1) RETURNING id
-)
-INSERT INTO markdown_contents (content_id, text, format)
-
-SELECT id, 'In algebra, variables (like $x$ or $y$) represent unknown values...', 'latex'
-FROM content;
-
-WITH content AS (
-  INSERT INTO lesson_contents (lesson_id, content_type, sort_order)
-  VALUES (1, 'question', 2) RETURNING id
-),
-q AS (
-  INSERT INTO questions (content_id, question_format, question_text, explanation)
-  SELECT id, 'multiple_choice', 'What does $3x + 2x$ simplify to when $x=4$?', 'Combine like terms: $3x + 2x = 5x$. When $x=4$, $5x = 20$.'
-  FROM content RETURNING content_id
-)
-INSERT INTO question_options (question_id, option_text, is_correct, sort_order)
-VALUES 
-((SELECT content_id FROM q), '20', TRUE, 1),
-((SELECT content_id FROM q), '24', FALSE, 2),
-((SELECT content_id FROM q), '80', FALSE, 3),
-((SELECT content_id FROM q), '16', FALSE, 4);
-
-COMMIT;
-
 -- Create indexes for performance
 CREATE INDEX idx_course_tags_course ON course_tags(course_id);
 CREATE INDEX idx_course_tags_tag ON course_tags(tag_id);
 CREATE INDEX idx_chapters_course ON chapters(course_id);
 CREATE INDEX idx_lessons_chapter ON lessons(chapter_id);
 CREATE INDEX idx_lessons_course ON lessons(course_id);
-CREATE INDEX idx_contents_lesson ON lesson_contents(lesson_id);
\ No newline at end of file
+CREATE INDEX idx_contents_lesson ON lesson_contents(lesson_id);
+'''
+
+TABLES = (
+    "short_answer_questions", "question_options", "questions", "markdown_contents", "lesson_contents",
+    "lessons", "chapters", "course_tags", "tags", "system_admins", "course_students", "course_creators",
+    "courses", "user_auth_providers", "users",
+)
+
+
+def upgrade():
+    op.execute(UPGRADE_SQL)
+
+
+def downgrade():
+    for table in TABLES:
+        op.execute(f"DROP TABLE IF EXISTS {table}")
+    for enum in ("auth_provider", "question_format", "content_type"):
+        op.execute(f"DROP TYPE IF EXISTS {enum}")
@@ -0,0 +1,35 @@
+"""Materialized course outlines
+
+course -> chapters -> lessons as one JSONB row per course, rebuilt on read
+after a structural change drops it (see outline.py), plus the ordered
+per-parent indexes the rebuild reads with.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects.postgresql import JSONB
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "course_outlines",
+        sa.Column("course_id", sa.Integer, sa.ForeignKey("courses.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("outline", JSONB, nullable=False),
+        sa.Column("refreshed_at", sa.DateTime, server_default=sa.text("CURRENT_TIMESTAMP")),
+    )
+    op.create_index("idx_chapters_course_order", "chapters", ["course_id", "sort_order"])
+    op.create_index("idx_lessons_chapter_order", "lessons", ["chapter_id", "sort_order"])
+
+
+def downgrade():
+    op.drop_index("idx_lessons_chapter_order", table_name="lessons")
+    op.drop_index("idx_chapters_course_order", table_name="chapters")
+    op.drop_table("course_outlines")
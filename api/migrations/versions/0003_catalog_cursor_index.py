@@ -0,0 +1,20 @@
+"""(created_at, id) index for the keyset-paginated course catalog
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("idx_courses_created_id", "courses", ["created_at", "id"])
+
+
+def downgrade():
+    op.drop_index("idx_courses_created_id", table_name="courses")
@@ -0,0 +1,31 @@
+"""Graded answers, one row per answered question
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "submissions",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("lesson_id", sa.Integer, sa.ForeignKey("lessons.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("content_id", sa.Integer, sa.ForeignKey("lesson_contents.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("answer", sa.Text, nullable=False),
+        sa.Column("is_correct", sa.Boolean, nullable=False),
+        sa.Column("submitted_at", sa.DateTime, server_default=sa.text("CURRENT_TIMESTAMP")),
+    )
+    op.create_index("idx_submissions_user_lesson", "submissions", ["user_id", "lesson_id"])
+
+
+def downgrade():
+    op.drop_table("submissions")
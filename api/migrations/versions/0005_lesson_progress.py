@@ -0,0 +1,34 @@
+"""Lesson progress
+
+Lessons a student has opened at least once, written in batches by the
+progress flusher (see progress.py), and the per-course completed count it
+keeps on course_students.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("course_students", sa.Column("lessons_completed", sa.Integer, nullable=False, server_default="0"))
+    op.create_table(
+        "lesson_progress",
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("lesson_id", sa.Integer, sa.ForeignKey("lessons.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("course_id", sa.Integer, sa.ForeignKey("courses.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("viewed_at", sa.DateTime, server_default=sa.text("CURRENT_TIMESTAMP")),
+    )
+    op.create_index("idx_lesson_progress_user_course", "lesson_progress", ["user_id", "course_id"])
+
+
+def downgrade():
+    op.drop_table("lesson_progress")
+    op.drop_column("course_students", "lessons_completed")
@@ -0,0 +1,56 @@
+"""Full-text search
+
+latex_to_text() and a generated, GIN-indexed search_vector column on
+courses, lessons, markdown_contents and questions (see search.py).
+Postgres fills the columns for existing rows when they are added.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+# Flattens LaTeX for full-text search: commands become words (\frac -> frac)
+# and math punctuation becomes whitespace, so '$3x + 2x$' indexes as 3x, 2x
+LATEX_TO_TEXT = r'''
+CREATE OR REPLACE FUNCTION latex_to_text(src text) RETURNS text
+    LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE
+    AS $$
+        SELECT regexp_replace(
+            regexp_replace(src, '\\([A-Za-z]+)', ' \1 ', 'g'),
+            '[$^_{}()\[\]\\+*/=<>|,~-]+', ' ', 'g')
+    $$
+'''
+
+# table -> (index, tsvector expression)
+VECTORS = {
+    "courses": ("idx_courses_search", """
+        setweight(to_tsvector('english', coalesce(latex_to_text(title), '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(latex_to_text(description), '')), 'B')"""),
+    "lessons": ("idx_lessons_search", """
+        setweight(to_tsvector('english', coalesce(latex_to_text(title), '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(latex_to_text(description), '')), 'B')"""),
+    "markdown_contents": ("idx_markdown_search", """
+        setweight(to_tsvector('english', coalesce(latex_to_text(text), '')), 'D')"""),
+    "questions": ("idx_questions_search", """
+        setweight(to_tsvector('english', coalesce(latex_to_text(question_text), '')), 'C')"""),
+}
+
+
+def upgrade():
+    op.execute(LATEX_TO_TEXT)
+    for table, (index, expression) in VECTORS.items():
+        op.execute(f"ALTER TABLE {table} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({expression}) STORED")
+        op.execute(f"CREATE INDEX {index} ON {table} USING GIN (search_vector)")
+
+
+def downgrade():
+    for table, (index, _) in VECTORS.items():
+        op.execute(f"DROP INDEX {index}")
+        op.execute(f"ALTER TABLE {table} DROP COLUMN search_vector")
+    op.execute("DROP FUNCTION latex_to_text(text)")
@@ -0,0 +1,29 @@
+"""Rendered lesson text
+
+HTML for lesson text keyed by a hash of renderer version, mode and source
+text (see render.py); an edited text simply gets a new row.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "rendered_contents",
+        sa.Column("source_hash", sa.CHAR(64), primary_key=True),
+        sa.Column("html", sa.Text, nullable=False),
+        sa.Column("created_at", sa.DateTime, server_default=sa.text("CURRENT_TIMESTAMP")),
+    )
+
+
+def downgrade():
+    op.drop_table("rendered_contents")
@@ -0,0 +1,37 @@
+"""Normalized, case-insensitively unique emails
+
+Lowercases stored emails and replaces the exact-match unique constraint with
+a unique index on lower(email), which the login and registration lookups use.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    duplicates = conn.execute(sa.text(
+        "SELECT lower(btrim(email)) FROM users WHERE email IS NOT NULL "
+        "GROUP BY 1 HAVING count(*) > 1 LIMIT 20"
+    )).scalars().all()
+    if duplicates:
+        # two accounts differing only in case; someone has to decide which survives
+        raise RuntimeError(
+            "users differing only in email case must be merged before this migration: " + ", ".join(duplicates)
+        )
+    op.execute("UPDATE users SET email = lower(btrim(email)) WHERE email <> lower(btrim(email))")
+    op.create_index("idx_users_email_lower", "users", [sa.text("lower(email)")], unique=True)
+    op.drop_constraint("users_email_key", "users", type_="unique")
+
+
+def downgrade():
+    op.create_unique_constraint("users_email_key", "users", ["email"])
+    op.drop_index("idx_users_email_lower", table_name="users")
@@ -0,0 +1,71 @@
+"""Fractional sort_order ranks and (parent, sort_order) indexes
+
+sort_order becomes double precision on chapters, lessons, lesson_contents
+and question_options, so a move writes one row (see ranking.py). Existing
+positions are spread RANK_STEP apart per parent. The single-column parent
+indexes give way to (parent, sort_order, id) ones that also serve ordered
+reads.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+RANK_STEP = 1024
+
+# table -> (parent column, old ordering index, dropped single-column index)
+ORDERED = {
+    "chapters": ("course_id", "idx_chapters_course_order", "idx_chapters_course"),
+    "lessons": ("chapter_id", "idx_lessons_chapter_order", "idx_lessons_chapter"),
+    "lesson_contents": ("lesson_id", None, "idx_contents_lesson"),
+    "question_options": ("question_id", None, None),
+}
+NEW_INDEXES = {
+    "chapters": "idx_chapters_course_order",
+    "lessons": "idx_lessons_chapter_order",
+    "lesson_contents": "idx_contents_lesson_order",
+    "question_options": "idx_options_question_order",
+}
+
+
+def upgrade():
+    for table, (parent, old_order_index, old_parent_index) in ORDERED.items():
+        for index in (old_order_index, old_parent_index):
+            if index:
+                op.drop_index(index, table_name=table)
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN sort_order TYPE double precision")
+        op.execute(f"""
+            UPDATE {table} AS t SET sort_order = r.n * {RANK_STEP}
+            FROM (
+                SELECT id, row_number() OVER (PARTITION BY {parent} ORDER BY sort_order NULLS LAST, id) AS n
+                FROM {table}
+            ) AS r
+            WHERE t.id = r.id
+        """)
+        op.create_index(NEW_INDEXES[table], table, [parent, "sort_order", "id"])
+    # materialized outlines carry the old numbers; they rebuild on next read
+    op.execute("DELETE FROM course_outlines")
+
+
+def downgrade():
+    for table, (parent, old_order_index, old_parent_index) in ORDERED.items():
+        op.drop_index(NEW_INDEXES[table], table_name=table)
+        op.execute(f"""
+            UPDATE {table} AS t SET sort_order = r.n
+            FROM (
+                SELECT id, row_number() OVER (PARTITION BY {parent} ORDER BY sort_order NULLS LAST, id) AS n
+                FROM {table}
+            ) AS r
+            WHERE t.id = r.id
+        """)
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN sort_order TYPE integer USING sort_order::integer")
+        if old_parent_index:
+            op.create_index(old_parent_index, table, [parent])
+        if old_order_index:
+            op.create_index(old_order_index, table, [parent, "sort_order"])
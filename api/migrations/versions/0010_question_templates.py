@@ -0,0 +1,37 @@
+"""Question templates for parameterized questions
+
+One optional row per question with its variables and answer/distractor
+expressions. Per-student variants are derived from these at request time
+(see variants.py), so nothing else is stored.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects.postgresql import JSONB
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "question_templates",
+        sa.Column(
+            "question_id", sa.Integer,
+            sa.ForeignKey("questions.content_id", ondelete="CASCADE"), primary_key=True,
+        ),
+        sa.Column("variables", JSONB, nullable=False),
+        sa.Column("answer_expression", sa.Text, nullable=False),
+        sa.Column("distractor_expressions", JSONB, nullable=False, server_default="[]"),
+        sa.Column("distractor_count", sa.Integer, nullable=False, server_default="3"),
+        sa.Column("decimals", sa.Integer),
+    )
+
+
+def downgrade():
+    op.drop_table("question_templates")
@@ -0,0 +1,25 @@
+"""courses.created_at NOT NULL
+
+The catalog pages by (created_at, id). A NULL created_at broke the cursor
+encoding and was skipped by the keyset comparison. Backfilled rows take
+updated_at, or the epoch, so they sort as the oldest.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("UPDATE courses SET created_at = COALESCE(updated_at, 'epoch') WHERE created_at IS NULL")
+    op.execute("ALTER TABLE courses ALTER COLUMN created_at SET NOT NULL")
+
+
+def downgrade():
+    op.execute("ALTER TABLE courses ALTER COLUMN created_at DROP NOT NULL")
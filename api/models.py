@@ -1,12 +1,37 @@
 from sqlalchemy import (
     Column, Integer, String, Text, ForeignKey, Boolean,
-    Enum, DateTime, JSON, func, PrimaryKeyConstraint, ForeignKey, UniqueConstraint
+    Enum, DateTime, func, PrimaryKeyConstraint, ForeignKey, UniqueConstraint,
+    Computed, DDL, event, CHAR, Double, Index
 )
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy.orm import relationship, deferred
+from database import Base
 import enum
 
-Base = declarative_base()
+# Flattens LaTeX for full-text search: commands become words (\frac -> frac)
+# and math punctuation becomes whitespace, so "$3x + 2x$" indexes as 3x, 2x.
+# Must exist before the tables whose search_vector columns call it. Created
+# by migration 0006; the event covers metadata.create_all on scratch databases.
+LATEX_TO_TEXT = DDL(r"""
+CREATE OR REPLACE FUNCTION latex_to_text(src text) RETURNS text
+    LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE
+    AS $$
+        SELECT regexp_replace(
+            regexp_replace(src, '\\([A-Za-z]+)', ' \1 ', 'g'),
+            '[$^_{}()\[\]\\+*/=<>|,~-]+', ' ', 'g')
+    $$
+""")
+event.listen(Base.metadata, "before_create", LATEX_TO_TEXT)
+
+
+def search_vector(*weighted):
+    """A stored tsvector over (column, weight) pairs, maintained by Postgres on write."""
+    parts = [
+        f"setweight(to_tsvector('english', coalesce(latex_to_text({column}), '')), '{weight}')"
+        for column, weight in weighted
+    ]
+    return deferred(Column(TSVECTOR, Computed(" || ".join(parts), persisted=True)))
 
 # --- Enums ---
 class ContentTypeEnum(str, enum.Enum):
@@ -25,7 +50,7 @@ class User(Base):
 
     id = Column(Integer, primary_key=True)
     username = Column(String(50), unique=True, nullable=True)
-    email = Column(String(255), unique=True, nullable=True)
+    email = Column(String(255), nullable=True)  # normalized; unique via idx_users_email_lower
     email_verified = Column(Boolean, default=False)
     phone = Column(String(20), unique=True, nullable=True)
     phone_verified = Column(Boolean, default=False)
@@ -54,7 +79,7 @@ class UserAuthProvider(Base):
     provider = Column(Enum(AuthProvider, name='auth_provider'), nullable=False)
     provider_id = Column(String(255), nullable=False)
     provider_email = Column(String(255), nullable=True)
-    provider_data = Column(JSON, nullable=True)  # Automatically maps to JSONB in PostgreSQL
+    provider_data = Column(JSONB, nullable=True)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
@@ -69,12 +94,13 @@ class Course(Base):
     title = Column(String(255), nullable=False)
     description = Column(Text, nullable=True)
     image_url = Column(String(255), nullable=True)
-    created_at = Column(DateTime, server_default=func.now())
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)  # catalog cursor key
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     created_by = Column(Integer, ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+    search_vector = search_vector(("title", "A"), ("description", "B"))
 
     tags = relationship("CourseTag", back_populates="course")
-    chapters = relationship("Chapter", back_populates="course")
+    chapters = relationship("Chapter", back_populates="course", order_by="Chapter.sort_order")
     lessons = relationship("Lesson", back_populates="course")
 
 class CourseCreator(Base):
@@ -104,6 +130,7 @@ class CourseStudent(Base):
     enrolled_at = Column(DateTime, server_default=func.now())
     completed_at = Column(DateTime, nullable=True)
     progress = Column(Integer, default=0)  # Assumes 0–100 range
+    lessons_completed = Column(Integer, default=0, server_default="0", nullable=False)
     last_accessed = Column(DateTime, nullable=True)
 
     course = relationship("Course", backref="students")
@@ -113,6 +140,18 @@ class CourseStudent(Base):
         PrimaryKeyConstraint('course_id', 'user_id', name='pk_course_students'),
     )
 
+class LessonProgress(Base):
+    __tablename__ = 'lesson_progress'
+
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    lesson_id = Column(Integer, ForeignKey('lessons.id', ondelete='CASCADE'), nullable=False)
+    course_id = Column(Integer, ForeignKey('courses.id', ondelete='CASCADE'), nullable=False)
+    viewed_at = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        PrimaryKeyConstraint('user_id', 'lesson_id', name='pk_lesson_progress'),
+    )
+
 class SystemAdmin(Base):
     __tablename__ = 'system_admins'
 
@@ -151,12 +190,12 @@ class Chapter(Base):
     title = Column(String(255), nullable=False)
     description = Column(Text)
     image_url = Column(String(255))
-    sort_order = Column(Integer)
+    sort_order = Column(Double)  # fractional rank, see ranking.py
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
     course = relationship("Course", back_populates="chapters")
-    lessons = relationship("Lesson", back_populates="chapter")
+    lessons = relationship("Lesson", back_populates="chapter", order_by="Lesson.sort_order")
 
 
 class Lesson(Base):
@@ -167,22 +206,39 @@ class Lesson(Base):
     course_id = Column(Integer, ForeignKey("courses.id", ondelete="CASCADE"))
     title = Column(String(255), nullable=False)
     description = Column(Text)
-    sort_order = Column(Integer)
+    sort_order = Column(Double)  # fractional rank, see ranking.py
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    search_vector = search_vector(("title", "A"), ("description", "B"))
 
     chapter = relationship("Chapter", back_populates="lessons")
     course = relationship("Course", back_populates="lessons")
     contents = relationship("LessonContent", back_populates="lesson")
 
 
+class CourseOutline(Base):
+    __tablename__ = "course_outlines"
+
+    course_id = Column(Integer, ForeignKey("courses.id", ondelete="CASCADE"), primary_key=True)
+    outline = Column(JSONB, nullable=False)
+    refreshed_at = Column(DateTime, server_default=func.now())
+
+
+class RenderedContent(Base):
+    __tablename__ = "rendered_contents"
+
+    source_hash = Column(CHAR(64), primary_key=True)  # see render.source_hash
+    html = Column(Text, nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+
+
 class LessonContent(Base):
     __tablename__ = "lesson_contents"
 
     id = Column(Integer, primary_key=True)
     lesson_id = Column(Integer, ForeignKey("lessons.id", ondelete="CASCADE"))
-    content_type = Column(Enum(ContentTypeEnum), nullable=False)
-    sort_order = Column(Integer, nullable=False)
+    content_type = Column(Enum(ContentTypeEnum, name="content_type"), nullable=False)
+    sort_order = Column(Double, nullable=False)  # fractional rank, see ranking.py
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
@@ -197,6 +253,7 @@ class MarkdownContent(Base):
     content_id = Column(Integer, ForeignKey("lesson_contents.id", ondelete="CASCADE"), primary_key=True)
     text = Column(Text, nullable=False)
     format = Column(String(20), nullable=False)
+    search_vector = search_vector(("text", "D"))
 
     content = relationship("LessonContent", back_populates="markdown")
 
@@ -205,14 +262,16 @@ class Question(Base):
     __tablename__ = "questions"
 
     content_id = Column(Integer, ForeignKey("lesson_contents.id", ondelete="CASCADE"), primary_key=True)
-    question_format = Column(Enum(QuestionFormatEnum), nullable=False)
+    question_format = Column(Enum(QuestionFormatEnum, name="question_format"), nullable=False)
     question_text = Column(Text, nullable=False)
     explanation = Column(Text)
     visualization = Column(Boolean, default=False)
+    search_vector = search_vector(("question_text", "C"))
 
     content = relationship("LessonContent", back_populates="question")
-    options = relationship("QuestionOption", back_populates="question", cascade="all, delete-orphan")
+    options = relationship("QuestionOption", back_populates="question", cascade="all, delete-orphan", order_by="QuestionOption.sort_order")
     short_answer = relationship("ShortAnswerQuestion", back_populates="question", uselist=False, cascade="all, delete-orphan")
+    template = relationship("QuestionTemplate", back_populates="question", uselist=False, cascade="all, delete-orphan")
 
 
 class QuestionOption(Base):
@@ -222,7 +281,7 @@ class QuestionOption(Base):
     question_id = Column(Integer, ForeignKey("questions.content_id", ondelete="CASCADE"))
     option_text = Column(Text, nullable=False)
     is_correct = Column(Boolean, default=False)
-    sort_order = Column(Integer)
+    sort_order = Column(Double)  # fractional rank, see ranking.py
 
     question = relationship("Question", back_populates="options")
 
@@ -234,3 +293,53 @@ class ShortAnswerQuestion(Base):
     correct_answer = Column(Text, nullable=False)
 
     question = relationship("Question", back_populates="short_answer")
+
+
+# Parameterized question: per-student numbers and answers are derived from
+# these expressions on demand (see variants.py), never stored.
+class QuestionTemplate(Base):
+    __tablename__ = "question_templates"
+
+    question_id = Column(Integer, ForeignKey("questions.content_id", ondelete="CASCADE"), primary_key=True)
+    variables = Column(JSONB, nullable=False)  # name -> {min, max[, step, exclude]} or {choices}
+    answer_expression = Column(Text, nullable=False)
+    distractor_expressions = Column(JSONB, nullable=False, server_default="[]")
+    distractor_count = Column(Integer, nullable=False, server_default="3")
+    decimals = Column(Integer)
+
+    question = relationship("Question", back_populates="template")
+
+
+
+class Submission(Base):
+    __tablename__ = "submissions"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    lesson_id = Column(Integer, ForeignKey("lessons.id", ondelete="CASCADE"), nullable=False)
+    content_id = Column(Integer, ForeignKey("lesson_contents.id", ondelete="CASCADE"), nullable=False)
+    answer = Column(Text, nullable=False)
+    is_correct = Column(Boolean, nullable=False)
+    submitted_at = Column(DateTime, server_default=func.now())
+
+
+# --- Indexes ---
+# Declared here so autogenerate sees them; created by the migrations.
+
+Index("idx_users_email_lower", func.lower(User.email), unique=True)
+Index("idx_courses_created_id", Course.created_at, Course.id)
+Index("idx_course_tags_course", CourseTag.course_id)
+Index("idx_course_tags_tag", CourseTag.tag_id)
+# (parent, sort_order, id): ordered child lists are index-only scans, and
+# the parent prefix serves plain parent lookups
+Index("idx_chapters_course_order", Chapter.course_id, Chapter.sort_order, Chapter.id)
+Index("idx_lessons_chapter_order", Lesson.chapter_id, Lesson.sort_order, Lesson.id)
+Index("idx_lessons_course", Lesson.course_id)
+Index("idx_contents_lesson_order", LessonContent.lesson_id, LessonContent.sort_order, LessonContent.id)
+Index("idx_options_question_order", QuestionOption.question_id, QuestionOption.sort_order, QuestionOption.id)
+Index("idx_submissions_user_lesson", Submission.user_id, Submission.lesson_id)
+Index("idx_lesson_progress_user_course", LessonProgress.user_id, LessonProgress.course_id)
+Index("idx_courses_search", Course.__table__.c.search_vector, postgresql_using="gin")
+Index("idx_lessons_search", Lesson.__table__.c.search_vector, postgresql_using="gin")
+Index("idx_markdown_search", MarkdownContent.__table__.c.search_vector, postgresql_using="gin")
+Index("idx_questions_search", Question.__table__.c.search_vector, postgresql_using="gin")
@@ -0,0 +1,142 @@
+from sqlalchemy import delete, event, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, selectinload
+from database import SessionLocal
+from models import Course, CourseOutline, CourseTag, Chapter, Lesson
+
+
+def build_outline(db: Session, course_id: int):
+    # course, chapters, lessons and tags: four queries whatever the course size
+    course = (
+        db.query(Course)
+        .options(
+            selectinload(Course.chapters).selectinload(Chapter.lessons),
+            selectinload(Course.tags).selectinload(CourseTag.tag),
+        )
+        .filter(Course.id == course_id)
+        .first()
+    )
+    if not course:
+        return None
+
+    return {
+        "id": course.id,
+        "title": course.title,
+        "description": course.description,
+        "image_url": course.image_url,
+        "tags": [course_tag.tag.name for course_tag in course.tags],
+        "chapters": [
+            {
+                "id": chapter.id,
+                "title": chapter.title,
+                "description": chapter.description,
+                "image_url": chapter.image_url,
+                "sort_order": chapter.sort_order,
+                "lessons": [
+                    {
+                        "id": lesson.id,
+                        "title": lesson.title,
+                        "description": lesson.description,
+                        "sort_order": lesson.sort_order,
+                    }
+                    for lesson in chapter.lessons
+                ],
+            }
+            for chapter in course.chapters
+        ],
+    }
+
+
+def stored_outline(db: Session, course_id: int):
+    return db.execute(
+        select(CourseOutline.outline).where(CourseOutline.course_id == course_id)
+    ).scalar_one_or_none()
+
+
+def get_outline(db: Session, course_id: int):
+    """Serve the materialized outline, rebuilding it if a write marked it stale."""
+    outline = stored_outline(db, course_id)
+    if outline is not None:
+        return outline
+    return rebuild_outline(db, course_id)
+
+
+def rebuild_outline(db: Session, course_id: int):
+    """Build the outline and store it; db must be a primary session."""
+    # held until commit, so a structural write to this course waits for the
+    # upsert below and then deletes it, instead of committing in between and
+    # letting this rebuild store the pre-write outline
+    db.execute(_LOCK_SHARED, {"course_id": course_id})
+    outline = build_outline(db, course_id)
+    if outline is None:
+        db.rollback()
+        return None
+
+    stmt = insert(CourseOutline).values(course_id=course_id, outline=outline)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[CourseOutline.course_id],
+        set_={"outline": stmt.excluded.outline, "refreshed_at": stmt.excluded.refreshed_at},
+    ))
+    db.commit()
+    return outline
+
+
+def rebuild_on_primary(course_id: int):
+    # a replica can serve stored rows but not write one, so a miss there is
+    # rebuilt (from the primary's current structure) and stored by the primary
+    with SessionLocal() as db:
+        return rebuild_outline(db, course_id)
+
+
+# --- Staleness tracking ---
+# Creating, editing, moving or deleting a chapter or lesson drops the course's
+# materialized row inside the same transaction, so readers never see an
+# outline older than the last committed structural change. Writers take the
+# course's outline lock exclusively first, which waits for any rebuild in
+# flight and keeps new ones out until the write commits.
+
+_LOCK_SHARED = text("SELECT pg_advisory_xact_lock_shared(hashtext('course_outline'), :course_id)")
+_LOCK_EXCLUSIVE = text("""
+    SELECT pg_advisory_xact_lock(hashtext('course_outline'), course_id)
+    FROM (SELECT course_id FROM unnest(CAST(:course_ids AS integer[])) AS course_id ORDER BY course_id) AS c
+""")
+
+
+def expire_outlines(session: Session, course_ids) -> None:
+    """Drop the materialized outlines of course_ids in the session's transaction."""
+    course_ids = sorted(set(course_ids) - {None})  # one lock order for every writer
+    if not course_ids:
+        return
+    session.execute(_LOCK_EXCLUSIVE, {"course_ids": course_ids})
+    session.execute(delete(CourseOutline).where(CourseOutline.course_id.in_(course_ids)))
+
+
+def _touched_courses(session: Session) -> set[int]:
+    course_ids = set()
+    chapter_ids = set()
+
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Course):
+            course_ids.add(obj.id)
+        elif isinstance(obj, Chapter):
+            course_ids.add(obj.course_id)
+        elif isinstance(obj, Lesson):
+            if obj.course_id is not None:
+                course_ids.add(obj.course_id)
+            else:
+                chapter_ids.add(obj.chapter_id)
+        elif isinstance(obj, CourseTag):
+            course_ids.add(obj.course_id)
+
+    chapter_ids.discard(None)
+    if chapter_ids:
+        rows = session.execute(select(Chapter.course_id).where(Chapter.id.in_(chapter_ids)))
+        course_ids.update(row.course_id for row in rows)
+
+    course_ids.discard(None)
+    return course_ids
+
+
+@event.listens_for(Session, "after_flush")
+def _expire_outlines(session, flush_context):
+    expire_outlines(session, _touched_courses(session))
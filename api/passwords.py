@@ -1,7 +1,37 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from argon2 import PasswordHasher
-from argon2.exceptions import VerifyMismatchError
+from argon2.exceptions import InvalidHashError, VerificationError, VerifyMismatchError
+from instrumentation import record_password_hash
+from metrics import Counter, Gauge, Histogram
+
+# Cost parameters; run `python -m bench.passwords --calibrate` on the target
+# hardware to pick values. Changing them rehashes users on their next login.
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", 3))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", 65536))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", 4))
+
+# argon2-cffi releases the GIL, so a thread pool gives real parallelism while
+# keeping hashing off the event loop and out of the request threadpool.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+# Jobs allowed to wait for a worker before new ones are refused outright.
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", 64))
+
+pwd_hasher = PasswordHasher(
+    time_cost=ARGON2_TIME_COST,
+    memory_cost=ARGON2_MEMORY_COST,
+    parallelism=ARGON2_PARALLELISM,
+)
+
+password_queue_depth = Gauge("password_hash_queue_depth", "Argon2 jobs waiting for a worker")
+password_in_flight = Gauge("password_hash_in_flight", "Argon2 jobs currently running")
+password_rejected = Counter("password_hash_rejected_total", "Argon2 jobs refused because the queue was full")
+password_seconds = Histogram("password_hash_seconds", "Argon2 job run time", labels=("op",))
+password_rehashed = Counter("password_rehash_total", "Hashes upgraded to the current parameters on login")
 
-pwd_hasher = PasswordHasher()
 
 def hash_password(password: str) -> str:
     return pwd_hasher.hash(password)
@@ -12,3 +42,76 @@ def verify_password(password: str, hashed: str) -> bool:
         return True
     except VerifyMismatchError:
         return False
+
+def verify_and_update(password: str, hashed: str) -> tuple[bool, str | None]:
+    """Verify, and return a fresh hash if the stored one uses outdated parameters."""
+    try:
+        pwd_hasher.verify(hashed, password)
+    except (VerifyMismatchError, VerificationError, InvalidHashError):
+        return False, None
+    if pwd_hasher.check_needs_rehash(hashed):
+        return True, pwd_hasher.hash(password)
+    return True, None
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+class PasswordHashingService:
+    """Runs Argon2 on a dedicated, bounded thread pool.
+
+    At most `workers` hashes run at once; up to `max_queue` more may wait.
+    Beyond that callers get PasswordHasherBusy immediately instead of piling
+    up behind a login storm and starving everything else.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="argon2")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _run(self, op, fn, *args):
+        password_queue_depth.dec()
+        password_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            result = fn(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            password_seconds.observe(elapsed, op=op)
+            password_in_flight.dec()
+            with self._lock:
+                self._pending -= 1
+        return result, elapsed
+
+    async def _submit(self, op, fn, *args):
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                password_rejected.inc()
+                raise PasswordHasherBusy()
+            self._pending += 1
+        password_queue_depth.inc()
+        loop = asyncio.get_running_loop()
+        # executor threads do not inherit the request context, so the
+        # hashing time is handed back and recorded from here
+        result, elapsed = await loop.run_in_executor(self._executor, self._run, op, fn, *args)
+        record_password_hash(elapsed)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._submit("hash", hash_password, password)
+
+    async def verify(self, password: str, hashed: str) -> tuple[bool, str | None]:
+        ok, new_hash = await self._submit("verify", verify_and_update, password, hashed)
+        if new_hash:
+            password_rehashed.inc()
+        return ok, new_hash
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+password_service = PasswordHashingService(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE)
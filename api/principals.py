@@ -0,0 +1,116 @@
+import os
+import time
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from cache import InMemoryBackend, TTLCache, shared_backend
+from models import CourseCreator, SystemAdmin, User
+from schemas import Principal
+
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", 60))
+
+# Cached principals are (Principal, loaded_at_ns). A user's "epoch" is the time
+# of their last deactivation or role change; anything loaded or issued before
+# it is stale. Epochs go to the shared backend when one is configured so a
+# change made through one worker is honoured by all of them.
+principal_cache = TTLCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+_epoch_store = shared_backend or InMemoryBackend()
+_epoch_ttl = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 30)) * 86400
+
+
+def principal_epoch(user_id: int) -> int:
+    stored = _epoch_store.get(f"principal:{user_id}:epoch")
+    return int(stored) if stored else 0
+
+
+def invalidate_principal(user_id: int) -> None:
+    _epoch_store.set(f"principal:{user_id}:epoch", str(time.time_ns()).encode(), ttl=_epoch_ttl)
+    principal_cache.delete(user_id)
+
+
+def load_principal(db: Session, user_id: int) -> Principal | None:
+    row = db.execute(
+        select(
+            User.id,
+            User.is_active,
+            select(SystemAdmin.user_id).where(SystemAdmin.user_id == User.id).exists().label("is_admin"),
+        ).where(User.id == user_id)
+    ).first()
+    if not row:
+        return None
+    course_ids = db.execute(
+        select(CourseCreator.course_id).where(CourseCreator.user_id == user_id).order_by(CourseCreator.course_id)
+    ).scalars().all()
+    return Principal(id=row.id, is_active=bool(row.is_active), is_admin=row.is_admin, creator_course_ids=course_ids)
+
+
+def get_principal(db: Session, user_id: int) -> Principal | None:
+    cached = principal_cache.get(user_id)
+    if cached is not None:
+        principal, loaded_at = cached
+        if loaded_at >= principal_epoch(user_id):
+            return principal
+
+    loaded_at = time.time_ns()
+    principal = load_principal(db, user_id)
+    if principal is not None:
+        principal_cache.set(user_id, (principal, loaded_at))
+    return principal
+
+
+# --- Token claims ---
+
+def principal_claims(principal: Principal) -> dict:
+    return {
+        "act": principal.is_active,
+        "adm": principal.is_admin,
+        "crs": principal.creator_course_ids,
+    }
+
+
+def principal_from_claims(payload: dict) -> Principal | None:
+    """Trust embedded claims unless the user changed after the token was issued."""
+    if "act" not in payload or "iat" not in payload:
+        return None
+    user_id = int(payload["sub"])
+    if payload["iat"] * 1_000_000_000 < principal_epoch(user_id):
+        return None
+    return Principal(
+        id=user_id,
+        is_active=payload["act"],
+        is_admin=payload.get("adm", False),
+        creator_course_ids=payload.get("crs", []),
+    )
+
+
+# --- Invalidation ---
+
+def _touched_users(session: Session) -> set[int]:
+    user_ids = set()
+    for obj in session.dirty:
+        if isinstance(obj, User) and inspect(obj).attrs.is_active.history.has_changes():
+            user_ids.add(obj.id)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (SystemAdmin, CourseCreator)):
+            user_ids.add(obj.user_id)
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            user_ids.add(obj.id)
+    user_ids.discard(None)
+    return user_ids
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_principals(session, flush_context):
+    session.info.setdefault("changed_principals", set()).update(_touched_users(session))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_principals(session):
+    for user_id in session.info.pop("changed_principals", ()):
+        invalidate_principal(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_principals(session):
+    session.info.pop("changed_principals", None)
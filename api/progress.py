@@ -0,0 +1,284 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import event, func, select, text
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from cache import TTLCache
+from database import SessionLocal
+from metrics import Counter, Gauge, Histogram
+from models import CourseStudent, Lesson, LessonProgress
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_FLUSH_INTERVAL = float(os.getenv("PROGRESS_FLUSH_INTERVAL", 5))
+# A batch that fails this many flushes in a row is dropped, not retried
+PROGRESS_FLUSH_MAX_ATTEMPTS = int(os.getenv("PROGRESS_FLUSH_MAX_ATTEMPTS", 5))
+COURSE_STATS_TTL = float(os.getenv("COURSE_STATS_TTL", 300))
+
+progress_events = Counter("progress_events_total", "Lesson views and answers buffered", labels=("kind",))
+progress_pending = Gauge("progress_pending", "Buffered progress entries awaiting flush")
+progress_flush_seconds = Histogram("progress_flush_seconds", "Time to write one progress batch")
+progress_flush_errors = Counter("progress_flush_errors_total", "Progress flushes that failed and were retried")
+progress_dropped = Counter("progress_dropped_total", "Buffered progress entries dropped after repeated flush failures")
+
+# lesson id -> course id, and course id -> number of lessons in it
+lesson_courses = TTLCache(100000, COURSE_STATS_TTL)
+course_lesson_counts = TTLCache(10000, COURSE_STATS_TTL)
+
+
+def lesson_course_id(db: Session, lesson_id: int) -> int | None:
+    course_id = lesson_courses.get(lesson_id)
+    if course_id is None:
+        course_id = db.execute(select(Lesson.course_id).where(Lesson.id == lesson_id)).scalar_one_or_none()
+        if course_id is not None:
+            lesson_courses.set(lesson_id, course_id)
+    return course_id
+
+
+def course_lesson_count(db: Session, course_id: int) -> int:
+    count = course_lesson_counts.get(course_id)
+    if count is None:
+        count = db.execute(select(func.count()).where(Lesson.course_id == course_id)).scalar()
+        course_lesson_counts.set(course_id, count)
+    return count
+
+
+def percent(completed: int, total: int) -> int:
+    return min(100, completed * 100 // max(total, 1))
+
+
+class ProgressBuffer:
+    """In-memory write-behind buffer for lesson views and answer activity.
+
+    Views are deduplicated per (user, lesson) and activity per (course, user),
+    so a student hammering one lesson costs one entry until the next flush.
+    Views are also indexed by user, so reading one student's pending views
+    does not scan everyone's.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}    # (user_id, lesson_id) -> (course_id, first seen)
+        self._by_user = {}  # user_id -> {lesson_id: course_id}, the same views
+        self._touches = {}  # (course_id, user_id) -> last seen
+        self.failures = 0   # consecutive failed flushes
+
+    def _add_view(self, user_id: int, lesson_id: int, course_id: int, at: datetime):
+        # caller holds the lock; the first view of a lesson wins
+        if (user_id, lesson_id) not in self._views:
+            self._views[(user_id, lesson_id)] = (course_id, at)
+            self._by_user.setdefault(user_id, {})[lesson_id] = course_id
+
+    def record_view(self, user_id: int, lesson_id: int, course_id: int, at: datetime | None = None):
+        at = at or datetime.utcnow()
+        with self._lock:
+            self._add_view(user_id, lesson_id, course_id, at)
+            self._touches[(course_id, user_id)] = at
+        progress_events.inc(kind="view")
+
+    def record_answer(self, user_id: int, course_id: int, at: datetime | None = None):
+        with self._lock:
+            self._touches[(course_id, user_id)] = at or datetime.utcnow()
+        progress_events.inc(kind="answer")
+
+    def drain(self):
+        with self._lock:
+            views, self._views, self._by_user = self._views, {}, {}
+            touches, self._touches = self._touches, {}
+        return views, touches
+
+    def restore(self, views, touches) -> bool:
+        """Put back a drained batch whose flush failed, keeping newer entries.
+
+        Gives up after PROGRESS_FLUSH_MAX_ATTEMPTS consecutive failures, so a
+        batch the database keeps rejecting cannot block every later flush.
+        Returns whether the batch was kept.
+        """
+        with self._lock:
+            self.failures += 1
+            if self.failures >= PROGRESS_FLUSH_MAX_ATTEMPTS:
+                self.failures = 0
+                return False
+            for (user_id, lesson_id), (course_id, at) in views.items():
+                self._add_view(user_id, lesson_id, course_id, at)
+            for key, at in touches.items():
+                if key not in self._touches or self._touches[key] < at:
+                    self._touches[key] = at
+        return True
+
+    def pending_lessons(self, user_id: int, course_id: int | None = None) -> dict[int, set[int]]:
+        """Buffered lesson views for a user, grouped by course."""
+        by_course = {}
+        with self._lock:
+            for lesson_id, cid in self._by_user.get(user_id, {}).items():
+                if course_id is None or cid == course_id:
+                    by_course.setdefault(cid, set()).add(lesson_id)
+        return by_course
+
+    def __len__(self):
+        return len(self._views) + len(self._touches)
+
+
+progress_buffer = ProgressBuffer()
+
+
+def track_view(db: Session, user_id: int, lesson_id: int) -> bool:
+    course_id = lesson_course_id(db, lesson_id)
+    if course_id is None:
+        return False
+    progress_buffer.record_view(user_id, lesson_id, course_id)
+    return True
+
+
+def track_answer(db: Session, user_id: int, lesson_id: int):
+    course_id = lesson_course_id(db, lesson_id)
+    if course_id is not None:
+        progress_buffer.record_answer(user_id, course_id)
+
+
+# --- Flushing ---
+
+# Views count only for students enrolled in the lesson's course. Joining the
+# live rows also drops views of lessons or users deleted since they were
+# buffered, which would otherwise fail the whole batch on a foreign key.
+_INSERT_VIEWS = text("""
+    INSERT INTO lesson_progress (user_id, lesson_id, course_id, viewed_at)
+    SELECT v.user_id, v.lesson_id, l.course_id, v.viewed_at
+    FROM unnest(
+        CAST(:user_ids AS integer[]), CAST(:lesson_ids AS integer[]), CAST(:viewed AS timestamp[])
+    ) AS v(user_id, lesson_id, viewed_at)
+    JOIN lessons l ON l.id = v.lesson_id
+    JOIN course_students cs ON cs.course_id = l.course_id AND cs.user_id = v.user_id
+    ON CONFLICT (user_id, lesson_id) DO NOTHING
+    RETURNING course_id, user_id
+""")
+
+# One statement for every touched enrollment. The per-course lesson totals
+# ride along in the unnest() so the percentage is recomputed from the
+# stored counter without reading the row first. Activity outside an
+# enrollment matches no row and is ignored.
+_UPDATE_ENROLLMENTS = text("""
+    UPDATE course_students AS cs SET
+        lessons_completed = cs.lessons_completed + v.increment,
+        progress = LEAST(100, (cs.lessons_completed + v.increment) * 100 / GREATEST(v.total, 1)),
+        last_accessed = GREATEST(cs.last_accessed, v.seen),
+        completed_at = COALESCE(cs.completed_at, CASE
+            WHEN cs.lessons_completed + v.increment >= v.total AND v.total > 0 THEN v.seen END)
+    FROM unnest(
+        CAST(:course_ids AS integer[]), CAST(:user_ids AS integer[]),
+        CAST(:increments AS integer[]), CAST(:totals AS integer[]),
+        CAST(:seen AS timestamp[])
+    ) AS v(course_id, user_id, increment, total, seen)
+    WHERE cs.course_id = v.course_id AND cs.user_id = v.user_id
+""")
+
+
+def write_progress(db: Session, views: dict, touches: dict) -> int:
+    """Persist one drained batch in two statements and return rows written."""
+    increments = {}
+    if views:
+        inserted = db.execute(_INSERT_VIEWS, {
+            "user_ids": [user_id for user_id, _ in views],
+            "lesson_ids": [lesson_id for _, lesson_id in views],
+            "viewed": [at for _, at in views.values()],
+        }).all()
+        # only first-ever views of a lesson advance the completed counter
+        for course_id, user_id in inserted:
+            increments[(course_id, user_id)] = increments.get((course_id, user_id), 0) + 1
+
+    keys = set(touches) | set(increments)
+    if not keys:
+        db.commit()
+        return len(views)
+
+    keys = sorted(keys)  # stable lock order across concurrent flushes
+    totals = {course_id: course_lesson_count(db, course_id) for course_id, _ in keys}
+    db.execute(_UPDATE_ENROLLMENTS, {
+        "course_ids": [course_id for course_id, _ in keys],
+        "user_ids": [user_id for _, user_id in keys],
+        "increments": [increments.get(key, 0) for key in keys],
+        "totals": [totals[course_id] for course_id, _ in keys],
+        "seen": [touches.get(key) for key in keys],
+    })
+    db.commit()
+    return len(views) + len(keys)
+
+
+def flush_progress() -> int:
+    views, touches = progress_buffer.drain()
+    if not views and not touches:
+        return 0
+    db = SessionLocal()
+    start = time.perf_counter()
+    try:
+        written = write_progress(db, views, touches)
+        progress_buffer.failures = 0
+        progress_flush_seconds.observe(time.perf_counter() - start)
+        return written
+    except Exception:
+        db.rollback()
+        progress_flush_errors.inc()
+        if not progress_buffer.restore(views, touches):
+            progress_dropped.inc(len(views) + len(touches))
+            logger.error("dropping %d buffered progress entries after repeated flush failures", len(views) + len(touches))
+        raise
+    finally:
+        db.close()
+        progress_pending.set(len(progress_buffer))
+
+
+async def run_flusher(interval: float = PROGRESS_FLUSH_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(flush_progress)
+        except Exception:
+            logger.exception("progress flush failed; will retry")
+
+
+# --- Reads ---
+
+def enrollment_progress(db: Session, user_id: int, course_id: int | None = None) -> list[dict]:
+    """Enrollments for a user, including views still sitting in the buffer."""
+    query = select(CourseStudent).where(CourseStudent.user_id == user_id)
+    done = select(LessonProgress.course_id, LessonProgress.lesson_id).where(LessonProgress.user_id == user_id)
+    if course_id is not None:
+        query = query.where(CourseStudent.course_id == course_id)
+        done = done.where(LessonProgress.course_id == course_id)
+
+    enrollments = {row.course_id: row for row in db.execute(query).scalars()}
+    completed = {}
+    for cid, lesson_id in db.execute(done):
+        completed.setdefault(cid, set()).add(lesson_id)
+    for cid, lesson_ids in progress_buffer.pending_lessons(user_id, course_id).items():
+        completed.setdefault(cid, set()).update(lesson_ids)
+
+    result = []
+    for cid in sorted(enrollments):
+        enrollment = enrollments[cid]
+        total = course_lesson_count(db, cid)
+        count = len(completed.get(cid, ()))
+        result.append({
+            "course_id": cid,
+            "lessons_completed": count,
+            "lesson_count": total,
+            "progress": percent(count, total),
+            "enrolled_at": enrollment.enrolled_at,
+            "last_accessed": enrollment.last_accessed,
+            "completed_at": enrollment.completed_at,
+        })
+    return result
+
+
+# --- Cache invalidation ---
+
+@event.listens_for(Session, "after_flush")
+def _expire_course_stats(session, flush_context):
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, Lesson):
+            course_lesson_counts.delete(obj.course_id)
+            lesson_courses.delete(obj.id)
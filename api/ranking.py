@@ -0,0 +1,274 @@
+"""Fractional ordering for chapters, lessons, lesson content and question options.
+
+sort_order is a double precision rank. Appending takes the parent's largest
+rank plus RANK_STEP, and moving an item gives it the midpoint of its new
+neighbours. Either way only the moved row is written, where integer
+positions meant renumbering every row after it.
+
+Repeated inserts into the same gap halve it each time. Once a gap falls
+below RANK_MIN_GAP the parent's children are renumbered RANK_STEP apart
+(rebalanced). That happens inline, when a move finds no room, or from the
+periodic rebalancer, which looks for tight gaps before moves run into them.
+
+    python -m ranking rebalance     # rebalance every crowded parent now
+"""
+import argparse
+import asyncio
+import logging
+import os
+from fastapi import HTTPException
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from database import SessionLocal
+from metrics import Counter
+from models import Chapter, Lesson, LessonContent, QuestionOption
+from content import mark_lessons_dirty
+from outline import expire_outlines
+
+logger = logging.getLogger(__name__)
+
+RANK_STEP = 1024.0
+# About 40 halvings of RANK_STEP, after which a move forces a rebalance
+RANK_MIN_GAP = 1e-9
+RANK_REBALANCE_INTERVAL = float(os.getenv("RANK_REBALANCE_INTERVAL", 600))
+# Scanned gaps smaller than this are rebalanced ahead of time
+RANK_REBALANCE_GAP = 1e-3
+
+rank_rebalances = Counter("rank_rebalances_total", "Parents whose children were renumbered", labels=("kind", "trigger"))
+
+# kind -> (model, parent column name)
+ORDERED = {
+    "chapter": (Chapter, "course_id"),
+    "lesson": (Lesson, "chapter_id"),
+    "content": (LessonContent, "lesson_id"),
+    "option": (QuestionOption, "question_id"),
+}
+
+
+def rank_between(before: float | None, after: float | None) -> float | None:
+    """A rank strictly between two neighbours (None = open end), or None if there is no room."""
+    if before is None and after is None:
+        return RANK_STEP
+    if before is None:
+        return after - RANK_STEP
+    if after is None:
+        return before + RANK_STEP
+    mid = (before + after) / 2
+    # the second test catches gaps below float resolution at large ranks
+    if after - before < RANK_MIN_GAP or not before < mid < after:
+        return None
+    return mid
+
+
+def next_rank(db: Session, kind: str, parent_id: int) -> float:
+    """Rank that appends after the parent's current last child (one index probe)."""
+    model, parent_column = ORDERED[kind]
+    last = db.execute(select(func.max(model.sort_order)).where(getattr(model, parent_column) == parent_id)).scalar()
+    return rank_between(last, None)
+
+
+def rebalance(db: Session, kind: str, parent_id: int, trigger: str = "inline") -> None:
+    """Renumber a parent's children RANK_STEP apart, keeping their order.
+
+    Locks the children first, so a concurrent move waits instead of computing
+    a midpoint from ranks that are about to change.
+    """
+    model, parent_column = ORDERED[kind]
+    table = model.__table__.name
+    db.flush()  # pending changes would be lost to expire_all below
+    db.execute(text(f"SELECT 1 FROM {table} WHERE {parent_column} = :parent FOR UPDATE"), {"parent": parent_id})
+    db.execute(text(f"""
+        UPDATE {table} AS t SET sort_order = r.n * :step
+        FROM (
+            SELECT id, row_number() OVER (ORDER BY sort_order NULLS LAST, id) AS n
+            FROM {table} WHERE {parent_column} = :parent
+        ) AS r
+        WHERE t.id = r.id AND t.sort_order IS DISTINCT FROM r.n * :step
+    """), {"parent": parent_id, "step": RANK_STEP})
+    # the update bypasses the ORM, so drop materialized outlines and cached
+    # lesson payloads by hand: order is unchanged but they carry the old numbers
+    if kind == "chapter":
+        expire_outlines(db, [parent_id])
+    elif kind == "lesson":
+        expire_outlines(db, [db.execute(select(Chapter.course_id).where(Chapter.id == parent_id)).scalar()])
+    elif kind == "content":
+        mark_lessons_dirty(db, [parent_id])
+    else:
+        mark_lessons_dirty(db, [db.execute(select(LessonContent.lesson_id).where(LessonContent.id == parent_id)).scalar()])
+    db.expire_all()
+    rank_rebalances.inc(kind=kind, trigger=trigger)
+
+
+# --- Moves ---
+
+def _neighbour_after(db: Session, model, parent, parent_id, rank: float | None, exclude: int | None) -> float | None:
+    """Rank of the first sibling after rank (or the first sibling at all)."""
+    stmt = select(model.sort_order).where(parent == parent_id, model.sort_order.isnot(None))
+    if exclude is not None:
+        stmt = stmt.where(model.id != exclude)
+    if rank is not None:
+        stmt = stmt.where(model.sort_order > rank)
+    return db.execute(stmt.order_by(model.sort_order).limit(1)).scalar()
+
+
+def rank_after(db: Session, kind: str, parent_id: int, after_id: int | None, exclude: int | None = None) -> float:
+    """Rank for the slot right after sibling after_id (None = first) under parent_id.
+
+    Rebalances the parent first if that slot has no room left.
+    """
+    model, parent_column = ORDERED[kind]
+    parent = getattr(model, parent_column)
+    anchor = None
+    if after_id is not None:
+        anchor = db.get(model, after_id)
+        if anchor is None or getattr(anchor, parent_column) != parent_id or anchor.id == exclude:
+            raise HTTPException(status_code=400, detail=f"{kind} {after_id} is not a sibling under {parent_id}")
+        if anchor.sort_order is None:  # legacy unranked row
+            rebalance(db, kind, parent_id)
+
+    before = anchor.sort_order if anchor is not None else None
+    rank = rank_between(before, _neighbour_after(db, model, parent, parent_id, before, exclude))
+    if rank is None:
+        rebalance(db, kind, parent_id)
+        before = anchor.sort_order if anchor is not None else None  # reloaded after the rebalance
+        rank = rank_between(before, _neighbour_after(db, model, parent, parent_id, before, exclude))
+    return rank
+
+
+def move(db: Session, kind: str, item_id: int, after_id: int | None, parent_id: int | None = None):
+    """Place an item right after after_id (None = first), optionally under a new parent.
+
+    Writes only the moved row unless the gap is exhausted. The caller commits.
+    """
+    model, parent_column = ORDERED[kind]
+    item = db.get(model, item_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail=f"{kind} {item_id} not found")
+    if parent_id is not None and parent_id != getattr(item, parent_column):
+        _reparent(db, kind, item, parent_id)
+    rank = rank_after(db, kind, getattr(item, parent_column), after_id, exclude=item_id)
+    item.sort_order = rank
+    # later moves in the same batch must see this one
+    db.flush()
+    return item
+
+
+def _reparent(db: Session, kind: str, item, parent_id: int) -> None:
+    if kind == "lesson":
+        chapter = db.get(Chapter, parent_id)
+        if chapter is None or chapter.course_id != item.course_id:
+            raise HTTPException(status_code=400, detail="Lessons can only move between chapters of their course")
+        item.chapter_id = parent_id
+    elif kind == "content":
+        lesson = db.get(Lesson, parent_id)
+        if lesson is None:
+            raise HTTPException(status_code=400, detail=f"lesson {parent_id} not found")
+        item.lesson_id = parent_id
+    else:
+        raise HTTPException(status_code=400, detail=f"A {kind} cannot change parent")
+
+
+# kind -> kind of its parent, for moves that change it
+PARENT_KIND = {"lesson": "chapter", "content": "lesson"}
+
+
+def _course_of(kind: str):
+    """(SELECT of (id, owning course id), id column to filter on) for items of a kind.
+
+    lessons.course_id is nullable on legacy rows, so lessons and everything
+    below them resolve their course through the chapter.
+    """
+    if kind == "chapter":
+        return select(Chapter.id, Chapter.course_id), Chapter.id
+    id_column = {"lesson": Lesson.id, "content": LessonContent.id, "option": QuestionOption.id}[kind]
+    stmt = select(id_column, Chapter.course_id).select_from(Lesson).join(Chapter, Chapter.id == Lesson.chapter_id)
+    if kind != "lesson":
+        stmt = stmt.join(LessonContent, LessonContent.lesson_id == Lesson.id)
+    if kind == "option":
+        stmt = stmt.join(QuestionOption, QuestionOption.question_id == LessonContent.id)
+    return stmt, id_column
+
+
+def move_course_ids(db: Session, moves) -> set[int | None]:
+    """Courses a batch of moves writes to: each moved item's and each new parent's.
+
+    None stands for an item whose course cannot be determined (missing, or
+    in a chapter without a course); require_creator leaves those to admins.
+    """
+    ids = {}
+    for m in moves:
+        ids.setdefault(m.kind, set()).add(m.id)
+        if m.parent_id is not None and m.kind in PARENT_KIND:
+            ids.setdefault(PARENT_KIND[m.kind], set()).add(m.parent_id)
+    course_ids = set()
+    for kind, item_ids in ids.items():
+        stmt, id_column = _course_of(kind)
+        found = dict(db.execute(stmt.where(id_column.in_(item_ids))).all())
+        course_ids.update(found.get(item_id) for item_id in item_ids)
+    return course_ids
+
+
+def apply_moves(db: Session, moves) -> int:
+    """Apply an editor's drag-and-drop session atomically: all moves commit or none do."""
+    try:
+        for m in moves:
+            move(db, m.kind, m.id, m.after, m.parent_id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(moves)
+
+
+# --- Background rebalancing ---
+
+def crowded_parents(db: Session, kind: str, min_gap: float = RANK_REBALANCE_GAP) -> list[int]:
+    model, parent_column = ORDERED[kind]
+    table = model.__table__.name
+    return db.execute(text(f"""
+        SELECT DISTINCT parent FROM (
+            SELECT {parent_column} AS parent,
+                   sort_order - lag(sort_order) OVER (PARTITION BY {parent_column} ORDER BY sort_order) AS gap
+            FROM {table} WHERE {parent_column} IS NOT NULL
+        ) AS g
+        WHERE gap < :min_gap
+    """), {"min_gap": min_gap}).scalars().all()
+
+
+def rebalance_crowded() -> int:
+    """Rebalance every parent with a gap below RANK_REBALANCE_GAP; returns how many."""
+    db = SessionLocal()
+    done = 0
+    try:
+        # with many workers only one scans at a time
+        if not db.execute(text("SELECT pg_try_advisory_xact_lock(hashtext('ranking.rebalance'))")).scalar():
+            return 0
+        for kind in ORDERED:
+            for parent_id in crowded_parents(db, kind):
+                rebalance(db, kind, parent_id, trigger="background")
+                done += 1
+        db.commit()
+    finally:
+        db.close()
+    return done
+
+
+async def run_rebalancer(interval: float = RANK_REBALANCE_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(rebalance_crowded)
+        except Exception:
+            logger.exception("rank rebalance failed; will retry")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["rebalance"])
+    parser.parse_args()
+    print(f"rebalanced {rebalance_crowded()} parents")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Token-bucket rate limiting.
+
+A bucket holds up to `burst` tokens and refills at `rate` tokens per second.
+Each attempt takes one, and an empty bucket means the caller is refused
+until the next token arrives. Buckets live in a RateLimitBackend: in
+process by default, or in Redis (RATELIMIT_REDIS_URL, falling back to
+CACHE_REDIS_URL) so that all workers and replicas share one budget per key.
+
+Login is limited twice before any database lookup or Argon2 work. The
+per-account bucket is the primary limit, against many sources guessing one
+password. The per-client-IP bucket is a looser backstop against credential
+stuffing from one source. It has to allow a classroom logging in at once
+from behind one NAT address.
+
+The client IP is the connecting peer, unless that peer is a trusted proxy
+(TRUSTED_PROXIES: addresses or CIDR ranges, comma separated). In that case
+it is the nearest address in X-Forwarded-For that is not a trusted proxy.
+"""
+import ipaddress
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from fastapi import HTTPException
+from metrics import Counter
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+# Attempts per minute and burst size, per client IP and per account
+LOGIN_IP_PER_MINUTE = float(os.getenv("LOGIN_IP_PER_MINUTE", 300))
+LOGIN_IP_BURST = int(os.getenv("LOGIN_IP_BURST", 100))
+LOGIN_ACCOUNT_PER_MINUTE = float(os.getenv("LOGIN_ACCOUNT_PER_MINUTE", 6))
+LOGIN_ACCOUNT_BURST = int(os.getenv("LOGIN_ACCOUNT_BURST", 10))
+
+rate_limit_checks = Counter(
+    "rate_limit_checks_total", "Rate limit decisions", labels=("limiter", "outcome")
+)
+
+
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(net.strip(), strict=False)
+    for net in os.getenv("TRUSTED_PROXIES", "127.0.0.1").split(",") if net.strip()
+]
+
+
+def _trusted(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in net for net in TRUSTED_PROXIES)
+
+
+def client_ip(peer: str | None, forwarded_for: str | None) -> str | None:
+    """The address a request came from, looking through trusted proxies only.
+
+    X-Forwarded-For is read right to left, because each proxy appends the
+    address it received from. The first hop that is not a trusted proxy is
+    the client. Anything further left could have been sent by the client
+    itself.
+    """
+    if peer is None or not forwarded_for or not _trusted(peer):
+        return peer
+    hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _trusted(hop):
+            return hop
+    return hops[0] if hops else peer
+
+
+# --- Backends ---
+
+class RateLimitBackend:
+    """Interface for bucket storage."""
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        """Take one token. Returns 0 if allowed, else seconds until a token is available."""
+        raise NotImplementedError
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """Per-process buckets, bounded to the most recently used `max_keys`."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated)
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            # an evicted bucket restarts full, so drop the least recently used
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+# Refill, take and store in one round trip; time comes from the Redis server
+# so that clocks of different hosts do not matter.
+_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1e6
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + (now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+else
+  wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    def __init__(self, url: str):
+        import redis
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(_TAKE_SCRIPT)
+
+    def take(self, key, rate, burst):
+        return float(self._take(keys=[f"ratelimit:{key}"], args=[rate, burst]))
+
+
+def backend_from_env() -> RateLimitBackend:
+    url = os.getenv("RATELIMIT_REDIS_URL") or os.getenv("CACHE_REDIS_URL")
+    return RedisRateLimitBackend(url) if url else InMemoryRateLimitBackend()
+
+
+# --- Limiters ---
+
+class RateLimiter:
+    def __init__(self, name: str, per_minute: float, burst: int, backend: RateLimitBackend):
+        self.name = name
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.backend = backend
+
+    def hit(self, key: str) -> float:
+        """Count an attempt for key; returns 0 if allowed, else the Retry-After in seconds."""
+        wait = self.backend.take(f"{self.name}:{key}", self.rate, self.burst)
+        rate_limit_checks.inc(limiter=self.name, outcome="limited" if wait else "allowed")
+        return wait
+
+
+def _too_many(wait: float):
+    return HTTPException(
+        status_code=429, detail="Too many login attempts, please retry later",
+        headers={"Retry-After": str(math.ceil(wait))},
+    )
+
+
+_backend = backend_from_env()
+login_ip_limiter = RateLimiter("login_ip", LOGIN_IP_PER_MINUTE, LOGIN_IP_BURST, _backend)
+login_account_limiter = RateLimiter("login_account", LOGIN_ACCOUNT_PER_MINUTE, LOGIN_ACCOUNT_BURST, _backend)
+
+
+def check_login(ip: str | None, email: str) -> None:
+    """Raise 429 if this account or this IP has used up its login attempts."""
+    if not RATE_LIMIT_ENABLED:
+        return
+    # account first: guesses at one account then do not drain the budget
+    # of everyone else behind the same address
+    wait = login_account_limiter.hit(email.strip().lower())
+    if not wait:
+        wait = login_ip_limiter.hit(ip or "unknown")
+    if wait:
+        raise _too_many(wait)
@@ -0,0 +1,247 @@
+"""Server-side rendering of lesson text to sanitized HTML with MathML math.
+
+    python -m render 1            # pre-render every text in course 1
+
+Rendered fragments are stored in rendered_contents keyed by a hash of the
+source text and renderer version, so a text is rendered once no matter how
+many lessons, payload rebuilds or workers ask for it, and editing a text
+simply misses the cache for the new source.
+"""
+import argparse
+import hashlib
+import html
+import json
+import os
+import re
+import bleach
+import markdown
+from latex2mathml.converter import convert as latex_to_mathml
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from cache import LRUCache
+from database import SessionLocal, is_read_only
+from models import LessonContent, Lesson, MarkdownContent, Question, QuestionOption, RenderedContent
+
+# Bump when the output of render_html() changes to re-render everything.
+RENDERER_VERSION = "1"
+RENDER_BATCH = 1000
+
+rendered_fragments = LRUCache(int(os.getenv("RENDER_CACHE_MAX_BYTES", 16 * 1024 * 1024)))
+
+MARKDOWN_TAGS = {
+    "p", "br", "hr", "h1", "h2", "h3", "h4", "h5", "h6", "strong", "em", "del", "code", "pre",
+    "blockquote", "ul", "ol", "li", "a", "img", "table", "thead", "tbody", "tr", "th", "td",
+}
+MATHML_TAGS = {
+    "math", "semantics", "annotation", "mrow", "mi", "mn", "mo", "ms", "mtext", "mspace",
+    "msup", "msub", "msubsup", "mfrac", "msqrt", "mroot", "mover", "munder", "munderover",
+    "mtable", "mtr", "mtd", "mstyle", "mpadded", "mphantom", "menclose", "merror",
+}
+ALLOWED_ATTRIBUTES = {
+    "a": ["href", "title"],
+    "img": ["src", "alt", "title"],
+    "code": ["class"],
+    "math": ["xmlns", "display"],
+    "annotation": ["encoding"],
+    "mi": ["mathvariant"],
+    "mo": ["stretchy", "fence", "separator", "lspace", "rspace", "form", "largeop", "movablelimits",
+           "minsize", "maxsize"],
+    "mstyle": ["displaystyle", "scriptlevel", "mathvariant"],
+    "mfrac": ["linethickness"],
+    "mspace": ["width"],
+    "mtable": ["columnalign", "rowspacing", "columnspacing"],
+    "mtd": ["columnalign"],
+    "menclose": ["notation"],
+    "mpadded": ["width", "height", "depth", "lspace", "voffset"],
+}
+
+# $$..$$ and \[..\] are display math, $..$ and \(..\) inline; \$ is a dollar sign
+_MATH = re.compile(
+    r"\$\$(.+?)\$\$|\\\[(.+?)\\\]|\\\((.+?)\\\)|(?<![\\$])\$(?![\s$])([^$\n]+?)(?<![\s\\])\$",
+    re.S,
+)
+_PLACEHOLDER = re.compile("\u2063(\\d+)\u2063")  # invisible separator
+
+
+def source_hash(text: str, mode: str) -> str:
+    return hashlib.sha256(f"{RENDERER_VERSION}\0{mode}\0{text}".encode()).hexdigest()
+
+
+def _math(latex: str, display: bool) -> str:
+    try:
+        return latex_to_mathml(latex.strip(), display="block" if display else "inline")
+    except Exception:
+        return f'<code class="math-error">{html.escape(latex)}</code>'
+
+
+def block_mode(format: str | None) -> str:
+    """Render mode for a markdown item's text: format "plain" is not markdown."""
+    return "plain" if format == "plain" else "block"
+
+
+def render_html(text: str, mode: str = "block") -> str:
+    """Render markdown with LaTeX math to sanitized HTML.
+
+    Math is cut out before markdown runs (so x_1 does not turn into
+    emphasis), converted to MathML, and spliced back in; the whole fragment
+    is then sanitized. mode="inline" drops the wrapping paragraph, for
+    question options and other one-liners. mode="plain" only escapes the
+    text, keeping its paragraphs and line breaks.
+    """
+    if mode == "plain":
+        paragraphs = (html.escape(p).replace("\n", "<br>") for p in re.split(r"\n\s*\n", text.strip()) if p)
+        return "".join(f"<p>{p}</p>" for p in paragraphs)
+    formulas = []
+
+    def stash(match):
+        display_src = match.group(1) or match.group(2)
+        latex = display_src if display_src is not None else (match.group(3) or match.group(4))
+        formulas.append(_math(latex, display_src is not None))
+        return f"\u2063{len(formulas) - 1}\u2063"
+
+    body = markdown.markdown(_MATH.sub(stash, text), extensions=["tables", "fenced_code", "sane_lists"])
+    body = _PLACEHOLDER.sub(lambda m: formulas[int(m.group(1))], body)
+    if mode == "inline" and body.startswith("<p>") and body.endswith("</p>") and body.count("<p>") == 1:
+        body = body[3:-4]
+    return bleach.clean(
+        body,
+        tags=MARKDOWN_TAGS | MATHML_TAGS,
+        attributes=ALLOWED_ATTRIBUTES,
+        protocols={"http", "https", "mailto"},
+        strip=True,
+    )
+
+
+def get_rendered(db: Session, sources) -> dict[str, str]:
+    """Rendered HTML for (text, mode) pairs, keyed by source_hash.
+
+    Looks in process memory, then rendered_contents, and renders whatever
+    is left. New renders are stored unless the session is read-only.
+    """
+    wanted = {source_hash(text, mode): (text, mode) for text, mode in sources}
+    found = {}
+    for key in wanted:
+        fragment = rendered_fragments.get(key)
+        if fragment is not None:
+            found[key] = fragment
+
+    missing = [key for key in wanted if key not in found]
+    if missing:
+        rows = db.execute(
+            select(RenderedContent.source_hash, RenderedContent.html).where(RenderedContent.source_hash.in_(missing))
+        )
+        found.update(rows.all())
+
+    fresh = [
+        {"source_hash": key, "html": render_html(*wanted[key])}
+        for key in wanted if key not in found
+    ]
+    if fresh:
+        found.update((row["source_hash"], row["html"]) for row in fresh)
+        if not is_read_only(db):
+            db.execute(pg_insert(RenderedContent).on_conflict_do_nothing(index_elements=["source_hash"]), fresh)
+            db.commit()
+
+    for key, fragment in found.items():
+        rendered_fragments.set(key, fragment, len(fragment))
+    return found
+
+
+def _item_sources(item: dict):
+    data = item["data"]
+    if item["type"] == "markdown":
+        yield data["text"], block_mode(data["format"])
+        return
+    yield data["question"], "block"
+    if data.get("explanation"):
+        yield data["explanation"], "block"
+    for option in data.get("options", ()):
+        yield option, "inline"
+
+
+def render_items(db: Session, items: list[dict]) -> list[dict]:
+    """Swap the text of serialized lesson items for rendered HTML."""
+    fragments = get_rendered(db, [source for item in items for source in _item_sources(item)])
+
+    def rendered(text, mode):
+        return fragments[source_hash(text, mode)]
+
+    for item in items:
+        data = item["data"]
+        if item["type"] == "markdown":
+            data["text"] = rendered(data["text"], block_mode(data["format"]))
+            data["format"] = "html"
+            continue
+        data["question"] = rendered(data["question"], "block")
+        if data.get("explanation"):
+            data["explanation"] = rendered(data["explanation"], "block")
+        if "options" in data:
+            data["options"] = [rendered(option, "inline") for option in data["options"]]
+        data["markup"] = "html"
+    return items
+
+
+# --- Batch rendering ---
+
+def _course_sources(db: Session, course_id: int):
+    lesson_ids = select(Lesson.id).where(Lesson.course_id == course_id)
+    for text, format in db.execute(
+        select(MarkdownContent.text, MarkdownContent.format)
+        .join(LessonContent, LessonContent.id == MarkdownContent.content_id)
+        .where(LessonContent.lesson_id.in_(lesson_ids))
+    ).yield_per(RENDER_BATCH):
+        yield text, block_mode(format)
+    for question_text, explanation in db.execute(
+        select(Question.question_text, Question.explanation)
+        .join(LessonContent, LessonContent.id == Question.content_id)
+        .where(LessonContent.lesson_id.in_(lesson_ids))
+    ).yield_per(RENDER_BATCH):
+        yield question_text, "block"
+        if explanation:
+            yield explanation, "block"
+    for (text,) in db.execute(
+        select(QuestionOption.option_text)
+        .join(LessonContent, LessonContent.id == QuestionOption.question_id)
+        .where(LessonContent.lesson_id.in_(lesson_ids))
+    ).yield_per(RENDER_BATCH):
+        yield text, "inline"
+
+
+def render_course(db: Session, course_id: int) -> dict:
+    """Pre-render every text in a course, RENDER_BATCH sources at a time.
+
+    Texts whose current source is already in rendered_contents are skipped,
+    so re-running this after an edit only renders what changed.
+    """
+    sources = list(_course_sources(db, course_id))
+    rendered = 0
+    for start in range(0, len(sources), RENDER_BATCH):
+        batch = {source_hash(text, mode): (text, mode) for text, mode in sources[start:start + RENDER_BATCH]}
+        existing = set(db.execute(
+            select(RenderedContent.source_hash).where(RenderedContent.source_hash.in_(batch))
+        ).scalars())
+        fresh = [
+            {"source_hash": key, "html": render_html(text, mode)}
+            for key, (text, mode) in batch.items() if key not in existing
+        ]
+        if fresh:
+            db.execute(pg_insert(RenderedContent).on_conflict_do_nothing(index_elements=["source_hash"]), fresh)
+            db.commit()
+        rendered += len(fresh)
+    return {"course_id": course_id, "sources": len(sources), "rendered": rendered}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-render course content to HTML")
+    parser.add_argument("course_id", type=int)
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        print(json.dumps(render_course(db, args.course_id)))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
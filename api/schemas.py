@@ -1,41 +1,243 @@
-from pydantic import BaseModel, EmailStr
-from typing import List, Union, Literal
+from pydantic import AfterValidator, BaseModel, EmailStr, Field
+from datetime import datetime
+from typing import Annotated, List, Union, Literal
+
+def normalize_email(email: str) -> str:
+    """Canonical form stored in users.email and matched by idx_users_email_lower."""
+    return email.strip().lower()
+
+Email = Annotated[EmailStr, AfterValidator(normalize_email)]
 
 class UserCreate(BaseModel):
-    email: EmailStr
+    email: Email
     password: str
     username: str | None = None
 
 class UserLogin(BaseModel):
-    email: EmailStr
+    email: Email
     password: str
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class Principal(BaseModel):
+    """The minimal view of a user needed to authorize a request."""
+    id: int
+    is_active: bool
+    is_admin: bool = False
+    creator_course_ids: List[int] = []
+
 
+# With ?render=html, markdown text arrives as sanitized HTML (format "html")
+# and question fields as HTML fragments (markup "html").
 class MarkdownData(BaseModel):
     text: str
     format: str
 
+# Answers are never sent with lesson content; clients grade through
+# POST /lessons/{id}/submissions.
 class MultipleChoiceQuestionData(BaseModel):
     format: Literal["multiple_choice"]
     question: str
     options: List[str]
-    correct_answer: int
-    explanation: str
+    explanation: str | None = None
     visualization: bool
+    markup: str | None = None
+    variant: bool | None = None  # templated: fetch /lessons/{id}/variants
 
 class ShortAnswerQuestionData(BaseModel):
     format: Literal["short_answer"]
     question: str
-    correct_answer: str
-    explanation: str
+    explanation: str | None = None
     visualization: bool
+    markup: str | None = None
+    variant: bool | None = None  # templated: fetch /lessons/{id}/variants
 
 class QuestionContent(BaseModel):
+    id: int
     type: Literal["question"]
     data: Union[MultipleChoiceQuestionData, ShortAnswerQuestionData]
 
 class MarkdownContent(BaseModel):
+    id: int
     type: Literal["markdown"]
     data: MarkdownData
 
-LessonContentOut = Union[QuestionContent, MarkdownContent]
+# Tagged by "type" so validation goes straight to the right model
+LessonContentOut = Annotated[Union[QuestionContent, MarkdownContent], Field(discriminator="type")]
+
+
+# A parameterized question's numbers for one student. The answer stays
+# server-side; options are only set for multiple choice.
+class QuestionVariant(BaseModel):
+    content_id: int
+    question: str
+    options: List[str] | None = None
+
+class QuestionTemplateIn(BaseModel):
+    variables: dict[str, dict] = Field(min_length=1)  # name -> {min, max[, step, exclude]} or {choices}
+    answer: str
+    distractors: List[str] = []
+    distractor_count: int | None = Field(default=None, ge=0, le=9)
+    decimals: int | None = Field(default=None, ge=0, le=10)
+
+
+class AnswerIn(BaseModel):
+    content_id: int
+    # option index or short answer; bounded so parsing stays cheap
+    answer: Union[Annotated[int, Field(ge=-10**18, le=10**18)], Annotated[str, Field(max_length=500)]]
+
+class SubmissionIn(BaseModel):
+    answers: List[AnswerIn] = Field(max_length=200)
+
+class AnswerResult(BaseModel):
+    content_id: int
+    correct: bool
+    correct_answer: Union[int, str, None] = None
+    explanation: str | None = None
+
+class SubmissionResult(BaseModel):
+    lesson_id: int
+    score: int
+    total: int
+    results: List[AnswerResult]
+
+
+class OutlineLesson(BaseModel):
+    id: int
+    title: str
+    description: str | None = None
+    sort_order: float | None = None
+
+class OutlineChapter(BaseModel):
+    id: int
+    title: str
+    description: str | None = None
+    image_url: str | None = None
+    sort_order: float | None = None
+    lessons: List[OutlineLesson]
+
+class CourseOutline(BaseModel):
+    id: int
+    title: str
+    description: str | None = None
+    image_url: str | None = None
+    tags: List[str]
+    chapters: List[OutlineChapter]
+
+
+class CourseSummary(BaseModel):
+    id: int
+    title: str | None = None
+    description: str | None = None
+    image_url: str | None = None
+    created_at: datetime | None = None
+    updated_at: datetime | None = None
+    created_by: int | None = None
+    tags: List[str] | None = None
+
+class CoursePage(BaseModel):
+    items: List[CourseSummary]
+    next_cursor: str | None = None
+
+
+class SearchHit(BaseModel):
+    kind: Literal["course", "lesson", "markdown", "question"]
+    id: int
+    course_id: int | None = None
+    lesson_id: int | None = None
+    title: str | None = None
+    snippet: str
+    rank: float
+
+class SearchFacet(BaseModel):
+    tag: str
+    count: int
+
+class SearchResults(BaseModel):
+    items: List[SearchHit]
+    next_cursor: str | None = None
+    facets: List[SearchFacet] | None = None
+
+
+class EnrollmentProgress(BaseModel):
+    course_id: int
+    lessons_completed: int
+    lesson_count: int
+    progress: int
+    enrolled_at: datetime | None = None
+    last_accessed: datetime | None = None
+    completed_at: datetime | None = None
+
+
+# --- Bulk course documents (import/export) ---
+# One NDJSON line holds {"course": ImportCourse}, every following line holds
+# {"chapter": ImportChapter} with its lessons and their content nested inside.
+
+class ImportMarkdown(BaseModel):
+    type: Literal["markdown"]
+    text: str
+    format: str = "latex"
+
+class ImportOption(BaseModel):
+    text: str
+    is_correct: bool = False
+
+class ImportMultipleChoice(BaseModel):
+    type: Literal["question"]
+    format: Literal["multiple_choice"]
+    question: str
+    options: List[ImportOption]
+    explanation: str | None = None
+    visualization: bool = False
+    template: QuestionTemplateIn | None = None
+
+class ImportShortAnswer(BaseModel):
+    type: Literal["question"]
+    format: Literal["short_answer"]
+    question: str
+    correct_answer: str
+    explanation: str | None = None
+    visualization: bool = False
+    template: QuestionTemplateIn | None = None
+
+ImportContent = Union[ImportMarkdown, ImportMultipleChoice, ImportShortAnswer]
+
+class ImportLesson(BaseModel):
+    title: str
+    description: str | None = None
+    contents: List[ImportContent] = []
+
+class ImportChapter(BaseModel):
+    title: str
+    description: str | None = None
+    image_url: str | None = None
+    lessons: List[ImportLesson] = []
+
+class ImportCourse(BaseModel):
+    title: str
+    description: str | None = None
+    image_url: str | None = None
+    tags: List[str] = []
+
+class ImportResult(BaseModel):
+    course_id: int
+    chapters: int
+    lessons: int
+    contents: int
+    rows: int
+
+
+# --- Reordering ---
+
+class ReorderMove(BaseModel):
+    kind: Literal["chapter", "lesson", "content", "option"]
+    id: int
+    after: int | None = None  # sibling to place it after; None moves it first
+    parent_id: int | None = None  # new chapter (lessons) or lesson (content)
+
+class ReorderRequest(BaseModel):
+    moves: List[ReorderMove] = Field(min_length=1, max_length=500)
+
+class ReorderResult(BaseModel):
+    moved: int
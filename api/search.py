@@ -0,0 +1,157 @@
+import base64
+from fastapi import HTTPException
+from sqlalchemy import Float, Integer, and_, cast, func, literal, literal_column, null, select, tuple_, union_all
+from sqlalchemy.orm import Session
+from models import Course, CourseTag, Lesson, LessonContent, MarkdownContent, Question, Tag
+
+SEARCH_KINDS = ("course", "lesson", "markdown", "question")
+FACET_LIMIT = 20
+
+TS_CONFIG = literal_column("'english'::regconfig")
+HEADLINE_OPTIONS = "MaxWords=30, MinWords=10, ShortWord=1, MaxFragments=1"
+
+
+def encode_cursor(rank: float, kind: str, item_id: int) -> str:
+    raw = f"{rank!r}|{kind}|{item_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        rank, kind, item_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return float(rank), kind, int(item_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def parse_kinds(kinds: list[str] | None) -> list[str]:
+    if not kinds:
+        return list(SEARCH_KINDS)
+    unknown = [k for k in kinds if k not in SEARCH_KINDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown kinds: {', '.join(unknown)}")
+    return kinds
+
+
+def _hit(kind: str, item_id, course_id, lesson_id, title, body, vector, query):
+    return (
+        select(
+            literal(kind).label("kind"),
+            item_id.label("id"),
+            course_id.label("course_id"),
+            lesson_id.label("lesson_id"),
+            title.label("title"),
+            body.label("body"),
+            cast(func.ts_rank_cd(vector, query), Float).label("rank"),
+        )
+        .where(vector.op("@@")(query))
+    )
+
+
+def _matches(query, kinds: list[str]):
+    """One branch per searchable table, each an index scan on its GIN index."""
+    no_lesson = cast(null(), Integer)
+    branches = {
+        "course": lambda: _hit(
+            "course", Course.id, Course.id, no_lesson, Course.title, Course.description,
+            Course.search_vector, query,
+        ),
+        "lesson": lambda: _hit(
+            "lesson", Lesson.id, Lesson.course_id, Lesson.id, Lesson.title, Lesson.description,
+            Lesson.search_vector, query,
+        ),
+        "markdown": lambda: _hit(
+            "markdown", MarkdownContent.content_id, Lesson.course_id, Lesson.id, Lesson.title, MarkdownContent.text,
+            MarkdownContent.search_vector, query,
+        )
+        .join(LessonContent, LessonContent.id == MarkdownContent.content_id)
+        .join(Lesson, Lesson.id == LessonContent.lesson_id),
+        "question": lambda: _hit(
+            "question", Question.content_id, Lesson.course_id, Lesson.id, Lesson.title, Question.question_text,
+            Question.search_vector, query,
+        )
+        .join(LessonContent, LessonContent.id == Question.content_id)
+        .join(Lesson, Lesson.id == LessonContent.lesson_id),
+    }
+    return union_all(*(branches[kind]() for kind in kinds)).subquery("hits")
+
+
+def _tag_filter(hits, tags: list[str]):
+    return and_(*(
+        select(CourseTag.course_id)
+        .join(Tag, Tag.id == CourseTag.tag_id)
+        .where(CourseTag.course_id == hits.c.course_id, Tag.name == tag)
+        .exists()
+        for tag in tags
+    ))
+
+
+def search(
+    db: Session,
+    q: str,
+    limit: int,
+    cursor: str | None = None,
+    kinds: list[str] | None = None,
+    tags: list[str] | None = None,
+):
+    """Ranked full-text search over courses, lessons and lesson content.
+
+    The query goes through the same latex_to_text() as the indexed columns,
+    so "3x + 2x" finds "$3x + 2x$". Pages are keyset-paginated on
+    (rank, kind, id), and snippets are only built for the rows on the page.
+    Tag facets (courses per tag among the matches) come with the first page.
+    """
+    query = func.websearch_to_tsquery(TS_CONFIG, func.latex_to_text(q))
+    hits = _matches(query, parse_kinds(kinds))
+    condition = _tag_filter(hits, tags) if tags else None
+
+    page = select(hits).order_by(hits.c.rank.desc(), hits.c.kind.desc(), hits.c.id.desc()).limit(limit + 1)
+    if condition is not None:
+        page = page.where(condition)
+    if cursor:
+        page = page.where(tuple_(hits.c.rank, hits.c.kind, hits.c.id) < tuple_(*map(literal, decode_cursor(cursor))))
+    page = page.subquery("page")
+
+    rows = db.execute(
+        select(
+            page.c.kind, page.c.id, page.c.course_id, page.c.lesson_id, page.c.title, page.c.rank,
+            func.ts_headline(TS_CONFIG, func.coalesce(page.c.body, ""), query, HEADLINE_OPTIONS).label("snippet"),
+        )
+        .order_by(page.c.rank.desc(), page.c.kind.desc(), page.c.id.desc())
+    ).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = [
+        {
+            "kind": row.kind,
+            "id": row.id,
+            "course_id": row.course_id,
+            "lesson_id": row.lesson_id,
+            "title": row.title,
+            "snippet": row.snippet,
+            "rank": row.rank,
+        }
+        for row in rows
+    ]
+    result = {
+        "items": items,
+        "next_cursor": encode_cursor(rows[-1].rank, rows[-1].kind, rows[-1].id) if has_more else None,
+    }
+
+    if not cursor:
+        facets = (
+            select(Tag.name, func.count(func.distinct(hits.c.course_id)).label("count"))
+            .select_from(hits)
+            .join(CourseTag, CourseTag.course_id == hits.c.course_id)
+            .join(Tag, Tag.id == CourseTag.tag_id)
+            .group_by(Tag.name)
+            .order_by(func.count(func.distinct(hits.c.course_id)).desc(), Tag.name)
+            .limit(FACET_LIMIT)
+        )
+        if condition is not None:
+            facets = facets.where(condition)
+        result["facets"] = [{"tag": name, "count": count} for name, count in db.execute(facets)]
+
+    return result
@@ -0,0 +1,60 @@
+"""Request coalescing for hot reads.
+
+When a whole class opens the same lesson at once, every request would miss
+the cache together and run the same build. SingleFlight lets the first
+request for a key (the leader) run it while later identical requests wait
+for its result or exception instead of starting their own.
+
+Coalescing is per worker process and per event loop; the shared cache
+backend is what spreads a finished build across workers.
+"""
+import asyncio
+from metrics import Counter, Gauge
+
+singleflight_calls = Counter(
+    "singleflight_calls_total", "Coalesced calls by role (leader ran the build, follower shared it)",
+    labels=("group", "role"),
+)
+singleflight_in_flight = Gauge("singleflight_in_flight", "Builds currently running", labels=("group",))
+
+
+class _LeaderCancelled(Exception):
+    pass
+
+
+class SingleFlight:
+    def __init__(self, group: str):
+        self.group = group
+        self._calls = {}
+
+    async def do(self, key, fn):
+        """Return await fn(), sharing one call among concurrent callers with the same key."""
+        while True:
+            future = self._calls.get(key)
+            if future is None:
+                break
+            singleflight_calls.inc(group=self.group, role="follower")
+            try:
+                return await asyncio.shield(future)
+            except _LeaderCancelled:
+                # the leader's client went away; one of the waiters takes over
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        singleflight_calls.inc(group=self.group, role="leader")
+        singleflight_in_flight.inc(group=self.group)
+        try:
+            result = await fn()
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+            singleflight_in_flight.dec(group=self.group)
+            if not future.done():  # cancelled or interrupted
+                future.set_exception(_LeaderCancelled())
+            future.exception()  # mark retrieved so failures nobody waited on are not logged
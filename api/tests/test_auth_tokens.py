@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+import time
+from cache import InMemoryBackend
+
+
+def test_expired_write_once_keys_are_swept():
+    store = InMemoryBackend()
+    for i in range(InMemoryBackend.SWEEP_EVERY - 1):
+        store.add(f"refresh:used:{i}", b"1", ttl=0.001)
+    time.sleep(0.01)
+    store.add("refresh:used:last", b"1", ttl=60)  # the sweeping write
+    assert len(store) == 1 and store.get("refresh:used:last") == b"1"
+
+
+def test_max_entries_evicts_oldest():
+    store = InMemoryBackend(max_entries=3)
+    for key in "abcd":
+        store.set(key, key.encode(), ttl=60)
+    assert len(store) == 3 and store.get("a") is None and store.get("d") == b"d"
+
+
+def test_add_is_set_once():
+    store = InMemoryBackend()
+    assert store.add("jti", b"1", ttl=60)
+    assert not store.add("jti", b"1", ttl=60)
+
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_utils(env):
+    return subprocess.run([sys.executable, "-c", "import utils"], env=env, cwd=API_DIR, capture_output=True, text=True)
+
+
+def test_refuses_to_start_without_secret_key():
+    env = {k: v for k, v in os.environ.items() if k not in ("SECRET_KEY", "APP_ENV")}
+    result = import_utils(env)
+    assert result.returncode != 0 and "SECRET_KEY is not set" in result.stderr
+
+    result = import_utils(dict(env, APP_ENV="dev"))
+    assert result.returncode == 0, result.stderr
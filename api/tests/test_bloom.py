@@ -0,0 +1,79 @@
+import pytest
+from sqlalchemy import delete
+from bloom import BloomFilter, RegisteredEmails
+from database import SessionLocal
+from models import User
+from schemas import normalize_email
+
+
+def emails(prefix, n):
+    return [f"{prefix}{i}@example.com" for i in range(n)]
+
+
+@pytest.mark.parametrize("fp_rate", [0.01, 0.001])
+def test_false_positive_rate_stays_near_target(fp_rate):
+    capacity = 20_000
+    bloom = BloomFilter(capacity, fp_rate)
+    for email in emails("member", capacity):
+        bloom.add(email)
+
+    probes = emails("stranger", 100_000)
+    observed = sum(email in bloom for email in probes) / len(probes)
+    assert observed < fp_rate * 1.5
+
+
+def test_no_false_negatives_even_when_overfull():
+    bloom = BloomFilter(1_000, 0.01)
+    members = emails("member", 5_000)
+    for email in members:
+        bloom.add(email)
+    assert all(email in bloom for email in members)
+    assert bloom.count == 5_000
+
+
+@pytest.fixture
+def stored_emails(migrated):
+    # committed for real: rebuild reads through its own session
+    raw = [" Mixed.Case@Example.COM", "plain@example.com", "ÜMLAUT@example.com"]
+    db = SessionLocal()
+    users = [User(email=normalize_email(email)) for email in raw]
+    db.add_all(users)
+    db.commit()
+    try:
+        yield raw
+    finally:
+        db.execute(delete(User).where(User.id.in_([user.id for user in users])))
+        db.commit()
+        db.close()
+
+
+def test_rebuild_holds_every_stored_email(stored_emails):
+    registered = RegisteredEmails()
+    assert registered.might_contain("anyone@example.com")  # not built yet: always maybe
+
+    registered.rebuild()
+    for email in stored_emails:
+        assert registered.might_contain(normalize_email(email))
+        assert registered.might_contain(normalize_email(email.upper()))
+    assert registered.count() >= len(stored_emails)
+
+
+def test_sign_ups_survive_a_rebuild(stored_emails, monkeypatch):
+    registered = RegisteredEmails()
+    registered.rebuild()
+    registered.add("before@example.com")
+    assert registered.might_contain("before@example.com")
+
+    # a sign-up lands while the next rebuild is scanning users
+    scanning = BloomFilter.add
+
+    def add(self, email):
+        if registered._building is self and not registered.might_contain("during@example.com"):
+            registered.add("during@example.com")
+        scanning(self, email)
+
+    monkeypatch.setattr(BloomFilter, "add", add)
+    registered.rebuild()
+
+    assert registered.might_contain("during@example.com")
+    assert all(registered.might_contain(normalize_email(email)) for email in stored_emails)
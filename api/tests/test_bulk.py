@@ -0,0 +1,28 @@
+import json
+import pytest
+from bulk import CourseImportError, export_course, import_course
+
+TEMPLATE = {"variables": {"a": {"min": 2, "max": 9}}, "answer": "a * 2", "distractors": ["a + 2"], "decimals": 0}
+
+
+def document(template):
+    question = {
+        "type": "question", "format": "multiple_choice", "question": "Double {{a}}",
+        "options": [{"text": "4", "is_correct": True}, {"text": "3"}], "template": template,
+    }
+    lesson = {"title": "Doubling", "contents": [question]}
+    return [json.dumps({"course": {"title": "Templates"}}), json.dumps({"chapter": {"title": "One", "lessons": [lesson]}})]
+
+
+def test_templates_round_trip(db, migrated):
+    result = import_course(db, document(TEMPLATE))
+
+    lines = [json.loads(line) for line in export_course(db, result["course_id"])]
+    item = lines[1]["chapter"]["lessons"][0]["contents"][0]
+    assert item["template"] == {**TEMPLATE, "distractor_count": 3}
+
+
+def test_invalid_template_is_rejected_with_its_line(db, migrated):
+    with pytest.raises(CourseImportError) as e:
+        import_course(db, document({**TEMPLATE, "answer": "1 / (a - a)"}))
+    assert e.value.line == 2
@@ -0,0 +1,79 @@
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+from bundle import build_bundle, chapter_etag, has_lesson
+from cache import lesson_cache
+from database import get_read_db
+from main import app
+from models import Lesson
+
+ITEMS = [("markdown", "Like terms"), ("multiple_choice", "What is $3x + 2x$?", ["$5x$", "$6x$"], 0)]
+
+
+def test_etag_follows_content_not_cache_versions(db, make_lesson):
+    lesson = make_lesson(ITEMS)
+    chapter_id = lesson.chapter_id
+    etag = chapter_etag(db, chapter_id)
+
+    # a cache version bump (another worker, a restart) is not a change
+    lesson_cache.invalidate(lesson.id)
+    assert chapter_etag(db, chapter_id) == etag
+
+    markdown = lesson.contents[0].markdown
+    markdown.text = "Like terms combine"
+    db.flush()
+    edited = chapter_etag(db, chapter_id)
+    assert edited != etag
+
+    lesson.contents[1].question.options[1].option_text = "$5x^2$"
+    db.flush()
+    assert chapter_etag(db, chapter_id) not in (etag, edited)
+
+
+def test_etag_unknown_chapter(db, migrated):
+    assert chapter_etag(db, 0) is None
+
+
+def test_resume_after_lesson(db, make_lesson):
+    first = make_lesson(ITEMS)
+    second = Lesson(chapter_id=first.chapter_id, course_id=first.course_id, title="Second", sort_order=2048)
+    db.add(second)
+    db.flush()
+
+    lines = [orjson.loads(line) for line in build_bundle(db, first.chapter_id, after=first.id)]
+    assert lines[0]["chapter"]["lessons"] == 1
+    assert lines[1]["lesson"]["id"] == second.id
+    assert lines[-1] == {"end": {"lessons": 1}}
+    assert has_lesson(db, first.chapter_id, second.id)
+    assert not has_lesson(db, first.chapter_id, 0)
+
+
+
+def test_no_transaction_is_open_while_a_line_is_read(db, make_lesson):
+    lesson = make_lesson(ITEMS)
+    for _ in build_bundle(db, lesson.chapter_id):
+        assert not db.in_transaction()
+
+
+@pytest.fixture
+def client(db):
+    async def read_db():
+        yield db
+
+    app.dependency_overrides[get_read_db] = read_db
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.pop(get_read_db)
+
+
+def test_resume_after_foreign_lesson_is_rejected(db, make_lesson, client):
+    lesson = make_lesson(ITEMS)
+    other = make_lesson(ITEMS)
+
+    response = client.get(f"/chapters/{lesson.chapter_id}/bundle", params={"after": other.id})
+    assert response.status_code == 400
+
+    etag = chapter_etag(db, lesson.chapter_id)
+    response = client.get(f"/chapters/{lesson.chapter_id}/bundle", headers={"If-None-Match": etag})
+    assert response.status_code == 304
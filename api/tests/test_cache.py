@@ -0,0 +1,29 @@
+from cache import VersionedCache
+from compression import precompressed
+
+
+def test_versions_are_bounded_and_an_evicted_key_moves_forward():
+    cache = VersionedCache("test", max_bytes=1024, max_versions=2)
+    first = cache.version(1)
+    cache.version(2)
+    cache.version(1)  # 1 is now the most recently used
+    cache.version(3)
+
+    assert len(cache._versions) == 2
+    assert cache.version(1) == first
+    # 2 was evicted: a fresh version, so nothing cached under the old one is served
+    assert 2 not in cache._versions and cache.version(2) > first
+
+
+def test_compressed_forms_are_charged_to_the_lru():
+    cache = VersionedCache("test", max_bytes=4096)
+    body = bytes(range(256)) * 8  # 2 KB that barely compresses
+    payload = cache.get_or_build(1, lambda: body)
+    assert cache.local.current_bytes == len(body)
+
+    precompressed(payload, "gzip")
+    assert cache.local.current_bytes == payload.nbytes > len(body)
+
+    # the next payload no longer fits next to the first one and its gzip form
+    cache.get_or_build(2, lambda: body)
+    assert cache.peek(1) is None and cache.local.current_bytes == len(body)
@@ -0,0 +1,122 @@
+import gzip
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from compression import CompressionMiddleware, negotiate
+from database import SessionLocal
+from main import app
+from models import Chapter, Course, Lesson, LessonContent, MarkdownContent
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("gzip", "gzip"),
+    ("gzip, br", "br"),                  # equal q: the server's preference
+    ("gzip;q=0.9, br;q=0.5", "gzip"),
+    ("br;q=0, gzip", "gzip"),
+    ("*", "br"),
+    ("br;q=0, *;q=0.1", "gzip"),        # an explicit q=0 beats the wildcard
+    ("*;q=0", None),
+    ("identity", None),
+    ("GZIP ; q=0.5", "gzip"),
+    ("gzip;q=junk", None),
+])
+def test_negotiate(header, expected):
+    assert negotiate(header) == expected
+
+
+BIG = b'{"text": "' + b"x" * 2000 + b'"}'
+
+
+def big(request):
+    return Response(BIG, media_type="application/json")
+
+
+def small(request):
+    return Response(b'{"ok": true}', media_type="application/json")
+
+
+def streamed(request):
+    return StreamingResponse(iter([BIG, BIG]), media_type="application/x-ndjson")
+
+
+def already_encoded(request):
+    return Response(gzip.compress(BIG), media_type="application/json", headers={"Content-Encoding": "gzip"})
+
+
+@pytest.fixture
+def client():
+    routes = [Route(f"/{f.__name__}", f) for f in (big, small, streamed, already_encoded)]
+    plain = Starlette(routes=routes)
+    plain.add_middleware(CompressionMiddleware, minimum_size=1024)
+    return TestClient(plain)
+
+
+def test_compresses_large_bodies(client):
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) < len(BIG)
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.content == BIG
+
+
+def test_small_bodies_pass_through_but_vary(client):
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+def test_streams_and_encoded_bodies_pass_through(client):
+    streamed = client.get("/streamed", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in streamed.headers and streamed.content == BIG * 2
+
+    encoded = client.get("/already_encoded", headers={"Accept-Encoding": "br"})
+    assert encoded.headers["content-encoding"] == "gzip" and encoded.content == BIG
+
+
+@pytest.fixture
+def lesson_id(migrated):
+    # committed for real: the endpoint reads through its own session
+    db = SessionLocal()
+    course = Course(title="Compression")
+    lesson = Lesson(chapter=Chapter(course=course, title="Chapter", sort_order=1024), course=course, title="Long")
+    lesson.contents = [
+        LessonContent(content_type="markdown", sort_order=n * 1024.0, markdown=MarkdownContent(
+            text=f"Paragraph {n}: " + "like terms combine " * 20, format="markdown",
+        ))
+        for n in range(1, 6)
+    ]
+    db.add(lesson)
+    db.commit()
+    try:
+        yield lesson.id
+    finally:
+        db.execute(delete(Course).where(Course.id == course.id))
+        db.commit()
+        db.close()
+
+
+def test_lesson_content_has_an_etag_per_coding(lesson_id):
+    client = TestClient(app)
+    url = f"/lessons/{lesson_id}/content/"
+
+    identity = client.get(url, headers={"Accept-Encoding": "identity"})
+    gzipped = client.get(url, headers={"Accept-Encoding": "gzip"})
+    brotli = client.get(url, headers={"Accept-Encoding": "br"})
+
+    assert "content-encoding" not in identity.headers
+    assert gzipped.headers["content-encoding"] == "gzip" and brotli.headers["content-encoding"] == "br"
+    etag = identity.headers["etag"]
+    assert gzipped.headers["etag"] == etag[:-1] + '+gzip"'
+    assert brotli.headers["etag"] == etag[:-1] + '+br"'
+    assert identity.json() == gzipped.json() == brotli.json()
+
+    # a validator from one coding revalidates the others
+    revalidated = client.get(url, headers={"Accept-Encoding": "br", "If-None-Match": gzipped.headers["etag"]})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == brotli.headers["etag"]
+    assert "content-encoding" not in revalidated.headers
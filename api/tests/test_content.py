@@ -0,0 +1,54 @@
+from sqlalchemy import event
+from content import load_lesson_content
+from database import engine
+
+
+def mixed_items(n):
+    kinds = [
+        ("markdown", "Combine like terms: $3x + 2x = 5x$."),
+        ("multiple_choice", "What is $3x + 2x$?", ["$5x$", "$6x$", "$5x^2$"], 0),
+        ("short_answer", "Simplify $4y - y$.", "3y"),
+    ]
+    return [kinds[i % len(kinds)] for i in range(n)]
+
+
+def count_queries(fn):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        result = fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return statements, result
+
+
+def test_lesson_content_query_count_is_constant(db, make_lesson):
+    small = make_lesson(mixed_items(3))
+    large = make_lesson(mixed_items(60))
+    db.expunge_all()
+
+    small_statements, small_items = count_queries(lambda: load_lesson_content(db, small.id))
+    db.expunge_all()
+    large_statements, large_items = count_queries(lambda: load_lesson_content(db, large.id))
+
+    assert len(small_items) == 3 and len(large_items) == 60
+    # contents, then one SELECT ... IN per eager-loaded relationship
+    assert len(large_statements) == len(small_statements) <= 6
+
+
+def test_lesson_content_serializes_every_kind(db, make_lesson):
+    lesson = make_lesson(mixed_items(3))
+    db.expunge_all()
+
+    markdown, choice, short = load_lesson_content(db, lesson.id)
+
+    assert markdown["type"] == "markdown" and markdown["data"]["text"].startswith("Combine")
+    assert choice["data"]["format"] == "multiple_choice"
+    assert choice["data"]["options"] == ["$5x$", "$6x$", "$5x^2$"]
+    assert short["data"] == {
+        "format": "short_answer", "question": "Simplify $4y - y$.", "explanation": None, "visualization": False,
+    }
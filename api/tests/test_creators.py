@@ -0,0 +1,112 @@
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from auth import get_current_user
+from database import get_db
+from main import app
+from models import CourseCreator, User
+from schemas import Principal
+
+
+@pytest.fixture
+def as_user(db):
+    """as_user(principal) -> TestClient whose requests run as principal on the test session."""
+    def session():
+        yield db
+
+    def client(principal: Principal):
+        app.dependency_overrides[get_current_user] = lambda: principal
+        return TestClient(app)
+
+    app.dependency_overrides[get_db] = session
+    try:
+        yield client
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def lesson(make_lesson):
+    return make_lesson([("multiple_choice", "Pick", ["a", "b", "c"], 0), ("markdown", "Text")])
+
+
+def test_reorder_needs_the_course(db, as_user, lesson):
+    first, second = lesson.contents
+    body = {"moves": [{"kind": "content", "id": first.id, "after": second.id}]}
+
+    outsider = as_user(Principal(id=1, is_active=True, creator_course_ids=[lesson.course_id + 1]))
+    assert outsider.post("/reorder", json=body).status_code == 403
+
+    creator = as_user(Principal(id=1, is_active=True, creator_course_ids=[lesson.course_id]))
+    assert creator.post("/reorder", json=body).json() == {"moved": 1}
+
+
+def test_moving_content_into_another_course_needs_both(as_user, lesson, make_lesson):
+    other = make_lesson([("markdown", "Elsewhere")])
+    body = {"moves": [{"kind": "content", "id": lesson.contents[1].id, "after": None, "parent_id": other.id}]}
+
+    client = as_user(Principal(id=1, is_active=True, creator_course_ids=[lesson.course_id]))
+    assert client.post("/reorder", json=body).status_code == 403
+
+
+def test_template_and_render_need_the_course(as_user, lesson):
+    question_id = lesson.contents[0].id
+    template = {"variables": {"a": {"min": 1, "max": 9}}, "answer": "a + 1"}
+
+    outsider = as_user(Principal(id=1, is_active=True))
+    assert outsider.put(f"/questions/{question_id}/template", json=template).status_code == 403
+    assert outsider.post(f"/courses/{lesson.course_id}/render").status_code == 403
+
+    admin = as_user(Principal(id=1, is_active=True, is_admin=True))
+    assert admin.put(f"/questions/{question_id}/template", json=template).status_code == 200
+
+
+def test_import_needs_a_creator_and_records_them(db, as_user):
+    user = User(username="importer")
+    db.add(user)
+    db.flush()
+    document = orjson.dumps({"course": {"title": "Imported"}}) + b"\n" + orjson.dumps({"chapter": {"title": "One"}})
+
+    student = as_user(Principal(id=user.id, is_active=True))
+    assert student.post("/courses/import", content=document).status_code == 403
+
+    creator = as_user(Principal(id=user.id, is_active=True, creator_course_ids=[1]))
+    response = creator.post("/courses/import", content=document)
+    assert response.status_code == 200
+    course_id = response.json()["course_id"]
+    assert db.execute(select(CourseCreator.user_id).where(CourseCreator.course_id == course_id)).scalar() == user.id
+
+
+def test_template_resolves_the_course_through_the_chapter(db, as_user, lesson):
+    # legacy rows may lack lessons.course_id; that must not open them to every creator
+    lesson.course_id = None
+    db.flush()
+    question_id = lesson.contents[0].id
+    template = {"variables": {"a": {"min": 1, "max": 9}}, "answer": "a + 1"}
+
+    other_creator = as_user(Principal(id=1, is_active=True, creator_course_ids=[lesson.chapter.course_id + 1]))
+    assert other_creator.put(f"/questions/{question_id}/template", json=template).status_code == 403
+
+    creator = as_user(Principal(id=1, is_active=True, creator_course_ids=[lesson.chapter.course_id]))
+    assert creator.put(f"/questions/{question_id}/template", json=template).status_code == 200
+
+
+def test_reorder_resolves_lessons_through_the_chapter(db, as_user, lesson):
+    lesson.course_id = None
+    db.flush()
+    first, second = lesson.contents
+    body = {"moves": [{"kind": "option", "id": first.question.options[0].id, "after": None}]}
+
+    other_creator = as_user(Principal(id=1, is_active=True, creator_course_ids=[lesson.chapter.course_id + 1]))
+    assert other_creator.post("/reorder", json=body).status_code == 403
+
+    creator = as_user(Principal(id=1, is_active=True, creator_course_ids=[lesson.chapter.course_id]))
+    assert creator.post("/reorder", json=body).json() == {"moved": 1}
+
+
+def test_reorder_of_an_unknown_item_is_left_to_admins(as_user, lesson):
+    body = {"moves": [{"kind": "content", "id": lesson.contents[0].id, "after": None, "parent_id": 10**9}]}
+
+    creator = as_user(Principal(id=1, is_active=True, creator_course_ids=[lesson.course_id]))
+    assert creator.post("/reorder", json=body).status_code == 403
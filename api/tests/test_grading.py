@@ -0,0 +1,96 @@
+import pytest
+from grading import normalize_answer
+
+SAME = [
+    ("20", "20.0"),
+    ("20", "$20$"),
+    ("20", "\\(20\\)"),
+    ("20", "40/2"),
+    ("20", "\\frac{40}{2}"),
+    ("0.5", "\\dfrac{1}{2}"),
+    ("0.5", "\\tfrac{1}{2}"),
+    ("-3", "−3"),
+    ("-3", "$-3$"),
+    ("20", "(20)"),
+    ("-3", "(-3)"),
+    ("5", "\\left(5\\right)"),
+    ("0.5", "(1)/(2)"),
+    ("3y", "3Y"),
+    ("x+y", "x + y"),
+    ("2*3", "2 \\times 3"),
+]
+
+DIFFERENT = [
+    ("23", "2(3)"),
+    ("12", "(1)(2)"),
+    ("20", "((20))"),
+    ("1/0", "0"),
+    ("5x", "5x^2"),
+]
+
+
+@pytest.mark.parametrize("a, b", SAME)
+def test_equivalent_answers_match(a, b):
+    assert normalize_answer(a) == normalize_answer(b)
+
+
+@pytest.mark.parametrize("a, b", DIFFERENT)
+def test_distinct_answers_differ(a, b):
+    assert normalize_answer(a) != normalize_answer(b)
+
+
+def test_numbers_compare_by_value():
+    assert normalize_answer("\\frac{6}{4}") == ("num", normalize_answer("1.5")[1])
+    assert normalize_answer("2(3)")[0] == "text"
+
+
+def test_oversized_numbers_compare_as_text():
+    assert normalize_answer("9" * 5000) == ("text", "9" * 5000)
+    assert normalize_answer("1/" + "9" * 5000)[0] == "text"
+
+
+def test_submission_bounds():
+    from pydantic import ValidationError
+    from schemas import SubmissionIn
+    with pytest.raises(ValidationError):
+        SubmissionIn(answers=[{"content_id": 1, "answer": "9" * 501}])
+    with pytest.raises(ValidationError):
+        SubmissionIn(answers=[{"content_id": 1, "answer": 10 ** 19}])
+    with pytest.raises(ValidationError):
+        SubmissionIn(answers=[{"content_id": 1, "answer": "1"}] * 201)
+
+
+@pytest.fixture
+def student(db):
+    from models import User
+    user = User(username="grading-student")
+    db.add(user)
+    db.flush()
+    return user
+
+
+def submit(db, lesson, user, content_id, answer):
+    from grading import grade_submission
+    from schemas import AnswerIn
+    return grade_submission(db, lesson.id, user.id, [AnswerIn(content_id=content_id, answer=answer)])["results"][0]
+
+
+def test_key_is_revealed_only_after_a_correct_answer(db, make_lesson, student):
+    lesson = make_lesson([("short_answer", "Simplify $4y - y$.", "3y")])
+    content_id = lesson.contents[0].id
+
+    wrong = submit(db, lesson, student, content_id, "junk")
+    assert wrong == {"content_id": content_id, "correct": False, "correct_answer": None, "explanation": None}
+    right = submit(db, lesson, student, content_id, "3Y")
+    assert right["correct"] and right["correct_answer"] == "3y"
+    # solved once, the key stays visible
+    assert submit(db, lesson, student, content_id, "junk")["correct_answer"] == "3y"
+
+
+def test_key_is_revealed_after_enough_attempts(db, make_lesson, student):
+    from grading import REVEAL_AFTER_ATTEMPTS
+    lesson = make_lesson([("multiple_choice", "Pick", ["a", "b", "c"], 2)])
+    content_id = lesson.contents[0].id
+
+    results = [submit(db, lesson, student, content_id, 0) for _ in range(REVEAL_AFTER_ATTEMPTS)]
+    assert [r["correct_answer"] for r in results] == [None] * (REVEAL_AFTER_ATTEMPTS - 1) + [2]
@@ -0,0 +1,24 @@
+from fastapi.testclient import TestClient
+import main
+
+
+def test_shutdown_flushes_progress_before_disposing_pools(monkeypatch):
+    events = []
+
+    async def dispose_engines():
+        events.append("dispose")
+
+    class Passwords:
+        def shutdown(self):
+            events.append("passwords")
+
+    monkeypatch.setattr(main, "flush_progress", lambda: events.append("flush"))
+    monkeypatch.setattr(main, "password_service", Passwords())
+    monkeypatch.setattr(main, "dispose_engines", dispose_engines)
+    monkeypatch.setattr(main, "EMAIL_BLOOM", False)
+    monkeypatch.setattr(main, "RANK_REBALANCE_INTERVAL", 0)
+    monkeypatch.setattr(main, "WARMUP", False)
+
+    with TestClient(main.app):
+        assert events == []
+    assert events == ["flush", "passwords", "dispose"]
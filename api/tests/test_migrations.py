@@ -0,0 +1,44 @@
+from alembic import command
+from sqlalchemy import inspect, text
+from conftest import alembic_config
+from database import engine
+from models import Base
+
+
+def table_names():
+    with engine.connect() as connection:
+        return set(inspect(connection).get_table_names()) - {"alembic_version"}
+
+
+def test_downgrade_base_then_upgrade_head(migrated):
+    config = alembic_config()
+
+    command.downgrade(config, "base")
+    assert table_names() == set()
+
+    # a clean database, as `alembic upgrade head` sees on first deploy
+    command.upgrade(config, "head")
+    assert table_names() >= set(Base.metadata.tables)
+
+
+def test_upgrade_a_database_at_the_init_sql_baseline(migrated):
+    # what `alembic stamp 0001` hands the later revisions: init.sql's schema, with rows in it
+    config = alembic_config()
+    command.downgrade(config, "0001")
+    with engine.begin() as connection:
+        connection.execute(text("""
+            WITH c AS (INSERT INTO courses (title) VALUES ('Fractions') RETURNING id),
+                 ch AS (INSERT INTO chapters (course_id, title, sort_order) SELECT id, 'Halves', 1 FROM c RETURNING id, course_id)
+            INSERT INTO lessons (chapter_id, course_id, title, sort_order) SELECT id, course_id, '$\\frac{1}{2}$', 1 FROM ch
+        """))
+
+    command.upgrade(config, "head")
+    try:
+        with engine.connect() as connection:
+            sort_order, matches = connection.execute(text(
+                "SELECT sort_order, search_vector @@ to_tsquery('english', 'frac') FROM lessons"
+            )).one()
+        assert (sort_order, matches) == (1024, True)
+    finally:
+        with engine.begin() as connection:
+            connection.execute(text("DELETE FROM courses"))
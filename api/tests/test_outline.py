@@ -0,0 +1,86 @@
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, select
+from database import SessionLocal, get_read_db
+from main import app
+from models import Chapter, Course, CourseOutline, Lesson
+from outline import get_outline
+
+
+@pytest.fixture
+def course_id(migrated):
+    # committed for real: the race needs two transactions
+    db = SessionLocal()
+    course = Course(title="Outline race")
+    chapter = Chapter(course=course, title="Chapter", sort_order=1024)
+    db.add(Lesson(chapter=chapter, course=course, title="First", sort_order=1024))
+    db.commit()
+    try:
+        yield course.id
+    finally:
+        db.execute(delete(Course).where(Course.id == course.id))
+        db.commit()
+        db.close()
+
+
+def test_rebuild_waits_for_structural_write(course_id):
+    writer = SessionLocal()
+    chapter = writer.execute(select(Chapter).where(Chapter.course_id == course_id)).scalar_one()
+    writer.add(Lesson(chapter=chapter, course_id=course_id, title="Second", sort_order=2048))
+    writer.flush()  # holds the course's outline lock until commit
+
+    result = {}
+
+    def read():
+        reader = SessionLocal()
+        try:
+            result["outline"] = get_outline(reader, course_id)
+        finally:
+            reader.close()
+
+    thread = threading.Thread(target=read)
+    thread.start()
+    try:
+        thread.join(0.5)
+        waited = thread.is_alive()
+        writer.commit()
+    finally:
+        writer.close()
+    thread.join(10)
+    assert waited, "rebuild did not wait for the uncommitted write"
+
+    titles = [lesson["title"] for lesson in result["outline"]["chapters"][0]["lessons"]]
+    assert titles == ["First", "Second"]
+    check = SessionLocal()
+    stored = check.execute(select(CourseOutline.outline).where(CourseOutline.course_id == course_id)).scalar_one()
+    check.close()
+    assert [lesson["title"] for lesson in stored["chapters"][0]["lessons"]] == ["First", "Second"]
+
+
+def test_write_after_rebuild_expires_it(course_id):
+    db = SessionLocal()
+    assert len(get_outline(db, course_id)["chapters"][0]["lessons"]) == 1
+    chapter = db.execute(select(Chapter).where(Chapter.course_id == course_id)).scalar_one()
+    db.add(Lesson(chapter=chapter, course_id=course_id, title="Second", sort_order=2048))
+    db.commit()
+
+    assert len(get_outline(db, course_id)["chapters"][0]["lessons"]) == 2
+    db.close()
+
+
+def test_replica_miss_is_stored_through_the_primary(course_id):
+    def replica():
+        with SessionLocal(info={"read_only": True}) as db:
+            yield db
+
+    app.dependency_overrides[get_read_db] = replica
+    try:
+        response = TestClient(app).get(f"/courses/{course_id}/outline")
+    finally:
+        app.dependency_overrides.pop(get_read_db)
+    assert response.status_code == 200
+
+    with SessionLocal() as check:
+        stored = check.execute(select(CourseOutline.outline).where(CourseOutline.course_id == course_id)).scalar_one()
+    assert stored == response.json()
@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select
+import progress
+from models import CourseStudent, Lesson, LessonProgress, User
+from progress import PROGRESS_FLUSH_MAX_ATTEMPTS, ProgressBuffer, enrollment_progress, flush_progress, write_progress
+
+T0 = datetime(2026, 1, 1)
+
+
+def test_buffer_dedupes_views_and_keeps_the_latest_touch():
+    buffer = ProgressBuffer()
+    buffer.record_view(1, 10, 100, at=T0)
+    buffer.record_view(1, 10, 100, at=T0 + timedelta(minutes=1))
+    buffer.record_view(1, 11, 101, at=T0 + timedelta(minutes=2))
+    buffer.record_view(2, 10, 100, at=T0)
+    buffer.record_answer(1, 100, at=T0 + timedelta(minutes=3))
+
+    assert buffer.pending_lessons(1) == {100: {10}, 101: {11}}
+    assert buffer.pending_lessons(1, 101) == {101: {11}}
+    assert buffer.pending_lessons(3) == {}
+
+    views, touches = buffer.drain()
+    assert views == {(1, 10): (100, T0), (1, 11): (101, T0 + timedelta(minutes=2)), (2, 10): (100, T0)}
+    assert touches[(100, 1)] == T0 + timedelta(minutes=3)
+    assert len(buffer) == 0 and buffer.pending_lessons(1) == {}
+
+
+@pytest.fixture
+def enrolled(db, make_lesson):
+    """(user, first lesson, second lesson) of a course the user is enrolled in."""
+    first = make_lesson()
+    second = Lesson(chapter_id=first.chapter_id, course_id=first.course_id, title="Second", sort_order=2048)
+    user = User(username="progress-student")
+    db.add_all([second, user])
+    db.flush()
+    db.add(CourseStudent(course_id=first.course_id, user_id=user.id))
+    db.flush()
+    return user, first, second
+
+
+def test_write_counts_first_views_once_and_only_for_enrollments(db, enrolled, make_lesson):
+    user, first, second = enrolled
+    outside = make_lesson()
+
+    views = {(user.id, first.id): (first.course_id, T0), (user.id, outside.id): (outside.course_id, T0)}
+    written = write_progress(db, views, {(first.course_id, user.id): T0})
+    assert written == 3
+    # a view already stored, in a later batch, does not count again
+    write_progress(db, {(user.id, first.id): (first.course_id, T0)}, {(first.course_id, user.id): T0 + timedelta(hours=1)})
+
+    stored = db.execute(select(LessonProgress.lesson_id).where(LessonProgress.user_id == user.id)).scalars().all()
+    assert stored == [first.id]
+    enrollment = db.execute(select(CourseStudent).where(CourseStudent.user_id == user.id)).scalar_one()
+    db.refresh(enrollment)
+    assert (enrollment.lessons_completed, enrollment.progress, enrollment.completed_at) == (1, 50, None)
+    assert enrollment.last_accessed == T0 + timedelta(hours=1)
+
+    write_progress(db, {(user.id, second.id): (second.course_id, T0)}, {})
+    db.refresh(enrollment)
+    assert (enrollment.lessons_completed, enrollment.progress) == (2, 100)
+
+
+@pytest.fixture
+def buffer(monkeypatch):
+    buffer = ProgressBuffer()
+    monkeypatch.setattr(progress, "progress_buffer", buffer)
+    return buffer
+
+
+def test_failed_flush_is_retried_then_dropped(monkeypatch, migrated, buffer):
+    def fail(db, views, touches):
+        raise RuntimeError("database down")
+
+    monkeypatch.setattr(progress, "write_progress", fail)
+    buffer.record_view(1, 10, 100, at=T0)
+    for _ in range(PROGRESS_FLUSH_MAX_ATTEMPTS - 1):
+        with pytest.raises(RuntimeError):
+            flush_progress()
+        assert buffer.pending_lessons(1) == {100: {10}}
+
+    # views recorded between attempts ride along with the retried batch
+    buffer.record_view(1, 11, 100, at=T0)
+    with pytest.raises(RuntimeError):
+        flush_progress()
+    assert len(buffer) == 0
+
+
+def test_successful_flush_resets_the_failure_count(monkeypatch, migrated, buffer):
+    calls = []
+
+    def flaky(db, views, touches):
+        calls.append(views)
+        if len(calls) == 1:
+            raise RuntimeError("deadlock")
+        return len(views)
+
+    monkeypatch.setattr(progress, "write_progress", flaky)
+    buffer.record_view(1, 10, 100, at=T0)
+    with pytest.raises(RuntimeError):
+        flush_progress()
+    assert flush_progress() == 1
+    assert calls[1] == {(1, 10): (100, T0)} and buffer.failures == 0
+
+
+def test_enrollment_progress_merges_buffered_views(db, enrolled, buffer):
+    user, first, second = enrolled
+    write_progress(db, {(user.id, first.id): (first.course_id, T0)}, {})
+    buffer.record_view(user.id, first.id, first.course_id)   # already stored
+    buffer.record_view(user.id, second.id, second.course_id)
+
+    [row] = enrollment_progress(db, user.id)
+    assert (row["course_id"], row["lessons_completed"], row["lesson_count"], row["progress"]) == (first.course_id, 2, 2, 100)
+    assert enrollment_progress(db, user.id, first.course_id + 1) == []
@@ -0,0 +1,84 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+from cache import lesson_cache
+from models import LessonContent
+from ranking import RANK_MIN_GAP, RANK_STEP, apply_moves, crowded_parents, rank_between, rebalance
+from schemas import ReorderMove
+
+
+def test_rank_between():
+    assert rank_between(None, None) == RANK_STEP
+    assert rank_between(None, 1024.0) == 0.0
+    assert rank_between(1024.0, None) == 2048.0
+    assert rank_between(1024.0, 2048.0) == 1536.0
+    assert rank_between(1.0, 1.0 + RANK_MIN_GAP / 2) is None
+    # no double strictly between two adjacent large ranks
+    big = 2.0 ** 60
+    assert rank_between(big, big + 256.0) is None
+
+
+def test_rank_between_halves_until_exhausted():
+    before, after, steps = 1024.0, 2048.0, 0
+    while (mid := rank_between(before, after)) is not None:
+        after, steps = mid, steps + 1
+    assert 35 < steps < 45
+
+
+def orders(db, lesson):
+    return db.execute(
+        select(LessonContent.id, LessonContent.sort_order)
+        .where(LessonContent.lesson_id == lesson.id).order_by(LessonContent.sort_order)
+    ).all()
+
+
+@pytest.fixture
+def crowded(db, make_lesson):
+    """A lesson whose first two items are closer than RANK_MIN_GAP."""
+    lesson = make_lesson([("markdown", "one"), ("markdown", "two"), ("markdown", "three")])
+    first, second, _ = lesson.contents
+    second.sort_order = first.sort_order + RANK_MIN_GAP / 4
+    db.commit()  # later rollbacks stop at this savepoint
+    return lesson
+
+
+def test_move_into_exhausted_gap_rebalances(db, crowded):
+    first, second, third = (content.id for content in crowded.contents)
+
+    assert apply_moves(db, [ReorderMove(kind="content", id=third, after=first)]) == 1
+
+    assert [row.id for row in orders(db, crowded)] == [first, third, second]
+    ranks = [row.sort_order for row in orders(db, crowded)]
+    assert ranks[1] - ranks[0] >= RANK_MIN_GAP and ranks[2] - ranks[1] >= RANK_MIN_GAP
+
+
+@pytest.mark.parametrize("kind", ["content", "option"])
+def test_rebalance_retires_cached_payload(db, make_lesson, kind):
+    lesson = make_lesson([("multiple_choice", "Pick", ["a", "b", "c"], 0)])
+    db.commit()
+    version = lesson_cache.version(lesson.id)
+
+    # a raw UPDATE, so only rebalance itself can mark the lesson dirty
+    rebalance(db, kind, lesson.id if kind == "content" else lesson.contents[0].id)
+    db.commit()
+    assert lesson_cache.version(lesson.id) != version
+
+
+def test_crowded_parents(db, crowded, make_lesson):
+    roomy = make_lesson([("markdown", "one"), ("markdown", "two")])
+    parents = crowded_parents(db, "content", min_gap=RANK_MIN_GAP)
+    assert crowded.id in parents
+    assert roomy.id not in parents
+
+
+def test_batch_is_atomic(db, crowded):
+    first, second, third = (content.id for content in crowded.contents)
+    before = orders(db, crowded)
+
+    with pytest.raises(HTTPException) as raised:
+        apply_moves(db, [
+            ReorderMove(kind="content", id=first, after=third),
+            ReorderMove(kind="content", id=0, after=None),
+        ])
+    assert raised.value.status_code == 404
+    assert orders(db, crowded) == before
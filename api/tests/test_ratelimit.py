@@ -0,0 +1,79 @@
+import pytest
+from fastapi import HTTPException
+import ratelimit
+from ratelimit import InMemoryRateLimitBackend, RateLimiter, client_ip
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_bucket_allows_a_burst_then_refills(clock):
+    limiter = RateLimiter("test", per_minute=60, burst=3, backend=InMemoryRateLimitBackend())
+
+    assert [limiter.hit("a") for _ in range(3)] == [0, 0, 0]
+    assert limiter.hit("a") == pytest.approx(1.0)
+    assert limiter.hit("b") == 0  # buckets are per key
+
+    clock[0] += 1.0
+    assert limiter.hit("a") == 0
+    clock[0] += 3600
+    assert [limiter.hit("a") for _ in range(3)] == [0, 0, 0]  # capped at burst
+    assert limiter.hit("a") > 0
+
+
+def test_refused_attempts_do_not_extend_the_wait(clock):
+    limiter = RateLimiter("test", per_minute=6, burst=1, backend=InMemoryRateLimitBackend())
+    assert limiter.hit("a") == 0
+    assert limiter.hit("a") == pytest.approx(10.0)
+    clock[0] += 4
+    assert limiter.hit("a") == pytest.approx(6.0)
+
+
+def test_least_recently_used_buckets_are_dropped(clock):
+    backend = InMemoryRateLimitBackend(max_keys=2)
+    limiter = RateLimiter("test", per_minute=60, burst=1, backend=backend)
+    limiter.hit("a"), limiter.hit("b"), limiter.hit("c")
+    assert len(backend._buckets) == 2
+    assert limiter.hit("a") == 0  # evicted, so it restarts full
+    assert limiter.hit("c") > 0
+
+
+@pytest.mark.parametrize("peer, forwarded, expected", [
+    ("203.0.113.7", None, "203.0.113.7"),
+    # only a trusted peer's header counts
+    ("203.0.113.7", "198.51.100.1", "203.0.113.7"),
+    ("127.0.0.1", "198.51.100.1", "198.51.100.1"),
+    ("172.18.0.5", "198.51.100.1", "198.51.100.1"),
+    # a client cannot pick its address by sending the header itself
+    ("127.0.0.1", "10.9.9.9, 198.51.100.1", "198.51.100.1"),
+    # through a chain of trusted proxies
+    ("127.0.0.1", "198.51.100.1, 172.18.0.5", "198.51.100.1"),
+    ("127.0.0.1", "", "127.0.0.1"),
+    (None, "198.51.100.1", None),
+])
+def test_client_ip(monkeypatch, peer, forwarded, expected):
+    monkeypatch.setattr(ratelimit, "TRUSTED_PROXIES", [
+        ratelimit.ipaddress.ip_network("127.0.0.1"), ratelimit.ipaddress.ip_network("172.16.0.0/12"),
+    ])
+    assert client_ip(peer, forwarded) == expected
+
+
+def test_account_is_limited_before_the_shared_address(monkeypatch, clock):
+    backend = InMemoryRateLimitBackend()
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(ratelimit, "login_account_limiter", RateLimiter("account", 6, 2, backend))
+    monkeypatch.setattr(ratelimit, "login_ip_limiter", RateLimiter("ip", 60, 5, backend))
+
+    ratelimit.check_login("198.51.100.1", "target@example.com")
+    ratelimit.check_login("198.51.100.1", "Target@example.com ")
+    for _ in range(10):
+        with pytest.raises(HTTPException) as refused:
+            ratelimit.check_login("198.51.100.1", "target@example.com")
+        assert refused.value.status_code == 429
+    # the refusals above did not use up the classroom's address
+    for n in range(3):
+        ratelimit.check_login("198.51.100.1", f"student{n}@example.com")
@@ -0,0 +1,34 @@
+from cache import VersionedCache
+from render import render_html, render_items
+
+
+def test_plain_text_is_escaped_not_rendered():
+    text = "Use *stars* and <b>tags</b> & $x$\nsecond line\n\nnext paragraph"
+    assert render_html(text, "plain") == (
+        "<p>Use *stars* and &lt;b&gt;tags&lt;/b&gt; &amp; $x$<br>second line</p><p>next paragraph</p>"
+    )
+
+
+def test_markdown_is_rendered_and_sanitized():
+    rendered = render_html("Use *stars* <script>alert(1)</script> and $x_1$")
+    assert "<em>stars</em>" in rendered and "<math" in rendered
+    assert "<script>" not in rendered
+
+
+def test_render_items_picks_the_mode_from_the_format(db, migrated):
+    items = [
+        {"type": "markdown", "data": {"text": "*plain*", "format": "plain"}},
+        {"type": "markdown", "data": {"text": "*marked*", "format": "markdown"}},
+    ]
+    plain, marked = render_items(db, items)
+    assert plain["data"] == {"text": "<p>*plain*</p>", "format": "html"}
+    assert marked["data"] == {"text": "<p><em>marked</em></p>", "format": "html"}
+
+
+def test_peek_finds_local_payloads_only_without_a_shared_backend():
+    cache = VersionedCache("test", max_bytes=1 << 20)
+    assert cache.peek(1) is None
+    built = cache.get_or_build(1, lambda: b"[]")
+    assert cache.peek(1) is built
+    cache.invalidate(1)
+    assert cache.peek(1) is None
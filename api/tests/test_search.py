@@ -0,0 +1,72 @@
+import pytest
+from models import Course, CourseTag, Tag
+from search import search
+
+
+@pytest.fixture
+def quaternions(db, make_lesson):
+    """A tagged course matching "quaternion" in its title, a question and five markdown items."""
+    course = Course(title="Quaternion rotations", tags=[CourseTag(tag=Tag(name="quaternion-tag"))])
+    lesson = make_lesson(
+        [("multiple_choice", "Which quaternion is the identity?", ["1", "i"], 0)]
+        + [("markdown", f"Part {n}: a quaternion has four components.") for n in range(5)],
+        course=course,
+    )
+    other = make_lesson([("markdown", "An untagged quaternion aside.")])
+    return lesson, other
+
+
+def keys(result):
+    return [(item["kind"], item["id"]) for item in result["items"]]
+
+
+def test_ranks_by_field_weight(db, quaternions):
+    lesson, other = quaternions
+    result = search(db, "quaternion", limit=50)
+
+    kinds = [item["kind"] for item in result["items"]]
+    # title (A) before question text (C) before lesson text (D)
+    assert kinds == ["course", "question"] + ["markdown"] * 6
+    ranks = [item["rank"] for item in result["items"]]
+    assert ranks == sorted(ranks, reverse=True)
+    assert result["items"][0]["id"] == lesson.course_id
+
+
+def test_cursor_pages_through_ties_without_gaps_or_repeats(db, quaternions):
+    everything = keys(search(db, "quaternion", limit=50))
+
+    paged, cursor = [], None
+    while True:
+        result = search(db, "quaternion", limit=3, cursor=cursor)
+        paged += keys(result)
+        cursor = result["next_cursor"]
+        if cursor is None:
+            break
+    assert paged == everything
+
+
+def test_kind_and_tag_filters(db, quaternions):
+    lesson, other = quaternions
+
+    questions = search(db, "quaternion", limit=50, kinds=["question"])
+    assert keys(questions) == [("question", lesson.contents[0].id)]
+
+    tagged = search(db, "quaternion", limit=50, tags=["quaternion-tag"])
+    assert {item["course_id"] for item in tagged["items"]} == {lesson.course_id}
+    assert len(tagged["items"]) == 7
+
+
+def test_facets_come_with_the_first_page_only(db, quaternions):
+    first = search(db, "quaternion", limit=3)
+    assert first["facets"] == [{"tag": "quaternion-tag", "count": 1}]
+
+    second = search(db, "quaternion", limit=3, cursor=first["next_cursor"])
+    assert "facets" not in second
+
+
+def test_latex_is_searchable_as_text(db, make_lesson):
+    lesson = make_lesson([("markdown", r"Simplify $3x+2x$ and $\frac{1}{2}$.")])
+    content_id = lesson.contents[0].id
+
+    for q in ("3x + 2x", "frac"):
+        assert ("markdown", content_id) in keys(search(db, q, limit=50)), q
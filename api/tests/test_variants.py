@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from grading import AnswerKeyEntry
+from variants import CompiledTemplate, TemplateError, compile_expression
+
+NAMES = frozenset({"a", "x"})
+
+
+def multiple_choice(**overrides):
+    spec = dict(
+        question_id=7, format="multiple_choice",
+        variables={"a": {"min": 2, "max": 9}, "x": {"min": 1, "max": 12}},
+        answer="a * x + 2 * x", distractors=("a * x", "a + 2 * x"),
+        question="Simplify ${{a}}x + 2x$ at $x={{x}}$.",
+    )
+    spec.update(overrides)
+    return CompiledTemplate(**spec)
+
+
+@pytest.mark.parametrize("source", [
+    "__import__('os')",
+    "a.__class__",
+    "open('x')",
+    "[a for a in x]",
+    "a if x else 1",
+    "lambda: 1",
+    "'text'",
+    "y + 1",
+    "sqrt(x=a)",
+    "a < x",
+    "1" * 501,
+])
+def test_compile_expression_rejects_anything_outside_arithmetic(source):
+    with pytest.raises(TemplateError):
+        compile_expression(source, NAMES)
+
+
+def test_compile_expression_evaluates_over_arrays():
+    fn = compile_expression("round(sqrt(a) * pi, 2) + x // 2", NAMES)
+    result = fn({"a": np.array([4.0, 9.0]), "x": np.array([3.0, 4.0])})
+    assert result.tolist() == [pytest.approx(6.28 + 1), pytest.approx(9.42 + 2)]
+
+
+def test_evaluate_is_deterministic_and_batch_matches_single():
+    template = multiple_choice()
+    user_ids = np.arange(1, 201)
+    batch = template.evaluate(user_ids)
+
+    assert [batch.variant(u) for u in (1, 50, 200)] == [template.evaluate(user_ids).variant(u) for u in (1, 50, 200)]
+    for user_id in (1, 50, 200):
+        assert template.evaluate([user_id]).variant(user_id) == batch.variant(user_id)
+    # different students draw different numbers
+    assert len({batch.variant(u)["question"] for u in user_ids.tolist()}) > 20
+
+
+def test_distractors_are_distinct_and_finite():
+    # "a * x * 1" always equals "a * x", and both equal the answer when
+    # the answer expression is the same; 1 / (a - a) is never finite
+    template = multiple_choice(answer="a * x", distractors=("a * x", "a * x * 1", "1 / (a - a)"), distractor_count=4)
+    batch = template.evaluate(np.arange(1, 501))
+
+    assert batch.options.shape == (500, 5)
+    assert np.isfinite(batch.options).all()
+    assert all(len(set(row)) == len(row) for row in batch.options.tolist())
+
+
+def test_correct_index_points_at_the_answer_after_the_shuffle():
+    template = multiple_choice()
+    batch = template.evaluate(np.arange(1, 1001))
+
+    rows = np.arange(len(batch.options))
+    assert (batch.options[rows, batch.correct_index] == batch.answers).all()
+    # the answer is not always in the same slot
+    assert len(set(batch.correct_index.tolist())) == 4  # answer + 3 distractors
+
+    variant = batch.variant(42)
+    assert variant["options"][variant["correct_index"]] == variant["answer"]
+    entry = AnswerKeyEntry.for_variant("multiple_choice", variant)
+    assert entry.grade(variant["correct_index"])
+    assert not entry.grade((variant["correct_index"] + 1) % 4)
+
+
+def test_validate_rejects_non_finite_answers():
+    with pytest.raises(TemplateError):
+        multiple_choice(answer="a / (x - x)").validate()
@@ -0,0 +1,286 @@
+"""Parameterized questions: per-student variants evaluated in NumPy batches.
+
+A QuestionTemplate attached to a question names its variables, e.g.
+{"a": {"min": 1, "max": 9}, "x": {"choices": [2, 3, 5]}}, an answer
+expression such as "(a + b) * x", and for multiple choice optional
+distractor expressions. The question text and explanation refer to
+variables as {{a}}.
+
+No variant is stored. A student's values come from a seed derived with
+splitmix64 from (user id, question id, VARIANT_SALT), so the same student
+always sees the same numbers. Deriving seeds, sampling, evaluating and
+shuffling options are array operations, so a whole class costs about as
+much as one student.
+
+Expressions are parsed with ast and only arithmetic, variables, numbers and
+the functions in FUNCTIONS are accepted. They are compiled once and cached.
+"""
+import ast
+import functools
+import os
+import re
+import numpy as np
+
+VARIANT_SALT = int(os.getenv("VARIANT_SALT", 0))
+DEFAULT_DISTRACTORS = 3
+MAX_DOMAIN = 1_000_000  # values per variable
+MAX_EXPRESSION_CHARS = 500
+
+FUNCTIONS = {
+    "abs": np.abs, "sqrt": np.sqrt, "floor": np.floor, "ceil": np.ceil,
+    "round": lambda x, digits=0: np.round(x, int(digits)),
+    "min": np.minimum, "max": np.maximum, "exp": np.exp, "log": np.log,
+    "sin": np.sin, "cos": np.cos, "tan": np.tan,
+}
+CONSTANTS = {"pi": np.pi, "e": np.e}
+_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.USub, ast.UAdd)
+_PLACEHOLDER = re.compile(r"\{\{\s*([A-Za-z_]\w*)\s*\}\}")
+_VARIABLE = re.compile(r"^[A-Za-z_]\w*$")
+
+
+class TemplateError(ValueError):
+    pass
+
+
+# --- Seeds ---
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def splitmix64(x: np.ndarray) -> np.ndarray:
+    with np.errstate(over="ignore"):
+        z = x.astype(np.uint64) + _GOLDEN
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+def variant_seeds(user_ids: np.ndarray, question_id: int) -> np.ndarray:
+    with np.errstate(over="ignore"):
+        mixed = splitmix64(np.asarray(user_ids, dtype=np.uint64)) ^ np.uint64(question_id)
+        return splitmix64(mixed ^ np.uint64(VARIANT_SALT))
+
+
+def _stream(seeds: np.ndarray, n) -> np.ndarray:
+    """The n-th independent draw for each seed (n may be an array that broadcasts)."""
+    with np.errstate(over="ignore"):
+        return splitmix64(seeds + np.asarray(n, dtype=np.uint64) * _GOLDEN)
+
+
+# --- Expressions ---
+
+class _Numbers(ast.NodeTransformer):
+    # literals become float64 so that e.g. 9**9**9 overflows to inf instead
+    # of computing a huge Python integer
+    def visit_Constant(self, node):
+        call = ast.Call(func=ast.Name(id="_num", ctx=ast.Load()), args=[node], keywords=[])
+        return ast.copy_location(call, node)
+
+
+def _check(node, names: frozenset):
+    if isinstance(node, ast.Expression):
+        return _check(node.body, names)
+    if isinstance(node, ast.BinOp) and isinstance(node.op, _OPERATORS):
+        _check(node.left, names)
+        return _check(node.right, names)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, _OPERATORS):
+        return _check(node.operand, names)
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return
+    if isinstance(node, ast.Name):
+        if node.id in names or node.id in CONSTANTS:
+            return
+        raise TemplateError(f"unknown variable {node.id!r}")
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS:
+        if node.keywords:
+            raise TemplateError(f"{node.func.id}() takes no keyword arguments")
+        for arg in node.args:
+            _check(arg, names)
+        return
+    raise TemplateError(f"unsupported syntax: {ast.dump(node)[:60]}")
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_expression(source: str, names: frozenset):
+    """Compile an arithmetic expression over names into fn(values) -> ndarray."""
+    if len(source) > MAX_EXPRESSION_CHARS:
+        raise TemplateError(f"expressions are limited to {MAX_EXPRESSION_CHARS} characters")
+    try:
+        tree = ast.parse(source, mode="eval")
+    except SyntaxError as e:
+        raise TemplateError(f"invalid expression {source!r}: {e.msg}")
+    _check(tree, names)
+    code = compile(ast.fix_missing_locations(_Numbers().visit(tree)), "<template>", "eval")
+    scope = {"__builtins__": {}, "_num": np.float64, **FUNCTIONS, **CONSTANTS}
+
+    def evaluate(values: dict) -> np.ndarray:
+        with np.errstate(all="ignore"):
+            return eval(code, scope, values)
+
+    return evaluate
+
+
+# --- Templates ---
+
+def format_number(value: float, decimals: int | None) -> str:
+    if decimals:
+        return f"{value:.{decimals}f}"
+    if float(value).is_integer():
+        return str(int(value))
+    return format(value, ".10g")
+
+
+def _offsets(unit: float):
+    """1, -1, 2, -2, ... units: replacements for distractors that collide."""
+    k = 1
+    while True:
+        yield k * unit
+        yield -k * unit
+        k += 1
+
+
+class CompiledTemplate:
+    def __init__(self, question_id: int, format: str, variables: dict, answer: str,
+                 distractors=(), distractor_count: int | None = None, decimals: int | None = None,
+                 question: str = "", explanation: str | None = None):
+        self.question_id = question_id
+        self.format = getattr(format, "value", format)
+        self.names = tuple(sorted(variables))  # sorted so draws do not depend on dict order
+        for name in self.names:
+            if not _VARIABLE.match(name) or name in FUNCTIONS or name in CONSTANTS or name.startswith("_"):
+                raise TemplateError(f"invalid variable name {name!r}")
+        self.variables = [self._domain(name, variables[name]) for name in self.names]
+        names = frozenset(self.names)
+        self.answer = compile_expression(answer, names)
+        self.distractors = [compile_expression(d, names) for d in distractors]
+        self.distractor_count = max(len(self.distractors), DEFAULT_DISTRACTORS if distractor_count is None else distractor_count)
+        self.decimals = decimals
+        self.question = question
+        self.explanation = explanation
+
+    @classmethod
+    def from_row(cls, question, template) -> "CompiledTemplate":
+        return cls(
+            question.content_id, question.question_format, template.variables, template.answer_expression,
+            template.distractor_expressions or (), template.distractor_count, template.decimals,
+            question.question_text, question.explanation,
+        )
+
+    @staticmethod
+    def _domain(name: str, spec: dict) -> np.ndarray:
+        if not isinstance(spec, dict):
+            raise TemplateError(f"{name}: expected {{min, max[, step]}} or {{choices}}")
+        try:
+            if "choices" in spec:
+                domain = np.asarray(spec["choices"], dtype=np.float64)
+            else:
+                low, high, step = float(spec["min"]), float(spec["max"]), float(spec.get("step", 1))
+                if not (step > 0 and low <= high and (high - low) / step < MAX_DOMAIN):
+                    raise TemplateError(f"{name}: need min <= max, step > 0 and at most {MAX_DOMAIN} values")
+                domain = np.arange(low, high + step / 2, step)
+            exclude = [float(v) for v in spec.get("exclude", ())]
+        except (KeyError, TypeError, ValueError) as e:
+            if isinstance(e, TemplateError):
+                raise
+            raise TemplateError(f"{name}: expected {{min, max[, step]}} or {{choices}} of numbers")
+        if domain.ndim != 1 or len(domain) > MAX_DOMAIN:
+            raise TemplateError(f"{name}: expected a flat list of at most {MAX_DOMAIN} numbers")
+        if exclude:
+            domain = domain[~np.isin(domain, exclude)]
+        if not len(domain):
+            raise TemplateError(f"{name}: no values left")
+        return domain
+
+    def evaluate(self, user_ids) -> "VariantBatch":
+        seeds = variant_seeds(user_ids, self.question_id)
+        values = {
+            name: domain[_stream(seeds, i + 1) % np.uint64(len(domain))]
+            for i, (name, domain) in enumerate(zip(self.names, self.variables))
+        }
+        answers = self._round(np.broadcast_to(self.answer(values), seeds.shape))
+        options = correct_index = None
+        if self.format == "multiple_choice":
+            options, correct_index = self._options(seeds, values, answers)
+        return VariantBatch(self, np.asarray(user_ids), values, answers, options, correct_index)
+
+    def _round(self, values: np.ndarray) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        return np.round(values, self.decimals) if self.decimals is not None else values
+
+    def _options(self, seeds, values, answers):
+        n = len(seeds)
+        columns = [answers]
+        unit = 10.0 ** -self.decimals if self.decimals else 1.0
+        for j in range(self.distractor_count):
+            if j < len(self.distractors):
+                column = self._round(np.broadcast_to(self.distractors[j](values), (n,))).copy()
+            else:
+                column = answers.copy()
+            # anything equal to the answer or an earlier option, or not a
+            # number, is replaced by the answer plus the next free offset
+            offsets = _offsets(unit)
+            for _ in range(4 * self.distractor_count + 8):
+                clash = ~np.isfinite(column)
+                for earlier in columns:
+                    clash |= column == earlier
+                if not clash.any():
+                    break
+                column[clash] = answers[clash] + next(offsets)
+            columns.append(column)
+        table = np.stack(columns, axis=1)
+        # per-student shuffle: sort each row by independent draws
+        draws = _stream(seeds[:, None], np.arange(len(columns), dtype=np.uint64)[None, :] + np.uint64(1000))
+        order = np.argsort(draws, axis=1)
+        return np.take_along_axis(table, order, axis=1), np.argmax(order == 0, axis=1)
+
+    def validate(self, samples: int = 512) -> None:
+        """Raise TemplateError unless every sampled variant has a finite answer."""
+        try:
+            batch = self.evaluate(np.arange(samples))
+        except (TypeError, ValueError) as e:  # e.g. a function called with the wrong arity
+            raise TemplateError(str(e))
+        if not np.isfinite(batch.answers).all():
+            raise TemplateError("the answer is not a finite number for some variable values")
+
+
+class VariantBatch:
+    """Variants of one template for a batch of students, as parallel arrays."""
+
+    __slots__ = ("template", "user_ids", "values", "answers", "options", "correct_index", "_rows")
+
+    def __init__(self, template, user_ids, values, answers, options, correct_index):
+        self.template = template
+        self.user_ids = user_ids
+        self.values = values
+        self.answers = answers
+        self.options = options
+        self.correct_index = correct_index
+        self._rows = {int(u): i for i, u in enumerate(user_ids)}
+
+    def __contains__(self, user_id) -> bool:
+        return user_id in self._rows
+
+    def nbytes(self) -> int:
+        arrays = [self.answers, *self.values.values()]
+        if self.options is not None:
+            arrays += [self.options, self.correct_index]
+        return sum(a.nbytes for a in arrays) + 64 * len(self._rows)
+
+    def variant(self, user_id: int) -> dict:
+        """One student's variant: rendered text, options and answer key."""
+        row = self._rows[user_id]
+        t = self.template
+        shown = {name: format_number(v[row], None) for name, v in self.values.items()}
+
+        def render(text):
+            return _PLACEHOLDER.sub(lambda m: shown.get(m.group(1), m.group(0)), text) if text else text
+
+        variant = {
+            "question": render(t.question),
+            "explanation": render(t.explanation),
+            "answer": format_number(self.answers[row], t.decimals),
+        }
+        if self.options is not None:
+            variant["options"] = [format_number(v, t.decimals) for v in self.options[row]]
+            variant["correct_index"] = int(self.correct_index[row])
+        return variant
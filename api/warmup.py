@@ -0,0 +1,82 @@
+"""Per-worker warm-up.
+
+Runs from the app lifespan's startup, which the server finishes before it
+accepts connections, so a freshly forked worker does not make its first
+users pay for opening pool connections, compiling statements or building
+the hottest lesson payloads. Failures are logged and never keep the worker
+from starting; /ready still reports whether the database is usable.
+"""
+import logging
+import os
+import time
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+from database import SessionLocal, async_engines, engines
+from catalog import list_courses
+from content import lesson_payload
+from metrics import Histogram
+from models import Course, Lesson
+from outline import get_outline
+
+logger = logging.getLogger(__name__)
+
+WARMUP = os.getenv("WARMUP", "0") == "1"
+# Connections opened per pool; defaults to each pool's steady-state size
+WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", 0)) or None
+WARMUP_COURSES = int(os.getenv("WARMUP_COURSES", 20))
+WARMUP_LESSONS = int(os.getenv("WARMUP_LESSONS", 200))
+
+warmup_seconds = Histogram(
+    "worker_warmup_seconds", "Time spent warming a worker", labels=("stage",),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+
+def _fill_pool(engine, n: int):
+    connections = [engine.connect() for _ in range(n)]
+    for connection in connections:
+        connection.close()
+
+
+async def _fill_async_pool(engine, n: int):
+    connections = [await engine.connect() for _ in range(n)]
+    for connection in connections:
+        await connection.close()
+
+
+async def _warm_pools():
+    for engine in engines:
+        await run_in_threadpool(_fill_pool, engine, WARMUP_CONNECTIONS or engine.pool.size())
+    for engine in async_engines:
+        await _fill_async_pool(engine, WARMUP_CONNECTIONS or engine.pool.size())
+
+
+def _warm_caches():
+    db = SessionLocal()
+    try:
+        list_courses(db, limit=20)
+        course_ids = db.execute(
+            select(Course.id).order_by(Course.created_at.desc(), Course.id.desc()).limit(WARMUP_COURSES)
+        ).scalars().all()
+        for course_id in course_ids:
+            get_outline(db, course_id)
+        lesson_ids = db.execute(
+            select(Lesson.id).where(Lesson.course_id.in_(course_ids)).order_by(Lesson.id).limit(WARMUP_LESSONS)
+        ).scalars().all()
+        for lesson_id in lesson_ids:
+            lesson_payload(db, lesson_id)
+    finally:
+        db.close()
+
+
+async def warm_up():
+    stages = [("pools", _warm_pools), ("caches", lambda: run_in_threadpool(_warm_caches))]
+    for stage, run in stages:
+        start = time.perf_counter()
+        try:
+            await run()
+        except Exception:
+            logger.warning("worker warm-up stage %s failed", stage, exc_info=True)
+        finally:
+            warmup_seconds.observe(time.perf_counter() - start, stage=stage)
+
@@ -0,0 +1,43 @@
+-- Sample course for local development. Load after `alembic upgrade head`:
+--   psql -U learn -d learn -f sample_data.sql
+
+INSERT INTO courses (title, description, image_url) VALUES
+('Foundational Algebra', 'Master core algebraic concepts', '/assets/algebra.jpeg');
+
+INSERT INTO tags (name) VALUES 
+('algebra'), ('math'), ('beginner');
+
+INSERT INTO course_tags (course_id, tag_id) VALUES
+(1, 1), (1, 2), (1, 3);
+
+INSERT INTO chapters (course_id, title, description, image_url, sort_order) VALUES
+(1, 'Variables & Expressions', 'Introduction to algebraic variables', '/images/algebra-variables.jpg', 1);
+
+INSERT INTO lessons (chapter_id, course_id, title, description, sort_order) VALUES
+(1, 1, 'Algebraic Variables', 'Understanding variables in algebra', 1);
+
+-- Insert lesson content
+WITH content AS (
+  INSERT INTO lesson_contents (lesson_id, content_type, sort_order)
+  VALUES (1, 'markdown', 1) RETURNING id
+)
+INSERT INTO markdown_contents (content_id, text, format)
+
+SELECT id, 'In algebra, variables (like $x$ or $y$) represent unknown values...', 'latex'
+FROM content;
+
+WITH content AS (
+  INSERT INTO lesson_contents (lesson_id, content_type, sort_order)
+  VALUES (1, 'question', 2) RETURNING id
+),
+q AS (
+  INSERT INTO questions (content_id, question_format, question_text, explanation)
+  SELECT id, 'multiple_choice', 'What does $3x + 2x$ simplify to when $x=4$?', 'Combine like terms: $3x + 2x = 5x$. When $x=4$, $5x = 20$.'
+  FROM content RETURNING content_id
+)
+INSERT INTO question_options (question_id, option_text, is_correct, sort_order)
+VALUES 
+((SELECT content_id FROM q), '20', TRUE, 1),
+((SELECT content_id FROM q), '24', FALSE, 2),
+((SELECT content_id FROM q), '80', FALSE, 3),
+((SELECT content_id FROM q), '16', FALSE, 4);
@@ -5,7 +5,10 @@ import MarkdownRender from "../../utils/MarkdownRender"
 export const MarkdownComponent = ({ content }: { content: MarkdownContent }) => {
     return (
         <div className="prose max-w-none whitespace-pre-line">
-            {content.data.format === 'latex' ? (
+            {content.data.format === 'html' ? (
+                // sanitized server-side (?render=html)
+                <div dangerouslySetInnerHTML={{ __html: content.data.text }} />
+            ) : content.data.format === 'latex' ? (
                     <MarkdownRender>{content.data.text}</MarkdownRender>
             ) : (
                 <p className="whitespace-pre-line">{content.data.text}</p>
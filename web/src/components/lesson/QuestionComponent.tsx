@@ -121,7 +121,7 @@ export const QuestionComponent = ({
                     <MarkdownRender>{"That's incorrect. Try again."}</MarkdownRender>
                     <div className="flex space-x-3 mt-3">
                         <button
-                            onClick={() => onAnswerChange?.(content.data.correct_answer)}
+                            onClick={() => content.data.correct_answer !== undefined && onAnswerChange?.(content.data.correct_answer)}
                             className="px-4 py-2 bg-gray-200 text-gray-800 rounded hover:bg-gray-300"
                         >
                             Show Answer
@@ -18,25 +18,12 @@ const CoursePage = () => {
   useEffect(() => {
     const fetchCourseData = async () => {
       try {
-        // Fetch course info
-        const resCourse = await fetch(`http://localhost:8000/courses/${courseId}`);
-        if (!resCourse.ok) throw new Error("Course not found");
-        const courseData = await resCourse.json();
+        // Course, chapters and lessons in a single request
+        const resOutline = await fetch(`http://localhost:8000/courses/${courseId}/outline`);
+        if (!resOutline.ok) throw new Error("Course not found");
+        const outline: CourseWithChaptersAndLessons = await resOutline.json();
 
-        // Fetch chapters
-        const resChapters = await fetch(`http://localhost:8000/courses/${courseId}/chapters/`);
-        const chaptersData = await resChapters.json();
-
-        // For each chapter, fetch its lessons
-        const chaptersWithLessons = await Promise.all(
-          chaptersData.map(async (chapter: Chapter) => {
-            const resLessons = await fetch(`http://localhost:8000/chapters/${chapter.id}/lessons/`);
-            const lessons: Lesson[] = await resLessons.json();
-            return { ...chapter, lessons };
-          })
-        );
-
-        setCourse({ ...courseData, chapters: chaptersWithLessons });
+        setCourse(outline);
       } catch (err: any) {
         setError(err.message || "An error occurred");
       } finally {
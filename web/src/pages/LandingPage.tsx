@@ -16,10 +16,10 @@ const LandingPage: React.FC = () => {
   useEffect(() => {
     const fetchCourses = async () => {
       try {
-        const res = await fetch('http://localhost:8000/courses/');
+        const res = await fetch('http://localhost:8000/courses/?fields=title,description,image_url,tags&limit=100');
         if (!res.ok) throw new Error('Failed to fetch courses');
-        const data: Course[] = await res.json();
-        setCourses(data);
+        const data: { items: Course[] } = await res.json();
+        setCourses(data.items);
       } catch (err: any) {
         setError(err.message || 'An error occurred');
       } finally {
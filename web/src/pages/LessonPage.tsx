@@ -15,6 +15,33 @@ type CompletedContent = {
   userAnswer?: string | number | null;
 };
 
+type QuestionVariant = {
+  content_id: number;
+  question: string;
+  options?: string[];
+};
+
+// Templated questions arrive with {{placeholders}} and no options; each
+// student's numbers come from /variants. Without them (e.g. signed out) the
+// templated questions are left out rather than shown unfilled.
+const withVariants = async (lessonId: string, contents: LessonContent[]): Promise<LessonContent[]> => {
+  if (!contents.some(c => c.type === 'question' && c.data.variant)) return contents;
+
+  let variants: QuestionVariant[] = [];
+  const res = await fetch(`http://localhost:8000/lessons/${lessonId}/variants`, {
+    headers: { 'Authorization': `Bearer ${localStorage.getItem('token')}` },
+  });
+  if (res.ok) variants = await res.json();
+  const byId = new Map(variants.map(v => [v.content_id, v]));
+
+  return contents.flatMap(c => {
+    if (c.type !== 'question' || !c.data.variant) return [c];
+    const variant = c.id !== undefined ? byId.get(c.id) : undefined;
+    if (!variant) return [];
+    return [{ ...c, data: { ...c.data, question: variant.question, options: variant.options ?? c.data.options } }];
+  });
+};
+
 const LessonPage = () => {
   const { courseId, chapterId, lessonId } = useParams();
   const navigate = useNavigate();
@@ -71,7 +98,7 @@ const LessonPage = () => {
         if (!resContent.ok) throw new Error("Lesson content not found");
         const contents: LessonContent[] = await resContent.json();
 
-        setLesson({ ...currentLesson, contents });
+        setLesson({ ...currentLesson, contents: await withVariants(lessonId, contents) });
       } catch (err: any) {
         setError(err.message || "An error occurred");
       } finally {
@@ -95,20 +122,45 @@ const LessonPage = () => {
     contentEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   }, [completedContents, currentIndex]);
 
-  const handleCheckAnswer = () => {
+  const handleCheckAnswer = async () => {
     setIsChecking(true);
     const currentContent = lesson.contents[currentIndex];
 
     if (currentContent.type === 'question') {
       const userAnswer = userAnswers[currentIndex];
-      const correctAnswer = currentContent.data.correct_answer;
 
       if (userAnswer === undefined || userAnswer === null) {
         setShowError(true);
         return;
       }
 
-      setShowError(userAnswer !== correctAnswer);
+      // Answers are graded on the server; the lesson payload has no answer key
+      try {
+        const res = await fetch(`http://localhost:8000/lessons/${lessonId}/submissions`, {
+          method: 'POST',
+          headers: {
+            'Content-Type': 'application/json',
+            'Authorization': `Bearer ${localStorage.getItem('token')}`,
+          },
+          body: JSON.stringify({ answers: [{ content_id: currentContent.id, answer: userAnswer }] }),
+        });
+        if (!res.ok) throw new Error('Could not check answer');
+        const { results } = await res.json();
+        const result = results[0];
+
+        setLesson(prev => ({
+          ...prev,
+          contents: prev.contents.map((c, i) =>
+            i === currentIndex && c.type === 'question'
+              ? { ...c, data: { ...c.data, correct_answer: result.correct_answer, explanation: result.explanation ?? c.data.explanation } }
+              : c
+          ),
+        }));
+        setShowError(!result.correct);
+      } catch (err: any) {
+        setIsChecking(false);
+        setError(err.message || 'An error occurred');
+      }
     }
   };
 
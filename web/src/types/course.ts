@@ -1,4 +1,5 @@
 export interface ContentBase {
+  id?: number;
   type: 'markdown' | 'visualization' | 'video' | 'question';
 }
 
@@ -6,7 +7,7 @@ export interface MarkdownContent extends ContentBase {
   type: 'markdown';
   data: {
       text: string;
-      format: 'plain' | 'latex';
+      format: 'plain' | 'latex' | 'html';
   };
   isCurrent: boolean;
 }
@@ -46,9 +47,10 @@ export interface QuestionContent extends ContentBase {
       format: 'multiple_choice' | 'short_answer';
       question: string;
       options?: string[];
-      correct_answer: number | string;
+      correct_answer?: number | string; // only known after grading
       explanation?: string;
       visualization?: boolean; // Add this line
+      variant?: boolean; // templated: text and options come from /lessons/{id}/variants
   };
   isCurrent: boolean;
 }